@@ -8,10 +8,9 @@ of the BSD license. See the LICENSE file for details.
 
 Python API for atomic-reactor. This is the official way of interacting with atomic-reactor.
 """
+from atomic_reactor.constants import PLUGIN_PULL_BASE_IMAGE_KEY, PLUGIN_TAG_AND_PUSH_KEY
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.outer import PrivilegedBuildManager, DockerhostBuildManager
-from atomic_reactor.plugins.pre_pull_base_image import PullBaseImagePlugin
-from atomic_reactor.plugins.post_tag_and_push import TagAndPushPlugin
 
 
 __all__ = (
@@ -32,7 +31,7 @@ def _prepare_build_json(image, source, target_registries, target_registries_inse
         "image": image,
         "source": source,
         "postbuild_plugins": [{
-            "name": TagAndPushPlugin.key,
+            "name": PLUGIN_TAG_AND_PUSH_KEY,
             "args": {
                 "registries": registries
             }
@@ -41,7 +40,7 @@ def _prepare_build_json(image, source, target_registries, target_registries_inse
 
     if not dont_pull_base_image:
         build_json["prebuild_plugins"] = [{
-            "name": PullBaseImagePlugin.key,
+            "name": PLUGIN_PULL_BASE_IMAGE_KEY,
             "args": {}
         }]
 
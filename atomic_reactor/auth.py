@@ -9,12 +9,102 @@ from requests.auth import AuthBase, HTTPBasicAuth
 from requests.cookies import extract_cookies_to_jar
 from requests.utils import parse_dict_header
 from urllib.parse import urlparse
+import base64
+import hashlib
 import requests
 import re
+import threading
+import time
 
+from atomic_reactor.constants import (REGISTRY_TOKEN_DEFAULT_EXPIRES_IN,
+                                      REGISTRY_TOKEN_EXPIRY_LEEWAY)
 from atomic_reactor.utils.retries import get_retrying_requests_session
 
 
+class BearerTokenCache(object):
+    """
+    Bearer tokens shared by all registry sessions in this process
+
+    Tokens are kept per realm, service, scope and credentials until they
+    expire. The realm and service a registry sends in its challenge are
+    remembered as well, so that a cached token can be sent with the first
+    request to the registry instead of waiting for the 401 response.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._challenges = {}
+        self._tokens = {}
+
+    def get_challenge(self, registry):
+        """
+        :param registry: str, scheme://host[:port] of the registry
+        :return: tuple (realm, service), or None if not known yet
+        """
+        with self._lock:
+            return self._challenges.get(registry)
+
+    def set_challenge(self, registry, realm, service):
+        with self._lock:
+            self._challenges[registry] = (realm, service)
+
+    def get_token(self, realm, service, scope, credentials):
+        """
+        :param realm: str, URL of the token service
+        :param service: str, service from the challenge, or None
+        :param scope: str, scope the token is needed for, or None for global access
+        :param credentials: str, hash of credentials used to get the token, or None
+        :return: str, token, or None if there is no valid token
+        """
+        key = (realm, service, scope, credentials)
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached is None:
+                return None
+            token, expires_at = cached
+            if time.time() >= expires_at:
+                del self._tokens[key]
+                return None
+            return token
+
+    def set_token(self, realm, service, scopes, credentials, token,
+                  expires_in=REGISTRY_TOKEN_DEFAULT_EXPIRES_IN):
+        """
+        :param realm: str, URL of the token service
+        :param service: str, service from the challenge, or None
+        :param scopes: list<str>, all scopes granted by the token, empty for global access
+        :param credentials: str, hash of credentials used to get the token, or None
+        :param token: str, the token
+        :param expires_in: int, for how many seconds the token is valid
+        """
+        expires_at = time.time() + expires_in - REGISTRY_TOKEN_EXPIRY_LEEWAY
+        with self._lock:
+            for scope in scopes or [None]:
+                self._tokens[(realm, service, scope, credentials)] = (token, expires_at)
+
+    def invalidate(self, token):
+        with self._lock:
+            for key in [key for key, (cached, _) in self._tokens.items() if cached == token]:
+                del self._tokens[key]
+
+    def clear(self):
+        with self._lock:
+            self._challenges.clear()
+            self._tokens.clear()
+
+
+_bearer_token_cache = BearerTokenCache()
+
+
+def get_bearer_token_cache():
+    """
+    Get the bearer token cache shared by all registry sessions in this process
+
+    :return: BearerTokenCache instance
+    """
+    return _bearer_token_cache
+
+
 class HTTPBearerAuth(AuthBase):
     """Performs Bearer authentication for the given Request object.
 
@@ -25,14 +115,16 @@ class HTTPBearerAuth(AuthBase):
     auth_b64 may be provided for authentication (instead of username and
     password).
 
-    Once Bearer token is retrieved, it will be cached and used in subsequent
-    requests. Since tokens are specific to repositories, the token cache may
-    store multiple tokens.
+    Once Bearer token is retrieved, it will be cached in the process-wide
+    BearerTokenCache and used in subsequent requests, including requests
+    made by other instances with the same credentials. Since tokens are
+    specific to repositories, the token cache may store multiple tokens.
 
     Supports registry v2 API only.
     """
     BEARER_PATTERN = re.compile(r'bearer ', flags=re.IGNORECASE)
     V2_REPO_PATTERN = re.compile(r'^/v2/(.*)/(manifests|tags|blobs)/')
+    REPO_SCOPE_PATTERN = re.compile(r'^repository:([^:]+):')
 
     def __init__(self, username=None, password=None, verify=True, access=None, auth_b64=None):
         """Initialize HTTPBearerAuth object.
@@ -52,15 +144,20 @@ class HTTPBearerAuth(AuthBase):
         self.verify = verify
         self.access = access or ('pull',)
 
-        self._token_cache = {}
+        self._token_cache = get_bearer_token_cache()
         self._retry_session = get_retrying_requests_session()   # Used when querying for token
 
     def __call__(self, response):
         repo = self._get_repo_from_url(response.url)
 
-        if repo in self._token_cache:
-            self._set_header(response, repo)
-            return response
+        # Send cached token right away if the registry challenged us before
+        challenge = self._token_cache.get_challenge(self._get_registry_from_url(response.url))
+        if challenge is not None:
+            realm, service = challenge
+            token = self._token_cache.get_token(realm, service, self._get_scope(repo),
+                                                self._credentials)
+            if token is not None:
+                self._set_header(response, token)
 
         def handle_401_with_repo(response, **kwargs):
             return self.handle_401(response, repo, **kwargs)
@@ -78,7 +175,12 @@ class HTTPBearerAuth(AuthBase):
         if 'bearer' not in auth_info.lower():
             return response
 
-        self._token_cache[repo] = self._get_token(auth_info, repo)
+        # The token we sent may have been revoked, don't give it to anyone else
+        sent_auth = response.request.headers.get('Authorization', '')
+        if self.BEARER_PATTERN.match(sent_auth):
+            self._token_cache.invalidate(self.BEARER_PATTERN.sub('', sent_auth, count=1))
+
+        token = self._get_token(auth_info, repo, self._get_registry_from_url(response.url))
 
         # Consume content and release the original connection
         # to allow our new request to reuse the same one.
@@ -89,7 +191,7 @@ class HTTPBearerAuth(AuthBase):
         extract_cookies_to_jar(retry_request._cookies, response.request, response.raw)
         retry_request.prepare_cookies(retry_request._cookies)
 
-        self._set_header(retry_request, repo)
+        self._set_header(retry_request, token)
         retry_response = response.connection.send(retry_request, **kwargs)
         retry_response.history.append(response)
         retry_response.request = retry_request
@@ -100,12 +202,25 @@ class HTTPBearerAuth(AuthBase):
 
         return retry_response
 
-    def _get_token(self, auth_info, repo):
+    def _get_token(self, auth_info, repo, registry):
         bearer_info = parse_dict_header(self.BEARER_PATTERN.sub('', auth_info, count=1))
+        realm = bearer_info.pop('realm')
+        service = bearer_info.get('service')
+        self._token_cache.set_challenge(registry, realm, service)
+
         # If repo could not be determined, do not set scope - implies global access
+        scopes = []
+        challenge_scopes = bearer_info.pop('scope', '').split()
         if repo:
-            bearer_info['scope'] = 'repository:{}:{}'.format(repo, ','.join(self.access))
-        realm = bearer_info.pop('realm')
+            scopes.append(self._get_scope(repo))
+            # Keep scopes for other repositories requested by the registry,
+            # e.g. the source repository of a cross-repository blob mount
+            for scope in challenge_scopes:
+                scope_match = self.REPO_SCOPE_PATTERN.match(scope)
+                if scope_match and scope_match.group(1) != repo and scope not in scopes:
+                    scopes.append(scope)
+        if scopes:
+            bearer_info['scope'] = scopes if len(scopes) > 1 else scopes[0]
 
         realm_auth = None
         if self.auth_b64:
@@ -116,10 +231,35 @@ class HTTPBearerAuth(AuthBase):
         realm_response = self._retry_session.get(realm, params=bearer_info, verify=self.verify,
                                                  auth=realm_auth)
         realm_response.raise_for_status()
-        return realm_response.json()['token']
-
-    def _set_header(self, response, repo):
-        response.headers['Authorization'] = 'Bearer {}'.format(self._token_cache[repo])
+        token_info = realm_response.json()
+        token = token_info.get('token') or token_info['access_token']
+        expires_in = token_info.get('expires_in') or REGISTRY_TOKEN_DEFAULT_EXPIRES_IN
+        self._token_cache.set_token(realm, service, scopes, self._credentials, token,
+                                    expires_in=expires_in)
+        return token
+
+    @property
+    def _credentials(self):
+        """Hash of credentials, tokens are never shared by different users"""
+        auth_b64 = self.auth_b64
+        if not auth_b64 and self.username and self.password:
+            auth_b64 = base64.b64encode('{}:{}'.format(self.username, self.password)
+                                        .encode('utf-8')).decode('utf-8')
+        if not auth_b64:
+            return None
+        return hashlib.sha256(auth_b64.encode('utf-8')).hexdigest()
+
+    def _get_scope(self, repo):
+        if not repo:
+            return None
+        return 'repository:{}:{}'.format(repo, ','.join(self.access))
+
+    def _set_header(self, response, token):
+        response.headers['Authorization'] = 'Bearer {}'.format(token)
+
+    def _get_registry_from_url(self, url):
+        url_parts = urlparse(url)
+        return '{}://{}'.format(url_parts.scheme, url_parts.netloc)
 
     def _get_repo_from_url(self, url):
         url_parts = urlparse(url)
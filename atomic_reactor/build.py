@@ -259,7 +259,8 @@ class InsideBuilder(LastLogger, BuilderStateMachine):
                 dockercfg_path = self.pull_registries[base_image.registry]['dockercfg_path']
                 self._base_image_inspect =\
                     atomic_reactor.util.get_inspect_for_image(base_image, base_image.registry,
-                                                              insecure, dockercfg_path)
+                                                              insecure, dockercfg_path,
+                                                              cache_tags=True)
 
             base_image_str = str(base_image)
             if base_image_str not in self._parent_images_inspect:
@@ -284,7 +285,8 @@ class InsideBuilder(LastLogger, BuilderStateMachine):
                     atomic_reactor.util.get_inspect_for_image(image_name,
                                                               image_name.registry,
                                                               insecure,
-                                                              dockercfg_path)
+                                                              dockercfg_path,
+                                                              cache_tags=True)
 
         return self._parent_images_inspect[image_name]
 
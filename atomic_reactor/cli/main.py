@@ -11,7 +11,6 @@ import argparse
 import logging
 import os
 import sys
-import pkg_resources
 import locale
 
 from atomic_reactor import set_logging
@@ -96,6 +95,29 @@ def cli_inside_build(args):
                  substitutions=args.substitute)
 
 
+class VersionAction(argparse.Action):
+    """
+    Print version of the installed package and exit
+
+    pkg_resources takes long to import, so it's only imported when the version
+    is actually requested.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,  # pylint: disable=redefined-builtin
+                 default=argparse.SUPPRESS, help="show program's version number and exit"):
+        super(VersionAction, self).__init__(option_strings=option_strings, dest=dest,
+                                            default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        import pkg_resources
+        try:
+            version = pkg_resources.get_distribution("atomic_reactor").version
+        except pkg_resources.DistributionNotFound:
+            version = "GIT"
+        print(version)
+        parser.exit()
+
+
 class CLI(object):
     def __init__(self, formatter_class=argparse.HelpFormatter, prog=PROG):
         self.parser = argparse.ArgumentParser(
@@ -111,15 +133,10 @@ class CLI(object):
         locale.setlocale(locale.LC_ALL, '')
 
     def set_arguments(self):
-        try:
-            version = pkg_resources.get_distribution("atomic_reactor").version
-        except pkg_resources.DistributionNotFound:
-            version = "GIT"
-
         exclusive_group = self.parser.add_mutually_exclusive_group()
         exclusive_group.add_argument("-q", "--quiet", action="store_true")
         exclusive_group.add_argument("-v", "--verbose", action="store_true")
-        exclusive_group.add_argument("-V", "--version", action="version", version=version)
+        exclusive_group.add_argument("-V", "--version", action=VersionAction)
 
         subparsers = self.parser.add_subparsers(help='commands')
 
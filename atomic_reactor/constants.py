@@ -43,6 +43,10 @@ YUM_REPOS_DIR = '/etc/yum.repos.d/'
 RELATIVE_REPOS_PATH = "atomic-reactor-repos/"
 DEFAULT_YUM_REPOFILE_NAME = 'atomic-reactor-injected.repo'
 
+# environment variable with path to file caching the index of available plugins,
+# expanded with os.path.expanduser; the index is not cached when unset or empty
+PLUGIN_INDEX_CACHE_ENV = 'ATOMIC_REACTOR_PLUGIN_INDEX'
+
 # key in dictionary returned by "docker inspect" that holds the image
 # configuration (such as labels)
 INSPECT_CONFIG = "Config"
@@ -74,6 +78,9 @@ TOOLS_USED = (
 )
 
 DEFAULT_DOWNLOAD_BLOCK_SIZE = 10 * 1024 * 1024  # 10Mb
+# maximum number of concurrent downloads, in total and from a single host
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_DOWNLOAD_WORKERS_PER_HOST = 4
 
 TAG_NAME_REGEX = r'^[\w][\w.-]{0,127}$'
 
@@ -111,6 +118,8 @@ PLUGIN_FETCH_SOURCES_KEY = 'fetch_sources'
 PLUGIN_KOJI_DELEGATE_KEY = 'koji_delegate'
 PLUGIN_PUSH_FLOATING_TAGS_KEY = 'push_floating_tags'
 PLUGIN_ADD_IMAGE_CONTENT_MANIFEST = 'add_image_content_manifest'
+PLUGIN_PULL_BASE_IMAGE_KEY = 'pull_base_image'
+PLUGIN_TAG_AND_PUSH_KEY = 'tag_and_push'
 
 # some shared dict keys for build metadata that gets recorded with koji.
 # for consistency of metadata in historical builds, these values basically cannot change.
@@ -132,6 +141,10 @@ DOCKER_CLIENT_STATUS_RETRY = (408, 500, 502, 503, 504)
 DOCKER_PUSH_MAX_RETRIES = 6
 # how many seconds should wait before another try of docker push
 DOCKER_PUSH_BACKOFF_FACTOR = 5
+# size of buffer for writing images and containers exported from docker
+DOCKER_EXPORT_BUFFER_SIZE = 4 * 1024**2
+# after how many exported bytes is the progress of an export logged
+DOCKER_EXPORT_PROGRESS_INTERVAL = 1024**3
 # max retries for http requests
 HTTP_MAX_RETRIES = 10
 # how many seconds should wait before another try of http request
@@ -140,6 +153,22 @@ HTTP_BACKOFF_FACTOR = 5
 HTTP_CLIENT_STATUS_RETRY = (408, 429, 500, 502, 503, 504)
 # requests timeout in seconds
 HTTP_REQUEST_TIMEOUT = 600
+# for how many hosts are connection pools shared by all http sessions kept
+HTTP_POOL_SIZE = 20
+# how many idle connections to a single host are kept for reuse
+HTTP_POOL_CONNECTIONS_PER_HOST = 10
+# how many seconds is a cached tag -> digest mapping of a registry valid
+REGISTRY_CACHE_TAG_TTL = 60
+# for how many seconds is a parent image kept on the node after the last build using it
+PARENT_IMAGE_CACHE_GRACE_PERIOD = 600
+# after how many seconds is use of a parent image by a build considered abandoned
+PARENT_IMAGE_CACHE_STALE_USE = 24 * 60 * 60
+# for how many seconds is a registry bearer token valid if the realm doesn't say
+REGISTRY_TOKEN_DEFAULT_EXPIRES_IN = 60
+# how many seconds before expiration is a cached bearer token not used any more
+REGISTRY_TOKEN_EXPIRY_LEEWAY = 10
+# default maximum number of concurrent queries to a single registry
+DEFAULT_REGISTRY_QUERY_WORKERS = 5
 # max retries for git clone
 GIT_MAX_RETRIES = 3
 # how many seconds should wait before another try of git clone
@@ -22,6 +22,8 @@ I've tried to be as much consistent (man pages were source) with docker as possi
 
 
 """
+import hashlib
+import io
 import os
 import shutil
 import logging
@@ -37,11 +39,15 @@ from functools import wraps
 from atomic_reactor.constants import (CONTAINER_SHARE_PATH, CONTAINER_SHARE_SOURCE_SUBDIR,
                                       BUILD_JSON, DOCKER_SOCKET_PATH, DOCKER_MAX_RETRIES,
                                       DOCKER_BACKOFF_FACTOR, DOCKER_CLIENT_STATUS_RETRY,
+                                      DOCKER_EXPORT_BUFFER_SIZE,
+                                      DOCKER_EXPORT_PROGRESS_INTERVAL,
                                       CONTAINER_IMAGEBUILDER_BUILD_METHOD,
                                       CONTAINER_DOCKERPY_BUILD_METHOD)
 
+from atomic_reactor import tracing
 from atomic_reactor.source import get_source_instance_for
-from atomic_reactor.util import figure_out_build_file, Dockercfg
+from atomic_reactor.util import (figure_out_build_file, Dockercfg, human_size,
+                                 remember_checksums)
 from osbs.utils import clone_git_repo, ImageName
 
 from urllib3.exceptions import (InsecureRequestWarning, ProtocolError,
@@ -214,6 +220,7 @@ def retry(function, *args, **kwargs):
         except APIError as e:
             if (e.response.status_code in retry_client_statuses and counter != retry_times):
                 logger.info("retrying %s on %s", function, e.response.status_code)
+                tracing.current_span().add('retries')
                 time.sleep(retry_delay * (2 ** counter))
             else:
                 raise
@@ -226,6 +233,77 @@ class RetryGeneratorException(Exception):
         self.error = error
 
 
+class ExportStream(io.RawIOBase):
+    """
+    Readable file-like object for a (potentially very large) response of
+    the docker daemon, such as an exported container or a saved image
+
+    Data are read straight into the buffer of the caller and passed to hash
+    objects as memoryview slices, without intermediate copies, so checksums
+    and size of the exported content are known once it has been consumed.
+    """
+
+    def __init__(self, raw, algorithms=('md5', 'sha256'), progress=None, name=None):
+        """
+        :param raw: readable binary file-like object supporting readinto
+        :param algorithms: list of cryptographic hash functions, as for get_checksums
+        :param progress: callable, called with number of bytes read so far, optional
+        :param name: str, what is exported, used for logging progress
+        """
+        super(ExportStream, self).__init__()
+        self.raw = raw
+        self.size = 0
+        self.progress = progress
+        self.name = name
+        self._hash_objs = [getattr(hashlib, algorithm)() for algorithm in algorithms]
+        self._next_progress_log = DOCKER_EXPORT_PROGRESS_INTERVAL
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        count = self.raw.readinto(b)
+        if count:
+            data = memoryview(b)[:count]
+            for hash_obj in self._hash_objs:
+                hash_obj.update(data)
+            self.size += count
+            if self.progress is not None:
+                self.progress(self.size)
+            if self.size >= self._next_progress_log:
+                logger.debug("exported %s of %s", human_size(self.size), self.name)
+                self._next_progress_log += DOCKER_EXPORT_PROGRESS_INTERVAL
+        return count
+
+    def write_to(self, fileobj, buffer_size=DOCKER_EXPORT_BUFFER_SIZE):
+        """
+        Write the rest of the stream to a file, reusing a single buffer
+
+        :param fileobj: writable binary file-like object
+        :param buffer_size: int, size of the buffer
+        :return: int, size of the whole stream
+        """
+        view = memoryview(bytearray(buffer_size))
+        count = self.readinto(view)
+        while count:
+            fileobj.write(view[:count])
+            count = self.readinto(view)
+        return self.size
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super(ExportStream, self).close()
+
+    @property
+    def checksums(self):
+        """
+        :return: dict, checksums in the same format as get_checksums
+        """
+        return {'{}sum'.format(hash_obj.name): hash_obj.hexdigest()
+                for hash_obj in self._hash_objs}
+
+
 class WrappedDocker(object):
     def __init__(self, **kwargs):
         self.retry_times = kwargs.pop('retry', None)
@@ -243,7 +321,8 @@ class WrappedDocker(object):
         if callable(orig_attr):
             @wraps(orig_attr)
             def hooked(*args, **kwargs):
-                return retry(orig_attr, *args, retry=self.retry_times, **kwargs)
+                with tracing.span(attr, tracing.SPAN_DOCKER):
+                    return retry(orig_attr, *args, retry=self.retry_times, **kwargs)
             return hooked
         else:
             return orig_attr
@@ -262,6 +341,27 @@ class WrappedDocker(object):
     def export(self, container, chunk_size=1024*2048):
         return retry(self._export, container, chunk_size, retry=self.retry_times)
 
+    def _get_raw(self, url):
+        res = self.wrapped.get(url, stream=True)
+        self.wrapped._raise_for_status(res)
+        return res.raw
+
+    def export_raw(self, container):
+        """
+        :return: readable binary file-like object with the filesystem tar archive
+        """
+        url = self.wrapped._url("/containers/{0}/export", container)
+        with tracing.span('export', tracing.SPAN_DOCKER):
+            return retry(self._get_raw, url, retry=self.retry_times)
+
+    def get_image_raw(self, image):
+        """
+        :return: readable binary file-like object with the image tar archive
+        """
+        url = self.wrapped._url("/images/{0}/get", image)
+        with tracing.span('get_image', tracing.SPAN_DOCKER):
+            return retry(self._get_raw, url, retry=self.retry_times)
+
 
 class ContainerTasker(LastLogger):
     def __init__(self, base_url=None, retry_times=DOCKER_MAX_RETRIES,
@@ -371,9 +471,21 @@ class ContainerTasker(LastLogger):
     def get_image(self, *args, **kwargs):
         return self.tasker.get_image(*args, **kwargs)
 
+    def get_image_stream(self, *args, **kwargs):
+        return self.tasker.get_image_stream(*args, **kwargs)
+
+    def save_image(self, *args, **kwargs):
+        return self.tasker.save_image(*args, **kwargs)
+
+    def export_container_stream(self, *args, **kwargs):
+        return self.tasker.export_container_stream(*args, **kwargs)
+
     def import_image_from_stream(self, *args, **kwargs):
         return self.tasker.import_image_from_stream(*args, **kwargs)
 
+    def load_image(self, *args, **kwargs):
+        return self.tasker.load_image(*args, **kwargs)
+
     def get_archive(self, *args, **kwargs):
         return self.tasker.get_archive(*args, **kwargs)
 
@@ -943,6 +1055,50 @@ class DockerTasker(CommonTasker):
             image_id = image_id.to_str()
         return self.d.get_image(image_id)
 
+    def get_image_stream(self, image_id, progress=None):
+        """
+        stream image content without buffering it in memory
+
+        :param image_id: str or ImageName, id or name of the image
+        :param progress: callable, called with number of bytes read so far, optional
+        :return: ExportStream, readable tar archive of the image
+        """
+        if isinstance(image_id, ImageName):
+            image_id = image_id.to_str()
+        return ExportStream(self.d.get_image_raw(image_id), progress=progress, name=image_id)
+
+    def save_image(self, image_id, path, progress=None):
+        """
+        save image content to a file
+
+        Checksums of the file are computed while writing it and remembered,
+        see atomic_reactor.util.remember_checksums.
+
+        :param image_id: str or ImageName, id or name of the image
+        :param path: str, path of the file to create
+        :param progress: callable, called with number of bytes written so far, optional
+        :return: int, size of the file
+        """
+        with self.get_image_stream(image_id, progress=progress) as image_stream:
+            with open(path, 'wb') as image_file:
+                size = image_stream.write_to(image_file)
+            remember_checksums(path, image_stream.checksums)
+        return size
+
+    def load_image(self, path):
+        """
+        load image from a docker archive, the same way as `docker load`
+
+        :param path: str, path to the archive, which may be compressed
+        """
+        logger.info("loading image from %s", path)
+        with open(path, 'rb') as archive:
+            for item in self.d.load_image(archive) or []:
+                if 'error' in item:
+                    raise RuntimeError("loading image from {} failed: {}"
+                                       .format(path, item['error']))
+                logger.debug(item.get('stream', '').strip())
+
     def import_image_from_stream(self, filesystem):
         """
         return result json from importing image
@@ -972,6 +1128,17 @@ class DockerTasker(CommonTasker):
         """
         return self.d.export(container_id)
 
+    def export_container_stream(self, container_id, progress=None):
+        """
+        stream container filesystem without buffering it in memory
+
+        :param container_id: str
+        :param progress: callable, called with number of bytes read so far, optional
+        :return: ExportStream, readable tar archive of the filesystem
+        """
+        return ExportStream(self.d.export_raw(container_id), progress=progress,
+                            name=container_id)
+
     def create_container(self, image, command):
         """
         create container from provided image
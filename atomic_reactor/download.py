@@ -5,15 +5,21 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import hashlib
 import logging
 import os
+import threading
 import time
 import requests
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
-from atomic_reactor.util import get_retrying_requests_session
+from atomic_reactor.util import get_retrying_requests_session, human_size
 from atomic_reactor.constants import (
     DEFAULT_DOWNLOAD_BLOCK_SIZE,
+    DEFAULT_DOWNLOAD_WORKERS,
+    DEFAULT_DOWNLOAD_WORKERS_PER_HOST,
     HTTP_BACKOFF_FACTOR,
     HTTP_MAX_RETRIES,
 )
@@ -21,10 +27,19 @@ from atomic_reactor.constants import (
 
 logger = logging.getLogger(__name__)
 
+# url: str, URL to download from
+# dest: str, path of downloaded file, relative to destination directory
+# checksums: dict, expected checksums of the file by algorithm, e.g. {'md5': '...'}
+DownloadRequest = namedtuple('DownloadRequest', 'url dest checksums')
 
-def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None):
+
+def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None,
+                 checksums=None, stats=None):
     """Download file from URL, handling retries
 
+    If the download fails midway, it is resumed from where it stopped when the
+    server supports range requests.
+
     To download to a temporary directory, use:
       f = download_url(url, tempfile.mkdtemp())
 
@@ -33,6 +48,8 @@ def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None
     :param insecure: bool, whether to perform TLS checks
     :param session: optional existing requests session to use
     :param dest_filename: optional filename for downloaded file
+    :param checksums: optional dict, expected checksums by algorithm
+    :param stats: optional DownloadStats to record downloaded bytes in
     :return: str, path of downloaded file
     """
 
@@ -45,19 +62,153 @@ def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None
     dest_path = os.path.join(dest_dir, dest_filename)
     logger.debug('downloading %s', url)
 
+    checksums = checksums or {}
+    hashes = {algo: hashlib.new(algo) for algo in checksums}
+    offset = 0
+
     for attempt in range(HTTP_MAX_RETRIES + 1):
-        response = session.get(url, stream=True, verify=not insecure)
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+        response = session.get(url, stream=True, verify=not insecure, headers=headers)
         response.raise_for_status()
+        if offset and response.status_code != requests.codes.partial_content:
+            logger.debug('server does not support resuming download of %s, restarting', url)
+            hashes = {algo: hashlib.new(algo) for algo in checksums}
+            offset = 0
         try:
-            with open(dest_path, 'wb') as f:
+            with open(dest_path, 'r+b' if offset else 'wb') as f:
+                f.seek(offset)
+                f.truncate()
                 for chunk in response.iter_content(chunk_size=DEFAULT_DOWNLOAD_BLOCK_SIZE):
                     f.write(chunk)
+                    offset += len(chunk)
+                    for checksum in hashes.values():
+                        checksum.update(chunk)
+                    if stats is not None:
+                        stats.add_bytes(len(chunk))
             break
         except requests.exceptions.RequestException:
             if attempt < HTTP_MAX_RETRIES:
+                logger.debug('download of %s interrupted after %d bytes', url, offset)
                 time.sleep(HTTP_BACKOFF_FACTOR * (2 ** attempt))
             else:
                 raise
 
+    for algo, checksum in hashes.items():
+        if checksum.hexdigest() != checksums[algo]:
+            raise ValueError(
+                'Computed {} checksum, {}, does not match expected checksum, {}'
+                .format(algo, checksum.hexdigest(), checksums[algo]))
+
+    if stats is not None:
+        stats.add_file()
     logger.debug('download finished: %s', dest_path)
     return dest_path
+
+
+class DownloadStats(object):
+    """
+    Aggregate statistics of downloads, safe to update from multiple threads
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes += count
+
+    def add_file(self):
+        with self._lock:
+            self.files += 1
+
+    @property
+    def duration(self):
+        """Seconds spent downloading"""
+        if self.start_time is None:
+            return 0
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def throughput(self):
+        """Average throughput in bytes per second"""
+        duration = self.duration
+        return self.bytes / duration if duration else 0
+
+    def __str__(self):
+        return '{} files, {} in {:.2f} s ({}/s)'.format(
+            self.files, human_size(self.bytes), self.duration, human_size(self.throughput))
+
+
+class DownloadManager(object):
+    """
+    Download multiple files concurrently
+
+    At most max_workers files are downloaded at the same time, at most
+    max_workers_per_host of them from the same host.
+    """
+
+    def __init__(self, session=None, insecure=False, max_workers=DEFAULT_DOWNLOAD_WORKERS,
+                 max_workers_per_host=DEFAULT_DOWNLOAD_WORKERS_PER_HOST):
+        """
+        :param session: optional existing requests session to use
+        :param insecure: bool, whether to perform TLS checks
+        :param max_workers: int, maximum number of concurrent downloads
+        :param max_workers_per_host: int, maximum number of concurrent downloads from one host
+        """
+        self.session = session or get_retrying_requests_session()
+        self.insecure = insecure
+        self.max_workers = max_workers
+        self.max_workers_per_host = max_workers_per_host
+        self.stats = DownloadStats()
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def download(self, downloads, dest_dir):
+        """
+        Download files, creating subdirectories of dest_dir as needed
+
+        :param downloads: list of DownloadRequest, checksums may be empty
+        :param dest_dir: str, directory to download files into, created as needed
+        :return: list of str, paths of downloaded files, in order of downloads
+        :raises: the error of the first failed download (in order of downloads)
+        """
+        logger.debug('%d files to download', len(downloads))
+        self.stats.start_time = time.time()
+        self.stats.end_time = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._download, download, dest_dir)
+                       for download in downloads]
+            try:
+                paths = [future.result() for future in futures]
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                self.stats.end_time = time.time()
+
+        logger.info('downloaded %s', self.stats)
+        return paths
+
+    def _download(self, download, dest_dir):
+        dest_path = os.path.join(dest_dir, download.dest)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+        with self._get_host_semaphore(urlparse(download.url).netloc):
+            return download_url(download.url, os.path.dirname(dest_path),
+                                insecure=self.insecure, session=self.session,
+                                dest_filename=os.path.basename(dest_path),
+                                checksums=download.checksums, stats=self.stats)
+
+    def _get_host_semaphore(self, host):
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_workers_per_host)
+                self._host_semaphores[host] = semaphore
+        return semaphore
@@ -38,6 +38,8 @@ from atomic_reactor.constants import (
     PLUGIN_BUILD_ORCHESTRATE_KEY
 )
 from atomic_reactor.util import exception_message
+from atomic_reactor.utils.retries import ConnectionPools, set_connection_pools
+from atomic_reactor import tracing
 from atomic_reactor.build import BuildResult
 from atomic_reactor import get_logging_encoding
 from osbs.utils import ImageName
@@ -270,9 +272,13 @@ class FSWatcher(threading.Thread):
     Poll the filesystem every second in the background and keep a record of highest usage.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, tracer=None, **kwargs):
+        """
+        :param tracer: tracing.Tracer instance to record disk usage to, optional
+        """
         super(FSWatcher, self).__init__(*args, **kwargs)
         self.daemon = True  # exits whenever the process exits
+        self.tracer = tracer
         self._lock = threading.Lock()
         self._done = False
         self._data = {}
@@ -281,7 +287,10 @@ class FSWatcher(threading.Thread):
         """ Overrides parent method to implement thread's functionality. """
         while True:  # make sure to run at least once before exiting
             with self._lock:
-                self._update(self._data)
+                new_data = self._update(self._data)
+            if self.tracer and isinstance(new_data, dict):
+                self.tracer.counter('disk', mb_used=new_data['mb_used'],
+                                    inodes_used=new_data['inodes_used'])
             if self._done:
                 break
             time.sleep(1)
@@ -336,7 +345,8 @@ class DockerBuildWorkflow(object):
     def __init__(self, source=None, prebuild_plugins=None, prepublish_plugins=None,
                  postbuild_plugins=None, exit_plugins=None, plugin_files=None,
                  openshift_build_selflink=None, client_version=None,
-                 buildstep_plugins=None, **kwargs):
+                 buildstep_plugins=None, parallel_plugin_workers=None, trace_file=None,
+                 **kwargs):
         """
         :param source: dict, where/how to get source code to put in image
         :param prebuild_plugins: list of dicts, arguments for pre-build plugins
@@ -348,6 +358,10 @@ class DockerBuildWorkflow(object):
             on openshift) without the actual hostname/IP address
         :param client_version: str, osbs-client version used to render build json
         :param buildstep_plugins: list of dicts, arguments for build-step plugins
+        :param parallel_plugin_workers: int, run independent pre-build, pre-publish,
+            post-build and exit plugins concurrently using this many threads
+        :param trace_file: str, path to write trace of the build to, in the Chrome
+            trace event format
         """
         tmp_dir = tempfile.mkdtemp()
         if source is None:
@@ -374,7 +388,11 @@ class DockerBuildWorkflow(object):
         self.build_canceled = False
         self.plugin_failed = False
         self.plugin_files = plugin_files
-        self.fs_watcher = FSWatcher()
+        self.parallel_plugin_workers = parallel_plugin_workers
+        self.tracer = tracing.Tracer()
+        self.fs_watcher = FSWatcher(tracer=self.tracer)
+        self.trace_file = trace_file
+        self.connection_pools = ConnectionPools()
 
         self.kwargs = kwargs
 
@@ -404,7 +422,7 @@ class DockerBuildWorkflow(object):
 
         self.openshift_build_selflink = openshift_build_selflink
 
-        # List of RPMs that go into the final result, as per utils.rpm.parse_rpm_output
+        # Sequence of RPMs that go into the final result, as per utils.rpm.parse_rpm_output
         self.image_components = None
 
         # List of all yum repos. The provided repourls might be changed (by resolve_composes) when
@@ -486,22 +504,27 @@ class DockerBuildWorkflow(object):
         self.builder = InsideBuilder(self.source, self.image)
         # Make sure exit_runner is defined for finally block
         exit_runner = None
+        tracing.set_tracer(self.tracer)
+        set_connection_pools(self.connection_pools)
         try:
             self.fs_watcher.start()
             signal.signal(signal.SIGTERM, self.throw_canceled_build_exception)
             prebuild_runner = PreBuildPluginsRunner(self.builder.tasker, self,
                                                     self.prebuild_plugins_conf,
-                                                    plugin_files=self.plugin_files)
-            prepublish_runner = PrePublishPluginsRunner(self.builder.tasker, self,
-                                                        self.prepublish_plugins_conf,
-                                                        plugin_files=self.plugin_files)
+                                                    plugin_files=self.plugin_files,
+                                                    parallel_workers=self.parallel_plugin_workers)
+            prepublish_runner = PrePublishPluginsRunner(
+                self.builder.tasker, self, self.prepublish_plugins_conf,
+                plugin_files=self.plugin_files, parallel_workers=self.parallel_plugin_workers)
             postbuild_runner = PostBuildPluginsRunner(self.builder.tasker, self,
                                                       self.postbuild_plugins_conf,
-                                                      plugin_files=self.plugin_files)
+                                                      plugin_files=self.plugin_files,
+                                                      parallel_workers=self.parallel_plugin_workers)
             # time to run pre-build plugins, so they can access cloned repo
             logger.info("running pre-build plugins")
             try:
-                prebuild_runner.run()
+                with tracing.span('prebuild', tracing.SPAN_PHASE):
+                    prebuild_runner.run()
             except PluginFailedException as ex:
                 logger.error("one or more prebuild plugins failed: %s", ex)
                 raise
@@ -518,7 +541,8 @@ class DockerBuildWorkflow(object):
 
             logger.info("running buildstep plugins")
             try:
-                self.build_result = buildstep_runner.run()
+                with tracing.span('buildstep', tracing.SPAN_PHASE):
+                    self.build_result = buildstep_runner.run()
 
                 if self.build_result.is_failed():
                     raise PluginFailedException(self.build_result.fail_reason)
@@ -533,7 +557,8 @@ class DockerBuildWorkflow(object):
 
             # run prepublish plugins
             try:
-                prepublish_runner.run()
+                with tracing.span('prepublish', tracing.SPAN_PHASE):
+                    prepublish_runner.run()
             except PluginFailedException as ex:
                 logger.error("one or more prepublish plugins failed: %s", ex)
                 raise
@@ -550,7 +575,8 @@ class DockerBuildWorkflow(object):
                                     for (diff_id, layer) in zip(diff_ids, reversed(history))]
 
             try:
-                postbuild_runner.run()
+                with tracing.span('postbuild', tracing.SPAN_PHASE):
+                    postbuild_runner.run()
             except PluginFailedException as ex:
                 logger.error("one or more postbuild plugins failed: %s", ex)
                 raise
@@ -567,9 +593,11 @@ class DockerBuildWorkflow(object):
             exit_runner = ExitPluginsRunner(self.builder.tasker, self,
                                             self.exit_plugins_conf,
                                             keep_going=True,
-                                            plugin_files=self.plugin_files)
+                                            plugin_files=self.plugin_files,
+                                            parallel_workers=self.parallel_plugin_workers)
             try:
-                exit_runner.run(keep_going=True)
+                with tracing.span('exit', tracing.SPAN_PHASE):
+                    exit_runner.run(keep_going=True)
             except PluginFailedException as ex:
                 logger.error("one or more exit plugins failed: %s", ex)
 
@@ -581,6 +609,12 @@ class DockerBuildWorkflow(object):
             finally:
                 self.source.remove_tmpdir()
                 self.fs_watcher.finish()
+                if self.trace_file:
+                    self.tracer.export(self.trace_file)
+                tracing.set_tracer(None)
+                set_connection_pools(None)
+                self.connection_pools.close()
+                logger.debug("http connections: %s", self.connection_pools.stats())
 
             signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
@@ -11,23 +11,36 @@ definition of plugin system
 plugins are supposed to be run when image is built and we need to extract some information
 """
 import copy
+import json
 import logging
 import os
 import sys
+import tempfile
 import traceback
 import imp
 import datetime
 import inspect
 import time
 from collections import namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
+from atomic_reactor import tracing
 from atomic_reactor.build import BuildResult
+from atomic_reactor.constants import PLUGIN_INDEX_CACHE_ENV
 from atomic_reactor.util import process_substitutions, exception_message
 from dockerfile_parse import DockerfileParser
 
 MODULE_EXTENSIONS = ('.py', '.pyc', '.pyo')
+# base classes of plugins, one for each kind of runner
+PLUGIN_BASE_CLASSES = ('InputPlugin', 'PreBuildPlugin', 'BuildStepPlugin', 'PrePublishPlugin',
+                       'PostBuildPlugin', 'ExitPlugin')
+# version of the cached plugin index format
+PLUGIN_INDEX_VERSION = 1
 logger = logging.getLogger(__name__)
 
+_plugin_index = None
+
 
 class AutoRebuildCanceledException(Exception):
     """Raised if a plugin cancels autorebuild"""
@@ -61,6 +74,18 @@ class Plugin(object):
     # by default, if plugin fails (raises exc), execution continues
     is_allowed_to_fail = True
 
+    # what the plugin needs from the rest of the workflow; only used when
+    # plugins are run in parallel (see PluginsRunner._run_parallel)
+    # a plugin leaving all of these as None is treated as touching everything,
+    # so it is never run concurrently with any other plugin
+    #
+    # keys of plugins whose results this plugin uses
+    depends_on = None
+    # names of parts of the workflow state (e.g. 'dockerfile') this plugin reads
+    workflow_reads = None
+    # names of parts of the workflow state this plugin modifies
+    workflow_writes = None
+
     def __init__(self, *args, **kwargs):
         """
         constructor
@@ -117,6 +142,172 @@ class BuildPlugin(Plugin):
         return self.workflow.is_orchestrator_build()
 
 
+def get_plugin_index():
+    """
+    Get the index of plugin files shared by all runners in this process
+
+    :return: PluginIndex instance
+    """
+    global _plugin_index  # pylint: disable=global-statement
+    if _plugin_index is None:
+        cache_path = os.environ.get(PLUGIN_INDEX_CACHE_ENV)
+        _plugin_index = PluginIndex(os.path.expanduser(cache_path) if cache_path else None)
+    return _plugin_index
+
+
+def load_plugin_module(path):
+    """
+    Import a plugin file, already imported plugin files are not reloaded
+
+    :param path: str, path to the plugin file
+    :return: module, or None if the file can't be imported
+    """
+    module_name = os.path.basename(path).rsplit('.', 1)[0]
+    # Do not reload plugins
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    try:
+        logger.debug("load file '%s'", path)
+        return imp.load_source(module_name, path)
+    except (IOError, OSError, ImportError, SyntaxError) as ex:
+        logger.warning("can't load module '%s': %s", path, ex)
+        return None
+
+
+class PluginIndex(object):
+    """
+    Index of plugins defined in plugin files
+
+    Finding out which plugins a file defines requires importing it, which is
+    slow for plugins importing many other modules. The index remembers key,
+    class name and base classes of every plugin, so that only files of plugins
+    which are actually run have to be imported. When cache_path is set, the
+    index is also stored there for later processes; an entry is only valid as
+    long as modification time and size of its file don't change, entries of
+    files which don't exist any more are dropped.
+    """
+
+    def __init__(self, cache_path=None):
+        """
+        :param cache_path: str, path to file for storing the index, optional
+        """
+        self.cache_path = cache_path
+        # path -> {'mtime': int, 'size': int, 'plugins': {key: [class name, [base classes]]}}
+        self._files = None
+        self._changed = False
+
+    def get_plugins(self, files, plugin_class_name):
+        """
+        Find plugins of a kind, files not indexed yet are imported
+
+        :param files: list of str, paths to plugin files, plugins from later
+                      files replace plugins with the same key from earlier ones
+        :param plugin_class_name: str, name of plugin class (e.g. 'PreBuildPlugin')
+        :return: dict, plugin key -> (path to plugin file, plugin class name)
+        """
+        if self._files is None:
+            self._files = self._read_cache()
+
+        plugins = {}
+        for path in files:
+            entry = self._get_entry(path)
+            if entry is None:
+                continue
+            for key, (class_name, base_classes) in entry['plugins'].items():
+                if plugin_class_name in base_classes:
+                    plugins[key] = (path, class_name)
+
+        if self._changed:
+            self._write_cache()
+            self._changed = False
+        return plugins
+
+    def _get_entry(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError as ex:
+            logger.warning("can't load module '%s': %s", path, ex)
+            return None
+
+        entry = self._files.get(path)
+        if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry
+
+        module = load_plugin_module(path)
+        if module is None:
+            return None
+        plugins = {}
+        for name in dir(module):
+            binding = getattr(module, name, None)
+            # plugins imported from other files are indexed with their own file
+            if not inspect.isclass(binding) or binding.__module__ != module.__name__:
+                continue
+            base_classes = [base for base in PLUGIN_BASE_CLASSES
+                            if binding.__name__ != base and issubclass(binding, globals()[base])]
+            if base_classes and binding.key is not None:
+                plugins[binding.key] = [name, base_classes]
+
+        entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'plugins': plugins}
+        self._files[path] = entry
+        self._changed = True
+        return entry
+
+    def _read_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != PLUGIN_INDEX_VERSION:
+            return {}
+        return data.get('files', {})
+
+    def _write_cache(self):
+        if not self.cache_path:
+            return
+        dirname = os.path.dirname(self.cache_path)
+        self._files = {path: entry for path, entry in self._files.items()
+                       if os.path.exists(path)}
+        data = {'version': PLUGIN_INDEX_VERSION, 'files': self._files}
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except (IOError, OSError) as exc:
+            # the index is only an optimization, never fail because of it
+            logger.debug("failed to write plugin index %s: %s", self.cache_path, exc)
+
+
+class PluginClasses(Mapping):
+    """
+    Plugin classes by plugin key, plugin files are imported on first access
+    """
+
+    def __init__(self, plugins):
+        """
+        :param plugins: dict, plugin key -> (path to plugin file, plugin class name)
+        """
+        self._plugins = plugins
+
+    def __getitem__(self, key):
+        path, class_name = self._plugins[key]
+        module = load_plugin_module(path)
+        try:
+            return getattr(module, class_name)
+        except AttributeError as exc:
+            raise KeyError(key) from exc
+
+    def __iter__(self):
+        return iter(self._plugins)
+
+    def __len__(self):
+        return len(self._plugins)
+
+
 class PluginsRunner(object):
 
     def __init__(self, plugin_class_name, plugins_conf, *args, **kwargs):
@@ -129,15 +320,18 @@ class PluginsRunner(object):
         self.plugins_results = getattr(self, "plugins_results", {})
         self.plugins_conf = plugins_conf or []
         self.plugin_files = kwargs.get("plugin_files", [])
+        # number of plugins allowed to run at once, plugins run one by one when not set
+        self.parallel_workers = kwargs.get("parallel_workers")
         self.plugin_classes = self.load_plugins(plugin_class_name)
         self.available_plugins = self.get_available_plugins()
 
     def load_plugins(self, plugin_class_name):
         """
-        load all available plugins
+        find all available plugins, plugin files are imported only when
+        classes of their plugins are looked up
 
         :param plugin_class_name: str, name of plugin class (e.g. 'PreBuildPlugin')
-        :return: dict, bindings for plugins of the plugin_class_name class
+        :return: PluginClasses, bindings for plugins of the plugin_class_name class
         """
         # imp.findmodule('atomic_reactor') doesn't work
         plugins_dir = os.path.join(os.path.dirname(__file__), 'plugins')
@@ -148,36 +342,7 @@ class PluginsRunner(object):
         if self.plugin_files:
             logger.debug("loading additional plugins from files '%s'", self.plugin_files)
             files += self.plugin_files
-        plugin_class = globals()[plugin_class_name]
-        plugin_classes = {}
-        for f in files:
-            module_name = os.path.basename(f).rsplit('.', 1)[0]
-            # Do not reload plugins
-            if module_name in sys.modules:
-                f_module = sys.modules[module_name]
-            else:
-                try:
-                    logger.debug("load file '%s'", f)
-                    f_module = imp.load_source(module_name, f)
-                except (IOError, OSError, ImportError, SyntaxError) as ex:
-                    logger.warning("can't load module '%s': %s", f, ex)
-                    continue
-            for name in dir(f_module):
-                binding = getattr(f_module, name, None)
-                try:
-                    # if you try to compare binding and PostBuildPlugin, python won't match them
-                    # if you call this script directly b/c:
-                    # ! <class 'plugins.plugin_rpmqa.PostBuildRPMqaPlugin'> <= <class
-                    # '__main__.PostBuildPlugin'>
-                    # but
-                    # <class 'plugins.plugin_rpmqa.PostBuildRPMqaPlugin'> <= <class
-                    # 'atomic_reactor.plugin.PostBuildPlugin'>
-                    is_sub = issubclass(binding, plugin_class)
-                except TypeError:
-                    is_sub = False
-                if binding and is_sub and plugin_class.__name__ != binding.__name__:
-                    plugin_classes[binding.key] = binding
-        return plugin_classes
+        return PluginClasses(get_plugin_index().get_plugins(files, plugin_class_name))
 
     def create_instance_from_plugin(self, plugin_class, plugin_conf):
         """
@@ -236,6 +401,164 @@ class PluginsRunner(object):
             available_plugins.append(plugin)
         return available_plugins
 
+    def _record_plugin_duration(self, plugin, start_time):
+        try:
+            if start_time:
+                finish_time = datetime.datetime.now()
+                duration = finish_time - start_time
+                seconds = duration.total_seconds()
+                logger.debug("plugin '%s' finished in %ds", plugin.name, seconds)
+                self.save_plugin_duration(plugin.plugin_class.key, seconds)
+        except Exception:
+            logger.exception("failed to save plugin duration")
+
+    def get_plugin_dependencies(self):
+        """
+        find out which of the previously configured plugins have to finish
+        before each of the available plugins can be started
+
+        A plugin has to wait for an earlier one when either of them doesn't
+        declare what it uses, when it depends on the earlier plugin's key, or
+        when one of them modifies workflow state the other one reads or modifies.
+
+        :return: list of sets, indexes (into available_plugins) of plugins
+                 which have to finish first, one set for each available plugin
+        """
+        def is_declared(plugin_class):
+            return any(getattr(plugin_class, attr, None) is not None
+                       for attr in ('depends_on', 'workflow_reads', 'workflow_writes'))
+
+        dependencies = []
+        for index, plugin in enumerate(self.available_plugins):
+            plugin_class = plugin.plugin_class
+            reads = set(getattr(plugin_class, 'workflow_reads', None) or ())
+            writes = set(getattr(plugin_class, 'workflow_writes', None) or ())
+            depends_on = set(getattr(plugin_class, 'depends_on', None) or ())
+
+            waits_for = set()
+            for prev_index, prev_plugin in enumerate(self.available_plugins[:index]):
+                prev_class = prev_plugin.plugin_class
+                prev_reads = set(getattr(prev_class, 'workflow_reads', None) or ())
+                prev_writes = set(getattr(prev_class, 'workflow_writes', None) or ())
+
+                if (not is_declared(plugin_class) or not is_declared(prev_class) or
+                        prev_plugin.name == plugin.name or
+                        prev_class.key in depends_on or
+                        prev_writes & (reads | writes) or
+                        writes & prev_reads):
+                    waits_for.add(prev_index)
+
+            dependencies.append(waits_for)
+        return dependencies
+
+    def _run_plugin_in_worker(self, plugin, parent_span):
+        """
+        run a single plugin from a worker thread of _run_parallel
+
+        :param parent_span: tracing.Span of the phase, spans are not
+                            inherited by worker threads
+        :return: tuple, (plugin response, exception raised by the plugin or None)
+        """
+        logger.debug("running plugin '%s'", plugin.name)
+        start_time = datetime.datetime.now()
+        try:
+            plugin_instance = self.create_instance_from_plugin(plugin.plugin_class,
+                                                               plugin.conf)
+            self.save_plugin_timestamp(plugin.plugin_class.key, start_time)
+            with tracing.span(plugin.name, tracing.SPAN_PLUGIN, parent=parent_span):
+                return plugin_instance.run(), None
+        except Exception as ex:
+            logger.debug(traceback.format_exc())
+            return None, ex
+        finally:
+            self._record_plugin_duration(plugin, start_time)
+
+    def _run_parallel(self, keep_going=False):
+        """
+        run all requested plugins, plugins which don't depend on each other
+        (see get_plugin_dependencies) are run concurrently
+
+        Failures are handled the same way as when running plugins one by one,
+        except that when a plugin fails fatally, plugins already running are
+        allowed to finish before the exception is raised.
+
+        :param keep_going: bool, whether to keep going after unexpected
+                                 failure (only used for exit plugins)
+        """
+        dependencies = self.get_plugin_dependencies()
+        pending = list(range(len(self.available_plugins)))
+        finished = set()
+        running = {}
+        failed_msgs = []
+        fatal_exc = None
+
+        logger.debug("running plugins using %d workers", self.parallel_workers)
+        parent_span = tracing.current_span()
+        executor = ThreadPoolExecutor(max_workers=self.parallel_workers)
+        try:
+            while pending or running:
+                if fatal_exc is None:
+                    # keep configured order when submitting plugins which are ready
+                    for index in [i for i in pending if dependencies[i] <= finished]:
+                        pending.remove(index)
+                        future = executor.submit(self._run_plugin_in_worker,
+                                                 self.available_plugins[index], parent_span)
+                        running[future] = index
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    finished.add(index)
+                    plugin = self.available_plugins[index]
+                    plugin_response, ex = future.result()
+
+                    if isinstance(ex, (AutoRebuildCanceledException,
+                                       InappropriateBuildStepError)):
+                        if isinstance(ex, InappropriateBuildStepError):
+                            logger.debug('Build step %s is not appropriate',
+                                         plugin.plugin_class.key)
+                        fatal_exc = fatal_exc or ex
+                        continue
+                    elif ex is not None:
+                        msg = "plugin '%s' raised an exception: %s" % (plugin.plugin_class.key,
+                                                                       exception_message(ex))
+                        if not plugin.is_allowed_to_fail:
+                            self.on_plugin_failed(plugin.plugin_class.key, ex)
+
+                        if plugin.is_allowed_to_fail or keep_going:
+                            logger.warning(msg)
+                            logger.info("error is not fatal, continuing...")
+                            if not plugin.is_allowed_to_fail:
+                                failed_msgs.append(msg)
+                        else:
+                            logger.error(msg)
+                            if fatal_exc is None:
+                                fatal_exc = PluginFailedException(msg)
+                                fatal_exc.__cause__ = ex
+                            continue
+
+                        plugin_response = ex
+
+                    self.plugins_results[plugin.plugin_class.key] = plugin_response
+        finally:
+            # don't start plugins which are still queued, e.g. when the build is canceled
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        if fatal_exc is not None:
+            raise fatal_exc
+
+        if len(failed_msgs) == 1:
+            raise PluginFailedException(failed_msgs[0])
+        elif len(failed_msgs) > 1:
+            raise PluginFailedException("Multiple plugins raised an exception: " +
+                                        str(failed_msgs))
+
+        return self.plugins_results
+
     def run(self, keep_going=False, buildstep_phase=False):
         """
         run all requested plugins
@@ -246,6 +569,9 @@ class PluginsRunner(object):
                                 not be executed after a plugin completes
                                 (only used for build-step plugins)
         """
+        if self.parallel_workers and self.parallel_workers > 1 and not buildstep_phase:
+            return self._run_parallel(keep_going=keep_going)
+
         failed_msgs = []
         plugin_successful = False
         plugin_response = None
@@ -262,7 +588,8 @@ class PluginsRunner(object):
                 plugin_instance = self.create_instance_from_plugin(plugin.plugin_class,
                                                                    plugin.conf)
                 self.save_plugin_timestamp(plugin.plugin_class.key, start_time)
-                plugin_response = plugin_instance.run()
+                with tracing.span(plugin.name, tracing.SPAN_PLUGIN):
+                    plugin_response = plugin_instance.run()
                 plugin_successful = True
                 if buildstep_phase:
                     assert isinstance(plugin_response, BuildResult)
@@ -307,15 +634,7 @@ class PluginsRunner(object):
 
                 plugin_response = ex
 
-            try:
-                if start_time:
-                    finish_time = datetime.datetime.now()
-                    duration = finish_time - start_time
-                    seconds = duration.total_seconds()
-                    logger.debug("plugin '%s' finished in %ds", plugin.name, seconds)
-                    self.save_plugin_duration(plugin.plugin_class.key, seconds)
-            except Exception:
-                logger.exception("failed to save plugin duration")
+            self._record_plugin_duration(plugin, start_time)
 
             if not skip_response:
                 self.plugins_results[plugin.plugin_class.key] = plugin_response
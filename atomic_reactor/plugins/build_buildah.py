@@ -67,8 +67,7 @@ class BuildahPlugin(BuildStepPlugin):
         # since we need no squash, export the image for local operations like squash would have
         self.log.info("fetching image %s from docker", image)
         output_path = os.path.join(self.workflow.source.workdir, EXPORTED_SQUASHED_IMAGE_NAME)
-        with open(output_path, "w") as image_file:
-            image_file.write(self.tasker.get_image(image).data)
+        self.tasker.save_image(image, output_path)
         img_metadata = get_exported_image_metadata(output_path, IMAGE_TYPE_DOCKER_ARCHIVE)
         self.workflow.exported_image_sequence.append(img_metadata)
 
@@ -6,9 +6,11 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from multiprocessing.pool import ThreadPool
+from functools import partial
 
+import asyncio
 import json
 from operator import attrgetter
 import time
@@ -17,6 +19,9 @@ from datetime import timedelta
 import datetime as dt
 import copy
 import platform
+import signal
+import socket
+import threading
 
 from atomic_reactor.build import BuildResult
 from atomic_reactor.plugin import BuildStepPlugin
@@ -47,9 +52,15 @@ ClusterInfo = namedtuple('ClusterInfo', ('cluster', 'platform', 'osbs', 'load'))
 WORKSPACE_KEY_BUILD_INFO = 'build_info'
 WORKSPACE_KEY_UPLOAD_DIR = 'koji_upload_dir'
 WORKSPACE_KEY_OVERRIDE_KWARGS = 'override_kwargs'
+WORKSPACE_KEY_CLUSTER_METRICS = 'cluster_metrics'
 FIND_CLUSTER_RETRY_DELAY = 15.0
 FAILURE_RETRY_DELAY = 10.0
 MAX_CLUSTER_FAILS = 20
+CLUSTER_STATE_TTL = 10.0
+# increase of cluster score if all attempts to create a worker build on it failed
+CLUSTER_FAILURE_PENALTY = 1.0
+# increase of cluster score for each second it took to create a worker build
+CLUSTER_DISPATCH_LATENCY_PENALTY = 0.05
 
 
 def get_worker_build_info(workflow, platform):
@@ -68,9 +79,25 @@ def get_koji_upload_dir(workflow):
     return workspace[WORKSPACE_KEY_UPLOAD_DIR]
 
 
+def get_cluster_metrics(workflow):
+    """
+    Obtain latencies of attempts to start worker builds, by cluster name
+
+    Each attempt is a dict with keys 'platform', 'queue_latency' (seconds
+    from the start of cluster selection for the platform until the build was
+    submitted to the cluster), 'dispatch_latency' (seconds the cluster took
+    to create the build) and 'succeeded' (whether the build was created).
+    """
+    workspace = workflow.plugin_workspace[OrchestrateBuildPlugin.key]
+    return workspace[WORKSPACE_KEY_CLUSTER_METRICS]
+
+
 def override_build_kwarg(workflow, k, v, platform=None):
     """
     Override a build-kwarg for all worker builds
+
+    Plugins calling this have to include 'build_kwargs_override' in their
+    workflow_writes, overrides are not safe to modify concurrently.
     """
     key = OrchestrateBuildPlugin.key
     # Use None to indicate an override for all platforms
@@ -121,7 +148,64 @@ class ClusterRetryContext(object):
             self.retry_at = (dt.datetime.now() + timedelta(seconds=seconds))
 
 
-def wait_for_any_cluster(contexts):
+class ClusterStateCache(object):
+    """
+    Number of active builds on each cluster, shared by all platforms
+
+    Clusters enabled for several platforms are queried only once per ttl
+    seconds, and builds started by this orchestrator are added to the cached
+    values immediately, so that other platforms see the increased load.
+    """
+
+    def __init__(self, ttl=CLUSTER_STATE_TTL):
+        """
+        :param ttl: float, for how many seconds the number of builds is valid
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # cluster name -> lock held while querying the cluster
+        self._query_locks = {}
+        # cluster name -> (number of active builds, time.monotonic() of query)
+        self._current_builds = {}
+
+    def get_current_builds(self, cluster_name, query):
+        """
+        Get number of active builds on a cluster, calling query() if not cached
+
+        Concurrent callers asking for the same cluster wait for a single query.
+
+        :param cluster_name: str
+        :param query: callable returning the number of active builds
+        :return: int
+        """
+        with self._lock:
+            query_lock = self._query_locks.setdefault(cluster_name, threading.Lock())
+
+        with query_lock:
+            with self._lock:
+                cached = self._current_builds.get(cluster_name)
+            if cached is not None and time.monotonic() - cached[1] < self.ttl:
+                return cached[0]
+
+            current_builds = query()
+            with self._lock:
+                self._current_builds[cluster_name] = (current_builds, time.monotonic())
+            return current_builds
+
+    def add_build(self, cluster_name):
+        """Account for a build started on a cluster"""
+        with self._lock:
+            cached = self._current_builds.get(cluster_name)
+            if cached is not None:
+                self._current_builds[cluster_name] = (cached[0] + 1, cached[1])
+
+    def invalidate(self, cluster_name):
+        """Forget the number of builds on a cluster, e.g. after it failed"""
+        with self._lock:
+            self._current_builds.pop(cluster_name, None)
+
+
+async def wait_for_any_cluster(contexts):
     """
     Wait until any of the clusters are out of retry-wait
 
@@ -137,7 +221,7 @@ def wait_for_any_cluster(contexts):
         ) from exc
 
     time_until_next = earliest_retry_at - dt.datetime.now()
-    time.sleep(max(timedelta(seconds=0), time_until_next).seconds)
+    await asyncio.sleep(max(timedelta(seconds=0), time_until_next).total_seconds())
 
 
 class WorkerBuildInfo(object):
@@ -234,6 +318,10 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
     failed BuildResult. Although, it does wait for all worker builds
     to complete in any case.
 
+    All worker builds are supervised by a single asyncio event loop,
+    blocking osbs-client calls (e.g. following the logs of a worker
+    build) are run in a thread pool with one thread per platform.
+
     If all worker builds succeed, then this plugin returns a
     successful BuildResult, but with a remote image result. The
     image is built in the worker builds which is likely a different
@@ -257,7 +345,7 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
                  failure_retry_delay=FAILURE_RETRY_DELAY,
                  max_cluster_fails=MAX_CLUSTER_FAILS,
                  url=None, verify_ssl=True, use_auth=True,
-                 goarch=None):
+                 goarch=None, cluster_state_ttl=CLUSTER_STATE_TTL):
         """
         constructor
 
@@ -275,6 +363,8 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
         :param max_cluster_fails: the maximum number of times a cluster can fail before being
                                   ignored
         :param goarch: dict, keys are platform, values are go language platform names
+        :param cluster_state_ttl: for how many seconds the number of active builds
+                                  on a cluster is reused
         """
         super(OrchestrateBuildPlugin, self).__init__(tasker, workflow)
         self.platforms = get_platforms(self.workflow)
@@ -311,6 +401,10 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
             self.log.warning('worker_build_image is deprecated')
 
         self.worker_builds = []
+        self.cluster_metrics = {}
+        self.cluster_state = ClusterStateCache(cluster_state_ttl)
+        self._executor = None
+        self._cancelling = False
         self.namespace = get_build_json().get('metadata', {}).get('namespace', None)
         self.build_image_digests = {}  # by platform
         self._openshift_session = None
@@ -446,20 +540,45 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
 
         osbs = self._get_openshift_session(kwargs)
 
-        current_builds = self.get_current_builds(osbs)
+        current_builds = self.cluster_state.get_current_builds(
+            cluster.name, partial(self.get_current_builds, osbs))
 
         load = current_builds / cluster.max_concurrent_builds
         self.log.debug('enabled cluster %s for platform %s has load %s and active builds %s/%s',
                        cluster.name, platform, load, current_builds, cluster.max_concurrent_builds)
         return ClusterInfo(cluster, platform, osbs, load)
 
-    def get_clusters(self, platform, retry_contexts, all_clusters):
-        ''' return clusters sorted by load. '''
+    async def call_blocking(self, func, *args, **kwargs):
+        """
+        Call a blocking function in the thread pool, without blocking the event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def get_cluster_score(self, cluster_info):
+        """
+        Score cluster for starting a worker build, lower is better
+
+        The score is the load of the cluster, increased for clusters which
+        failed or were slow to create worker builds during this build.
+        """
+        attempts = self.cluster_metrics.get(cluster_info.cluster.name)
+        if not attempts:
+            return cluster_info.load
+
+        failure_rate = sum(not attempt['succeeded'] for attempt in attempts) / len(attempts)
+        dispatch_latency = sum(attempt['dispatch_latency'] for attempt in attempts) / len(attempts)
+        return (cluster_info.load +
+                CLUSTER_FAILURE_PENALTY * failure_rate +
+                CLUSTER_DISPATCH_LATENCY_PENALTY * dispatch_latency)
+
+    async def get_clusters(self, platform, retry_contexts, all_clusters):
+        ''' return clusters sorted by score. '''
 
         possible_cluster_info = {}
         candidates = set(copy.copy(all_clusters))
         while candidates and not possible_cluster_info:
-            wait_for_any_cluster(retry_contexts)
+            await wait_for_any_cluster(retry_contexts)
 
             for cluster in sorted(candidates, key=attrgetter('priority')):
                 ctx = retry_contexts[cluster.name]
@@ -468,14 +587,15 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
                 if ctx.failed:
                     continue
                 try:
-                    cluster_info = self.get_cluster_info(cluster, platform)
+                    cluster_info = await self.call_blocking(self.get_cluster_info,
+                                                            cluster, platform)
                     possible_cluster_info[cluster] = cluster_info
                 except OsbsException:
                     ctx.try_again_later(self.find_cluster_retry_delay)
             candidates -= {c for c in candidates if retry_contexts[c.name].failed}
 
         ret = sorted(possible_cluster_info.values(), key=lambda c: c.cluster.priority)
-        ret = sorted(ret, key=lambda c: c.load)
+        ret = sorted(ret, key=self.get_cluster_score)
         return ret
 
     def get_release(self):
@@ -511,7 +631,7 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
             build_kwargs['filesystem_koji_task_id'] = task_id
 
         if not self.reactor_config.is_default():
-            worker_reactor_conf = deepcopy(self.reactor_config.conf)
+            worker_reactor_conf = self.reactor_config.conf.mutable_copy()
             worker_reactor_conf['openshift'] = worker_openshift
             worker_reactor_conf.pop('worker_token_secrets', None)
             self._update_content_versions(worker_reactor_conf)
@@ -543,11 +663,29 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
 
         return task_id
 
-    def do_worker_build(self, cluster_info):
+    def record_dispatch(self, cluster_info, queue_latency, dispatch_latency, succeeded):
+        attempts = self.cluster_metrics.setdefault(cluster_info.cluster.name, [])
+        attempts.append({
+            'platform': cluster_info.platform,
+            'queue_latency': queue_latency,
+            'dispatch_latency': dispatch_latency,
+            'succeeded': succeeded,
+        })
+
+    def log_cluster_metrics(self):
+        for cluster, attempts in sorted(self.cluster_metrics.items()):
+            for attempt in attempts:
+                self.log.debug('cluster %s, platform %s: queued for %.3fs, dispatched in %.3fs%s',
+                               cluster, attempt['platform'], attempt['queue_latency'],
+                               attempt['dispatch_latency'],
+                               '' if attempt['succeeded'] else ' (failed)')
+
+    async def do_worker_build(self, cluster_info, queued_at):
         workspace = self.workflow.plugin_workspace.get(self.key, {})
         override_kwargs = workspace.get(WORKSPACE_KEY_OVERRIDE_KWARGS, {})
 
         build = None
+        dispatched_at = time.monotonic()
 
         try:
             worker_openshift = {
@@ -569,9 +707,12 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
                 self.log.debug("%s - overriding with %s", cluster_info.platform,
                                override_kwargs[cluster_info.platform])
                 kwargs.update(override_kwargs[cluster_info.platform])
-            with cluster_info.osbs.retries_disabled():
-                build = cluster_info.osbs.create_worker_build(**kwargs)
+            build = await self.call_blocking(self.create_worker_build, cluster_info.osbs,
+                                             **kwargs)
         except OsbsException:
+            self.record_dispatch(cluster_info, dispatched_at - queued_at,
+                                 time.monotonic() - dispatched_at, False)
+            self.cluster_state.invalidate(cluster_info.cluster.name)
             self.log.exception('%s - failed to create worker build.',
                                cluster_info.platform)
             raise
@@ -579,15 +720,22 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
             self.log.exception('%s - failed to create worker build',
                                cluster_info.platform)
 
+        self.record_dispatch(cluster_info, dispatched_at - queued_at,
+                             time.monotonic() - dispatched_at, build is not None)
+
         build_info = WorkerBuildInfo(build=build, cluster_info=cluster_info, logger=self.log)
         self.worker_builds.append(build_info)
 
         if build_info.build:
+            self.cluster_state.add_build(cluster_info.cluster.name)
             try:
                 self.log.info('%s - created build %s on cluster %s.', cluster_info.platform,
                               build_info.name, cluster_info.cluster.name)
-                build_info.watch_logs()
-                build_info.wait_to_finish()
+                if self._cancelling:
+                    # the orchestrator build was cancelled while this build was being created
+                    await self.call_blocking(build_info.cancel_build)
+                await self.call_blocking(build_info.watch_logs)
+                await self.call_blocking(build_info.wait_to_finish)
             except Exception as e:
                 build_info.monitor_exception = e
                 self.log.exception('%s - failed to monitor worker build',
@@ -596,13 +744,18 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
                 # Attempt to cancel it rather than leave it running
                 # unmonitored.
                 try:
-                    build_info.cancel_build()
+                    await self.call_blocking(build_info.cancel_build)
                 except OsbsException:
                     pass
 
-    def select_and_start_cluster(self, platform):
+    def create_worker_build(self, osbs, **kwargs):
+        with osbs.retries_disabled():
+            return osbs.create_worker_build(**kwargs)
+
+    async def select_and_start_cluster(self, platform):
         ''' Choose a cluster and start a build on it '''
 
+        queued_at = time.monotonic()
         clusters = self.reactor_config.get_enabled_clusters_for_platform(platform)
 
         if not clusters:
@@ -614,11 +767,11 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
             for cluster in clusters
         }
 
-        while True:
+        while not self._cancelling:
             try:
-                possible_cluster_info = self.get_clusters(platform,
-                                                          retry_contexts,
-                                                          clusters)
+                possible_cluster_info = await self.get_clusters(platform,
+                                                                retry_contexts,
+                                                                clusters)
             except AllClustersFailedException as ex:
                 cluster = ClusterInfo(None, platform, None, None)
                 build_info = WorkerBuildInfo(build=None,
@@ -629,11 +782,13 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
                 return
 
             for cluster_info in possible_cluster_info:
+                if self._cancelling:
+                    return
                 ctx = retry_contexts[cluster_info.cluster.name]
                 try:
                     self.log.info('Attempting to start build for platform %s on cluster %s',
                                   platform, cluster_info.cluster.name)
-                    self.do_worker_build(cluster_info)
+                    await self.do_worker_build(cluster_info, queued_at)
                     return
                 except OsbsException:
                     ctx.try_again_later(self.failure_retry_delay)
@@ -819,30 +974,59 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
             self.check_manifest_list(build_image, orchestrator_platform,
                                      manifest_list_platforms, current_buildimage)
 
-    def run(self):
-        if not self.platforms:
-            raise RuntimeError("No enabled platform to build on")
-        self.set_build_image()
+    def cancel_worker_builds(self):
+        self._cancelling = True
+        self.log.info('build cancelled, cancelling worker builds')
+        if self.worker_builds:
+            with ThreadPoolExecutor(max_workers=len(self.worker_builds)) as executor:
+                list(executor.map(lambda bi: bi.cancel_build(), self.worker_builds))
 
-        thread_pool = ThreadPool(len(self.platforms))
-        result = thread_pool.map_async(self.select_and_start_cluster, self.platforms)
+    def supervise_worker_builds(self):
+        """
+        Start worker builds for all platforms and wait until all of them finish
+        """
+        loop = asyncio.new_event_loop()
+        # one blocking call (usually following logs of the worker build) per platform
+        self._executor = ThreadPoolExecutor(max_workers=len(self.platforms))
+        tasks = [loop.create_task(self.select_and_start_cluster(platform))
+                 for platform in sorted(self.platforms)]
+        all_tasks = asyncio.gather(*tasks, return_exceptions=True)
+        wakeup_fd = None
+        wakeup_socks = socket.socketpair()
 
         try:
-            result.get()
+            if threading.current_thread() is threading.main_thread():
+                # Signals (e.g. SIGTERM cancelling the build) are handled only by the main
+                # thread, wake up the event loop even if the signal hits another thread
+                for sock in wakeup_socks:
+                    sock.setblocking(False)
+                wakeup_fd = signal.set_wakeup_fd(wakeup_socks[1].fileno())
+                loop.add_reader(wakeup_socks[0].fileno(), wakeup_socks[0].recv, 4096)
+
+            loop.run_until_complete(asyncio.gather(*tasks))
         # Always clean up worker builds on any error to avoid
         # runaway worker builds (includes orchestrator build cancellation)
         except Exception:
-            thread_pool.terminate()
-            self.log.info('build cancelled, cancelling worker builds')
-            if self.worker_builds:
-                ThreadPool(len(self.worker_builds)).map(
-                    lambda bi: bi.cancel_build(), self.worker_builds)
-            while not result.ready():
-                result.wait(1)
+            self.cancel_worker_builds()
+            # monitoring of the cancelled builds finishes on its own, builds which
+            # are still being created are cancelled as soon as they are created
+            loop.run_until_complete(all_tasks)
             raise
-        else:
-            thread_pool.close()
-            thread_pool.join()
+        finally:
+            if wakeup_fd is not None:
+                signal.set_wakeup_fd(wakeup_fd)
+            for sock in wakeup_socks:
+                sock.close()
+            self._executor.shutdown(wait=False)
+            loop.close()
+
+    def run(self):
+        if not self.platforms:
+            raise RuntimeError("No enabled platform to build on")
+        self.set_build_image()
+
+        self.supervise_worker_builds()
+        self.log_cluster_metrics()
 
         annotations = {'worker-builds': {
             build_info.platform: build_info.get_annotations()
@@ -859,6 +1043,7 @@ class OrchestrateBuildPlugin(BuildStepPlugin):
         workspace[WORKSPACE_KEY_UPLOAD_DIR] = self.koji_upload_dir
         workspace[WORKSPACE_KEY_BUILD_INFO] = {build_info.platform: build_info
                                                for build_info in self.worker_builds}
+        workspace[WORKSPACE_KEY_CLUSTER_METRICS] = self.cluster_metrics
 
         if fail_reasons:
             return BuildResult(fail_reason=json.dumps(fail_reasons),
@@ -9,6 +9,7 @@ import os
 import subprocess
 import tempfile
 
+from atomic_reactor import tracing
 from atomic_reactor.build import BuildResult
 from atomic_reactor.constants import (PLUGIN_SOURCE_CONTAINER_KEY, EXPORTED_SQUASHED_IMAGE_NAME,
                                       IMAGE_TYPE_DOCKER_ARCHIVE, PLUGIN_FETCH_SOURCES_KEY)
@@ -34,7 +35,8 @@ class SourceContainerPlugin(BuildStepPlugin):
 
         self.log.info("Calling: %s", ' '.join(cmd))
         try:
-            subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+            with tracing.span(cmd[0], tracing.SPAN_SUBPROCESS):
+                subprocess.check_output(cmd, stderr=subprocess.STDOUT)
         except subprocess.CalledProcessError as e:
             self.log.error("failed to save docker-archive :\n%s", e.output)
             raise
@@ -86,7 +88,8 @@ class SourceContainerPlugin(BuildStepPlugin):
         cmd.append('{}'.format(image_output_dir))
 
         try:
-            output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+            with tracing.span(cmd[0], tracing.SPAN_SUBPROCESS):
+                output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
         except subprocess.CalledProcessError as e:
             self.log.error("BSI failed with output:\n%s", e.output)
             return BuildResult(logs=e.output, fail_reason='BSI utility failed build source image')
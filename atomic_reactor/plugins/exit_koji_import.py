@@ -30,7 +30,6 @@ from atomic_reactor.utils.koji import (
         get_source_tarball_output, get_remote_source_json_output
 )
 from atomic_reactor.plugins.pre_reactor_config import get_openshift_session
-from atomic_reactor.plugins.pre_fetch_sources import PLUGIN_FETCH_SOURCES_KEY
 
 try:
     from atomic_reactor.plugins.pre_flatpak_update_dockerfile import get_flatpak_compose_info
@@ -42,6 +41,7 @@ except ImportError:
 from atomic_reactor.constants import (
     PROG,
     PLUGIN_KOJI_IMPORT_PLUGIN_KEY, PLUGIN_KOJI_IMPORT_SOURCE_CONTAINER_PLUGIN_KEY,
+    PLUGIN_FETCH_SOURCES_KEY,
     PLUGIN_FETCH_WORKER_METADATA_KEY, PLUGIN_GROUP_MANIFESTS_KEY, PLUGIN_RESOLVE_COMPOSES_KEY,
     PLUGIN_VERIFY_MEDIA_KEY,
     PLUGIN_PIN_OPERATOR_DIGESTS_KEY,
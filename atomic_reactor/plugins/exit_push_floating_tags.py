@@ -35,7 +35,7 @@ class PushFloatingTagsPlugin(ExitPlugin):
         manifest = manifest_list_data.get("manifest")
         manifest_digest = manifest_list_data.get("manifest_digest")
 
-        for image in floating_images:
+        def store(image):
             target_repo = image.to_str(registry=False, tag=False)
             # We have to call store_manifest_in_repository directly for each
             # referenced manifest, since each one should be a new tag that requires uploading
@@ -43,6 +43,8 @@ class PushFloatingTagsPlugin(ExitPlugin):
             self.log.debug("storing %s as %s", target_repo, image.tag)
             self.manifest_util.store_manifest_in_repository(session, manifest, list_type,
                                                             target_repo, target_repo, ref=image.tag)
+
+        self.manifest_util.map_concurrently(store, floating_images)
         # And store the manifest list in the push_conf
         push_conf_registry = self.workflow.push_conf.add_docker_registry(session.registry,
                                                                          insecure=session.insecure)
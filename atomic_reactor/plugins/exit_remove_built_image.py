@@ -9,6 +9,8 @@ of the BSD license. See the LICENSE file for details.
 Remove built image (this only makes sense if you store the image in some registry first)
 """
 from atomic_reactor.plugin import ExitPlugin
+from atomic_reactor.plugins.pre_reactor_config import get_parent_image_cache
+from atomic_reactor.utils.image_cache import ParentImageCache
 
 from docker.errors import APIError
 
@@ -23,6 +25,21 @@ def defer_removal(workflow, image):
     workspace['images_to_remove'].add(image)
 
 
+def defer_release(workflow, image, user):
+    """
+    Release a parent image acquired from ParentImageCache when the build finishes
+
+    :param workflow: DockerBuildWorkflow instance
+    :param image: str, image as returned by ImageName.to_str()
+    :param user: str, unique id of the build using the image
+    """
+    key = GarbageCollectionPlugin.key
+    workflow.plugin_workspace.setdefault(key, {})
+    workspace = workflow.plugin_workspace[key]
+    workspace.setdefault('images_to_release', set())
+    workspace['images_to_release'].add((image, user))
+
+
 class GarbageCollectionPlugin(ExitPlugin):
     key = "remove_built_image"
 
@@ -54,6 +71,13 @@ class GarbageCollectionPlugin(ExitPlugin):
         for image in images_to_remove:
             self.remove_image(image, force=True)
 
+        # parent images shared with other builds are removed by the cache once unused
+        images_to_release = workspace.get('images_to_release', [])
+        if images_to_release:
+            cache = ParentImageCache(self.tasker, **get_parent_image_cache(self.workflow))
+            for image, user in images_to_release:
+                cache.release(image, user)
+
     def remove_image(self, image, force=False):
         try:
             self.tasker.remove_image(image, force=force)
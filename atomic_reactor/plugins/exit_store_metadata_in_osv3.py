@@ -11,8 +11,8 @@ import os
 from osbs.exceptions import OsbsResponseException
 
 from atomic_reactor.plugins.pre_reactor_config import get_openshift_session, get_koji
-from atomic_reactor.plugins.pre_fetch_sources import PLUGIN_FETCH_SOURCES_KEY
 from atomic_reactor.constants import (PLUGIN_KOJI_UPLOAD_PLUGIN_KEY,
+                                      PLUGIN_FETCH_SOURCES_KEY,
                                       PLUGIN_VERIFY_MEDIA_KEY,
                                       PLUGIN_RESOLVE_REMOTE_SOURCE,
                                       SCRATCH_FROM)
@@ -286,6 +286,10 @@ class StoreMetadataInOSv3Plugin(ExitPlugin):
                 "filename": os.path.basename(tar_path),
             })
 
+        tracer = getattr(self.workflow, 'tracer', None)
+        if tracer is not None:
+            annotations['trace'] = json.dumps(tracer.summary())
+
         self.apply_remote_source_annotations(annotations)
 
         annotations.update(self.get_config_map())
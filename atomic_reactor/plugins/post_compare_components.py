@@ -16,14 +16,22 @@ from atomic_reactor.constants import (PLUGIN_COMPARE_COMPONENTS_KEY,
 
 T_RPM = "rpm"
 SUPPORTED_TYPES = (T_RPM,)
+# fields which must be equal for all builds of an rpm component
+RPM_COMPARED_FIELDS = ('version', 'release', 'signature')
 
 
-def filter_components_by_name(name, components_list, type_=T_RPM):
-    """Generator filters components from components_list by name"""
+def index_components(components_list):
+    """
+    Index components from components_list by type and name
+
+    :return: dict, (type, name) -> list of components, in the order they
+             appear in components_list
+    """
+    index = {}
     for components in components_list:
         for component in components:
-            if component['type'] == type_ and component['name'] == name:
-                yield component
+            index.setdefault((component['type'], component['name']), []).append(component)
+    return index
 
 
 class CompareComponentsPlugin(PostBuildPlugin):
@@ -35,17 +43,22 @@ class CompareComponentsPlugin(PostBuildPlugin):
     key = PLUGIN_COMPARE_COMPONENTS_KEY
     is_allowed_to_fail = False
 
-    def rpm_compare(self, a, b):
-        """
-        Compare rpm component version 'a' with 'b'.
-        'name' is implied equal as it is the key() lookup
+    def rpm_key(self, component):
+        """Fields of rpm component which must be equal on all workers"""
+        return tuple(component[field] for field in RPM_COMPARED_FIELDS)
+
+    def rpm_diff(self, components):
         """
-        if a['version'] == b['version'] and \
-           a['release'] == b['release'] and \
-           a['signature'] == b['signature']:
-            return
+        Describe differences between builds of an rpm component
 
-        raise ValueError("%s != %s" % (a, b))
+        :param components: list of components with the same name
+        :return: dict, arch -> list of dicts with RPM_COMPARED_FIELDS
+        """
+        diff = {}
+        for component in components:
+            fields = dict(zip(RPM_COMPARED_FIELDS, self.rpm_key(component)))
+            diff.setdefault(component['arch'], []).append(fields)
+        return diff
 
     def get_component_list_from_workers(self, worker_metadatas):
         """
@@ -107,53 +120,26 @@ class CompareComponentsPlugin(PostBuildPlugin):
 
         package_comparison_exceptions = get_package_comparison_exceptions(self.workflow)
 
-        # master compare list
-        master_comp = {}
+        # Components of all workers are indexed by type and name in one pass,
+        # every component then has to be built with the same version, release
+        # and signature everywhere. Components missing on some workers are
+        # assumed to be arch dependencies.
+        failed_components = set()
+        for (t, name), components in index_components(comp_list).items():
+            if name in package_comparison_exceptions:
+                self.log.info("Ignoring comparison of package %s", name)
+                continue
 
-        # The basic strategy is to start with empty lists and add new component
-        # versions as we find them.  Upon next iteration, we should notice
-        # duplicates and be able to compare them.  If the match fails, we raise
-        # an exception.  If the component name does not exist, assume it was an
-        # arch dependency, add it to list and continue.  By the time we get to
-        # the last arch, we should have every possible component in the master
-        # list to compare with.
+            if t not in SUPPORTED_TYPES:
+                raise ValueError("Type %s not supported" % t)
 
-        # Keep everything separated by component type
-        failed_components = set()
-        for components in comp_list:
-            for component in components:
-                t = component['type']
-                name = component['name']
-
-                if name in package_comparison_exceptions:
-                    self.log.info("Ignoring comparison of package %s", name)
-                    continue
-
-                if t not in SUPPORTED_TYPES:
-                    raise ValueError("Type %s not supported" % t)
-
-                if name in failed_components:
-                    # report a failed component only once
-                    continue
-
-                identifier = (t, name)
-                if identifier not in master_comp:
-                    master_comp[identifier] = component
-                    continue
-
-                if t == T_RPM:
-                    mc = master_comp[identifier]
-                    try:
-                        self.rpm_compare(mc, component)
-                    except ValueError as ex:
-                        self.log.debug("Mismatch details: %s", ex)
-                        self.log.warning(
-                            "Comparison mismatch for component %s:", name)
+            if t == T_RPM and len({self.rpm_key(comp) for comp in components}) > 1:
+                self.log.debug("Mismatch details: %s", self.rpm_diff(components))
+                self.log.warning("Comparison mismatch for component %s:", name)
 
-                        # use all components to provide complete list
-                        for comp in filter_components_by_name(name, comp_list):
-                            self.log_rpm_component(comp)
-                        failed_components.add(name)
+                for comp in components:
+                    self.log_rpm_component(comp)
+                failed_components.add(name)
 
         if failed_components:
             raise ValueError(
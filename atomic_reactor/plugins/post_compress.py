@@ -6,19 +6,14 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
-import gzip
-try:
-    # if we import "lzma" first, we get pyliblzma on Py2, but we want backports.lzma
-    #  so first try to import backports.lzma on Py2 and then 'lzma' on Py3
-    from backports import lzma
-except ImportError:
-    import lzma
 import os
 
 from atomic_reactor.constants import (EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE,
                                       IMAGE_TYPE_DOCKER_ARCHIVE)
 from atomic_reactor.plugin import PostBuildPlugin
-from atomic_reactor.util import get_exported_image_metadata, human_size, is_scratch_build
+from atomic_reactor.util import (get_exported_image_metadata, human_size, is_scratch_build,
+                                 ChecksumWriter, remember_checksums)
+from atomic_reactor.utils.compress import get_compressor
 
 
 class CompressPlugin(PostBuildPlugin):
@@ -28,11 +23,15 @@ class CompressPlugin(PostBuildPlugin):
             "name": "compress",
             "args": {
                     "method": "gzip",
+                    "level": 6,
+                    "threads": 4,
                     "load_exported_image": true
             }
     }]
 
-    Currently supported compression methods are gzip and lzma; gzip is default.
+    Currently supported compression methods are gzip, lzma and zstd (requires
+    the zstandard module); gzip is default. gzip and zstd compress using all
+    CPUs unless the number of threads is specified.
     By default, the plugin doesn't work on exported image, you have to explicitly
     ask for it by using `load_exported_image: true`.
     """
@@ -40,40 +39,39 @@ class CompressPlugin(PostBuildPlugin):
     is_allowed_to_fail = False
 
     # TODO: add remove_former_image?
-    def __init__(self, tasker, workflow, load_exported_image=False, method='gzip'):
+    def __init__(self, tasker, workflow, load_exported_image=False, method='gzip',
+                 level=None, threads=None):
         """
         :param tasker: ContainerTasker instance
         :param workflow: DockerBuildWorkflow instance
         :param load_exported_image: bool, when running squash plugin with `dont_load=True`,
                                     you may load the exported tar with this switch
+        :param method: str, compression method: gzip, lzma or zstd
+        :param level: int, compression level, default depends on method
+        :param threads: int, number of threads used for compression, defaults to number of CPUs
         """
         super(CompressPlugin, self).__init__(tasker, workflow)
         self.load_exported_image = load_exported_image
         self.method = method
+        self.level = level
+        self.threads = threads
         self.uncompressed_size = 0
         self.source_build = bool(self.workflow.build_result.oci_image_path)
 
     def _compress_image_stream(self, stream):
+        compressor = get_compressor(self.method, level=self.level, threads=self.threads)
         outfile = os.path.join(self.workflow.source.workdir,
                                EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE)
-        if self.method == 'gzip':
-            outfile = outfile.format('gz')
-            fp = gzip.open(outfile, 'wb', compresslevel=6)
-        elif self.method == 'lzma':
-            outfile = outfile.format('xz')
-            fp = lzma.open(outfile, 'wb')
-        else:
-            raise RuntimeError('Unsupported compression format {0}'.format(self.method))
-
-        _chunk_size = 1024**2  # 1 MB chunk size for reading/writing
-        self.log.info('compressing image %s to %s using %s method',
-                      self.workflow.image, outfile, self.method)
-        data = stream.read(_chunk_size)
-        while data != b'':
-            fp.write(data)
-            data = stream.read(_chunk_size)
+        outfile = outfile.format(compressor.extension)
 
-        self.uncompressed_size = stream.tell()
+        self.log.info('compressing image %s to %s using %s method (level: %s, threads: %d)',
+                      self.workflow.image, outfile, self.method, compressor.level,
+                      compressor.threads)
+        with open(outfile, 'wb') as f:
+            # compute checksums while writing, not to read the compressed file again
+            writer = ChecksumWriter(f)
+            self.uncompressed_size = compressor.compress(stream, writer)
+        remember_checksums(outfile, writer.checksums)
 
         return outfile
 
@@ -87,6 +85,10 @@ class CompressPlugin(PostBuildPlugin):
             image_metadata = self.workflow.exported_image_sequence[-1]
             image = image_metadata.get('path')
             image_type = image_metadata.get('type')
+            if 'uncompressed_size' in image_metadata:
+                # e.g. squashed and compressed in one go by the squash plugin
+                self.log.info('image %s is compressed already, skipping', image)
+                return
             self.log.info('preparing to compress image %s', image)
             with open(image, 'rb') as image_stream:
                 outfile = self._compress_image_stream(image_stream)
@@ -97,7 +99,7 @@ class CompressPlugin(PostBuildPlugin):
             image = self.workflow.image
             image_type = IMAGE_TYPE_DOCKER_ARCHIVE
             self.log.info('fetching image %s from docker', image)
-            with self.tasker.get_image(image) as image_stream:
+            with self.tasker.get_image_stream(image) as image_stream:
                 outfile = self._compress_image_stream(image_stream)
         metadata = get_exported_image_metadata(outfile, image_type)
 
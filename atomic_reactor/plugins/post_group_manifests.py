@@ -101,19 +101,32 @@ class GroupManifestsPlugin(PostBuildPlugin):
         # Now push the manifest list to the registry once per each tag
         self.log.info("%s: Tagging manifest list", session.registry)
 
-        for image in self.non_floating_images:
+        # The referenced manifests potentially come from different repos, so all
+        # their blobs are linked into each target repo first (only once per repo)
+        target_repos = list(dict.fromkeys(image.to_str(registry=False, tag=False)
+                                          for image in self.non_floating_images))
+        self.manifest_util.link_manifests_into_repositories(session, manifests, target_repos)
+
+        # Then the referenced manifests are stored in each target repo, and
+        # finally the manifest list is stored once per each tag
+        def store_manifest(target_repo, manifest):
+            self.manifest_util.store_manifest_in_repository(session,
+                                                            manifest['content'],
+                                                            manifest['media_type'],
+                                                            manifest['repository'],
+                                                            target_repo,
+                                                            ref=manifest['digest'])
+
+        def store_list(image):
             target_repo = image.to_str(registry=False, tag=False)
-            # We have to call store_manifest_in_repository directly for each
-            # referenced manifest, since they potentially come from different repos
-            for manifest in manifests:
-                self.manifest_util.store_manifest_in_repository(session,
-                                                                manifest['content'],
-                                                                manifest['media_type'],
-                                                                manifest['repository'],
-                                                                target_repo,
-                                                                ref=manifest['digest'])
             self.manifest_util.store_manifest_in_repository(session, list_json, list_type,
                                                             target_repo, target_repo, ref=image.tag)
+
+        self.manifest_util.map_concurrently(store_manifest,
+                                            [repo for repo in target_repos for _ in manifests],
+                                            [manifest for _ in target_repos
+                                             for manifest in manifests])
+        self.manifest_util.map_concurrently(store_list, self.non_floating_images)
         # Get the digest of the manifest list using one of the tags
         registry_image = get_unique_images(self.workflow)[0]
         _, digest_str, _, _ = self.manifest_util.get_manifest(session,
@@ -164,7 +177,9 @@ class GroupManifestsPlugin(PostBuildPlugin):
     def run(self):
         primary_images = get_primary_images(self.workflow)
         unique_images = get_unique_images(self.workflow)
-        self.non_floating_images = primary_images + unique_images
+        # the unique image may be one of the primary images, tag it only once
+        self.non_floating_images = list({image.to_str(): image
+                                         for image in primary_images + unique_images}.values())
 
         for registry, source in self.sort_annotations().items():
             session = self.manifest_util.get_registry_session(registry)
@@ -14,7 +14,8 @@ from atomic_reactor.plugin import PostBuildPlugin
 from atomic_reactor.plugins.pre_reactor_config import (get_openshift_session,
                                                        get_koji_session)
 from atomic_reactor.constants import PLUGIN_KOJI_UPLOAD_PLUGIN_KEY
-from atomic_reactor.util import (get_build_json, is_scratch_build)
+from atomic_reactor.util import (get_build_json, is_scratch_build, ChecksumWriter,
+                                 remember_checksums)
 from atomic_reactor.utils.koji import get_buildroot, get_output, get_output_metadata
 from osbs.exceptions import OsbsException
 from osbs.utils import ImageName
@@ -116,8 +117,10 @@ class KojiUploadPlugin(PostBuildPlugin):
         build_logs = NamedTemporaryFile(prefix="buildstep-%s" % self.build_id,
                                         suffix=".log",
                                         mode='wb')
-        build_logs.write("\n".join(self.workflow.build_result.logs).encode('utf-8'))
+        writer = ChecksumWriter(build_logs, algorithms=['md5'])
+        writer.write("\n".join(self.workflow.build_result.logs).encode('utf-8'))
         build_logs.flush()
+        remember_checksums(build_logs.name, writer.checksums)
         filename = "{platform}-build.log".format(platform=self.platform)
         return [Output(file=build_logs,
                        metadata=get_output_metadata(build_logs.name, filename))]
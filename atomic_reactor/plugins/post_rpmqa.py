@@ -6,18 +6,20 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 import os
-import subprocess
 import tempfile
 import tarfile
 
 from atomic_reactor.plugin import PostBuildPlugin
-from atomic_reactor.utils.rpm import rpm_qf_args, parse_rpm_output
+from atomic_reactor.util import StreamAdapter
+from atomic_reactor.utils.rpm import get_rpm_list, rpm_qf_args, parse_rpm_output
 from atomic_reactor.plugins.pre_reactor_config import get_list_rpms_from_scratch
 from docker.errors import APIError
 
 RPMDB_PATH = '/var/lib/rpm'
 RPMDB_DIR_NAME = 'rpm'
 RPMDB_PACKAGES_NAME = 'Packages'
+# Berkeley DB environment files, not needed for reading the database
+RPMDB_ENV_PREFIX = '__db.'
 
 __all__ = ('PostBuildRPMqaPlugin', )
 
@@ -72,6 +74,17 @@ class PostBuildRPMqaPlugin(PostBuildPlugin):
         return plugin_output
 
     def gather_output_non_scratch(self):
+        # reading rpmdb doesn't need the container to be started, so it is
+        # faster and more reliable than running rpm inside of the image
+        try:
+            output = self.gather_output_scratch()
+        except Exception as exc:
+            self.log.info('Failed to read rpmdb from image: %s', exc)
+            output = None
+        if output:
+            return output
+
+        self.log.info('running rpm in container to get list of installed packages')
         for _ in range(5):
             container_id = self.tasker.run(
                 self.image_id,
@@ -102,14 +115,8 @@ class PostBuildRPMqaPlugin(PostBuildPlugin):
             self.log.info('Get archive failed while extracting rpmdb in %s : %s', RPMDB_PATH, ex)
             raise RuntimeError(ex) from ex
 
-        with tempfile.NamedTemporaryFile() as rpmdb_archive:
-            for chunk in bits:
-                rpmdb_archive.write(chunk)
-            rpmdb_archive.flush()
-            tar_archive = tarfile.TarFile(rpmdb_archive.name)
-
         with tempfile.TemporaryDirectory() as rpmdb_dir:
-            tar_archive.extractall(rpmdb_dir)
+            self.extract_rpmdb(bits, rpmdb_dir)
 
             rpmdb_path = os.path.join(rpmdb_dir, RPMDB_DIR_NAME)
             rpmdb_packages = os.path.join(rpmdb_path, RPMDB_PACKAGES_NAME)
@@ -118,14 +125,29 @@ class PostBuildRPMqaPlugin(PostBuildPlugin):
                 self.log.info('%s does not exist in rpmdb', RPMDB_PACKAGES_NAME)
                 return None
 
-            rpm_cmd = 'rpm --dbpath {} {}'.format(rpmdb_path, rpm_qf_args())
             try:
-                self.log.info('getting rpms from rpmdb: %s', rpm_cmd)
-                rpm_output = subprocess.check_output(rpm_cmd,
-                                                     shell=True, universal_newlines=True)  # nosec
+                self.log.info('getting rpms from rpmdb: %s', RPMDB_PATH)
+                rpm_output = get_rpm_list(separator=self.sep, dbpath=rpmdb_path)
             except Exception as e:
                 self.log.error("Failed to get rpms from rpmdb: %s", e)
                 raise e
 
-        rpm_output = [line for line in rpm_output.splitlines() if line]
         return rpm_output
+
+    def extract_rpmdb(self, bits, rpmdb_dir):
+        """
+        Extract database files from the archive of RPMDB_PATH while it is
+        being downloaded, without storing the archive itself
+
+        :param bits: generator of archive chunks, as returned by get_archive
+        :param rpmdb_dir: str, directory to extract RPMDB_DIR_NAME into
+        """
+        with tarfile.open(fileobj=StreamAdapter(bits), mode='r|') as tar_archive:
+            for member in tar_archive:
+                # only regular files directly in the database directory are needed
+                dirname, _, filename = member.name.partition('/')
+                if (not member.isfile() or dirname != RPMDB_DIR_NAME or
+                        not filename or '/' in filename or
+                        filename.startswith(RPMDB_ENV_PREFIX)):
+                    continue
+                tar_archive.extract(member, rpmdb_dir)
@@ -6,6 +6,7 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import subprocess
 import time
@@ -13,16 +14,20 @@ import platform
 import random
 
 from atomic_reactor.constants import (IMAGE_TYPE_DOCKER_ARCHIVE, IMAGE_TYPE_OCI, IMAGE_TYPE_OCI_TAR,
-                                      DOCKER_PUSH_MAX_RETRIES, DOCKER_PUSH_BACKOFF_FACTOR)
+                                      DOCKER_PUSH_MAX_RETRIES, DOCKER_PUSH_BACKOFF_FACTOR,
+                                      DEFAULT_REGISTRY_QUERY_WORKERS, PLUGIN_FETCH_SOURCES_KEY,
+                                      PLUGIN_TAG_AND_PUSH_KEY)
+from atomic_reactor import tracing
 from atomic_reactor.plugin import PostBuildPlugin
 from atomic_reactor.plugins.exit_remove_built_image import defer_removal
 from atomic_reactor.plugins.pre_reactor_config import (get_registries, get_group_manifests,
                                                        get_koji_session,
                                                        get_registries_organization,
                                                        get_image_size_limit)
-from atomic_reactor.plugins.pre_fetch_sources import PLUGIN_FETCH_SOURCES_KEY
 from atomic_reactor.util import (get_manifest_digests, get_config_from_registry, Dockercfg,
-                                 get_all_manifests)
+                                 get_all_manifests, registry_hostname, get_manifest_media_type,
+                                 query_registry, RegistrySession)
+from atomic_reactor.utils.registry_cache import get_registry_cache
 from osbs.utils import ImageName
 import osbs.utils
 from osbs.constants import RAND_DIGITS
@@ -40,7 +45,7 @@ class TagAndPushPlugin(PostBuildPlugin):
     Use tags from workflow.tag_conf and push the images to workflow.push_conf
     """
 
-    key = "tag_and_push"
+    key = PLUGIN_TAG_AND_PUSH_KEY
     is_allowed_to_fail = False
 
     def __init__(self, tasker, workflow, registries=None, koji_target=None):
@@ -106,7 +111,8 @@ class TagAndPushPlugin(PostBuildPlugin):
 
         self.log.info("Calling: %s", ' '.join(cmd))
         try:
-            subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+            with tracing.span(cmd[0], tracing.SPAN_SUBPROCESS):
+                subprocess.check_output(cmd, stderr=subprocess.STDOUT)
         except subprocess.CalledProcessError as e:
             self.log.error("push failed with output:\n%s", e.output)
             raise
@@ -139,6 +145,149 @@ class TagAndPushPlugin(PostBuildPlugin):
         source_image_spec.registry = None
         return source_image_spec
 
+    def invalidate_cached_tag(self, registry, registry_image):
+        registry_cache = get_registry_cache()
+        if registry_cache is not None:
+            registry_cache.invalidate_tag(registry_hostname(registry),
+                                          registry_image.to_str(registry=False, tag=False),
+                                          registry_image.tag)
+
+    def push_image(self, registry_image, registry, insecure, docker_push_secret,
+                   source_oci_image_path=None):
+        """
+        Push the built image, retrying until the registry provides
+        a V2 schema 2 or OCI manifest for it
+
+        :return: tuple, (ManifestDigest, koji source manifest or None)
+        """
+        koji_source_manifest = None
+        max_retries = DOCKER_PUSH_MAX_RETRIES
+
+        for retry in range(max_retries + 1):
+            if self.need_skopeo_push() or source_oci_image_path:
+                self.push_with_skopeo(registry_image, insecure, docker_push_secret,
+                                      source_oci_image_path)
+            else:
+                self.tasker.tag_and_push_image(self.workflow.builder.image_id,
+                                               registry_image, insecure=insecure,
+                                               force=True, dockercfg=docker_push_secret)
+
+            self.invalidate_cached_tag(registry, registry_image)
+
+            if source_oci_image_path:
+                manifests_dict = get_all_manifests(registry_image, registry, insecure,
+                                                   docker_push_secret, versions=('v2',))
+                try:
+                    koji_source_manifest_response = manifests_dict['v2']
+                except KeyError as exc:
+                    raise RuntimeError(
+                        f'Unable to fetch v2 schema 2 digest for {registry_image.to_str()}'
+                    ) from exc
+
+                koji_source_manifest = koji_source_manifest_response.json()
+
+            digests = get_manifest_digests(registry_image, registry,
+                                           insecure, docker_push_secret)
+
+            if (not (digests.v2 or digests.oci) and (retry < max_retries)):
+                sleep_time = DOCKER_PUSH_BACKOFF_FACTOR * (2 ** retry)
+                self.log.info("Retrying push because V2 schema 2 or "
+                              "OCI manifest not found in %is", sleep_time)
+
+                time.sleep(sleep_time)
+            else:
+                break
+
+        return digests, koji_source_manifest
+
+    def tag_manifest(self, session, source_image, digests, registry_image):
+        """
+        Tag an already pushed manifest by uploading it again under another tag,
+        the layers it references are already present in the repository
+        """
+        version = 'v2' if digests.v2 else 'oci'
+        digest = digests.v2 or digests.oci
+        self.log.info("Tagging %s as %s", source_image, registry_image)
+
+        manifest = query_registry(session, source_image, digest=digest, version=version).content
+        url = '/v2/{}/manifests/{}'.format(registry_image.to_str(registry=False, tag=False),
+                                           registry_image.tag)
+        headers = {'Content-Type': get_manifest_media_type(version)}
+        response = session.put(url, data=manifest, headers=headers)
+        response.raise_for_status()
+
+        self.invalidate_cached_tag(session.registry, registry_image)
+
+    def push_to_registry(self, registry, registry_conf, images, source_oci_image_path=None):
+        """
+        Push all images to a single registry
+
+        The image is pushed only once per repository, other tags in the same
+        repository are added by uploading the pushed manifest again. Digests of
+        these tags are then verified concurrently, tags which cannot be
+        verified are pushed in the usual way.
+
+        :return: tuple, (list of (registry image, ManifestDigest, whether it
+                 was pushed from the docker engine), koji source manifest or None)
+        """
+        insecure = registry_conf.get('insecure', False)
+        docker_push_secret = registry_conf.get('secret', None)
+        self.log.info("Registry %s secret %s", registry, docker_push_secret)
+
+        pushed = []
+        # repository -> (registry image, digests) of the image pushed there
+        pushed_repos = {}
+        tagged = []
+        koji_source_manifest = None
+        session = None
+        local_push = not (self.need_skopeo_push() or source_oci_image_path)
+
+        for image in images:
+            registry_image = image.copy()
+            registry_image.registry = registry
+            repo = registry_image.to_str(registry=False, tag=False)
+
+            if repo in pushed_repos:
+                if session is None:
+                    session = RegistrySession(registry, insecure=insecure,
+                                              dockercfg_path=docker_push_secret,
+                                              access=('pull', 'push'))
+                source_image, source_digests = pushed_repos[repo]
+                self.tag_manifest(session, source_image, source_digests, registry_image)
+                tagged.append(len(pushed))
+                pushed.append((registry_image, None, False))
+                continue
+
+            digests, source_manifest = self.push_image(registry_image, registry, insecure,
+                                                       docker_push_secret, source_oci_image_path)
+            koji_source_manifest = source_manifest or koji_source_manifest
+            if digests.v2 or digests.oci:
+                pushed_repos[repo] = (registry_image, digests)
+            pushed.append((registry_image, digests, local_push))
+
+        if tagged:
+            def verify(index):
+                return get_manifest_digests(pushed[index][0], registry,
+                                            insecure, docker_push_secret)
+
+            workers = min(len(tagged), DEFAULT_REGISTRY_QUERY_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                verified = list(executor.map(verify, tagged))
+
+            for index, digests in zip(tagged, verified):
+                registry_image = pushed[index][0]
+                if digests.v2 or digests.oci:
+                    pushed[index] = (registry_image, digests, False)
+                    continue
+
+                self.log.warning("V2 schema 2 or OCI manifest not found for %s, pushing it",
+                                 registry_image)
+                digests, _ = self.push_image(registry_image, registry, insecure,
+                                             docker_push_secret, source_oci_image_path)
+                pushed[index] = (registry_image, digests, local_push)
+
+        return pushed, koji_source_manifest
+
     def run(self):
         pushed_images = []
 
@@ -156,68 +305,45 @@ class TagAndPushPlugin(PostBuildPlugin):
         config_manifest_type = None
         config_registry_image = None
         image_size_limit = get_image_size_limit(self.workflow)
+        # the same image may be both primary and unique, push it only once
+        images = list({image.to_str(): image for image in self.workflow.tag_conf.images}.values())
+
+        if self.registries:
+            for image in images:
+                if image.registry:
+                    raise RuntimeError("Image name must not contain registry: %r" % image.registry)
 
-        for registry, registry_conf in self.registries.items():
+            if not source_oci_image_path and images:
+                image_size = sum(item['size'] for item in self.workflow.layer_sizes)
+                config_image_size = image_size_limit['binary_image']
+                # Only handle the case when size is set > 0 in config
+                if config_image_size and image_size > config_image_size:
+                    raise ExceedsImageSizeError(
+                        'The size {} of image {} exceeds the limitation {} '
+                        'configured in reactor config.'
+                        .format(image_size, images[0], image_size_limit)
+                    )
+
+        # registries are independent of each other, push to all of them at once
+        with ThreadPoolExecutor(max_workers=max(len(self.registries), 1)) as executor:
+            futures = [executor.submit(self.push_to_registry, registry, registry_conf,
+                                       images, source_oci_image_path)
+                       for registry, registry_conf in self.registries.items()]
+            results = [future.result() for future in futures]
+
+        for (registry, registry_conf), (pushed, koji_source_manifest) in zip(
+                self.registries.items(), results):
             insecure = registry_conf.get('insecure', False)
+            docker_push_secret = registry_conf.get('secret', None)
             push_conf_registry = \
                 self.workflow.push_conf.add_docker_registry(registry, insecure=insecure)
 
-            docker_push_secret = registry_conf.get('secret', None)
-            self.log.info("Registry %s secret %s", registry, docker_push_secret)
-
-            for image in self.workflow.tag_conf.images:
-                if image.registry:
-                    raise RuntimeError("Image name must not contain registry: %r" % image.registry)
+            if koji_source_manifest:
+                self.workflow.koji_source_manifest = koji_source_manifest
 
-                if not source_oci_image_path:
-                    image_size = sum(item['size'] for item in self.workflow.layer_sizes)
-                    config_image_size = image_size_limit['binary_image']
-                    # Only handle the case when size is set > 0 in config
-                    if config_image_size and image_size > config_image_size:
-                        raise ExceedsImageSizeError(
-                            'The size {} of image {} exceeds the limitation {} '
-                            'configured in reactor config.'
-                            .format(image_size, image, image_size_limit)
-                        )
-
-                registry_image = image.copy()
-                registry_image.registry = registry
-                max_retries = DOCKER_PUSH_MAX_RETRIES
-
-                for retry in range(max_retries + 1):
-                    if self.need_skopeo_push() or source_oci_image_path:
-                        self.push_with_skopeo(registry_image, insecure, docker_push_secret,
-                                              source_oci_image_path)
-                    else:
-                        self.tasker.tag_and_push_image(self.workflow.builder.image_id,
-                                                       registry_image, insecure=insecure,
-                                                       force=True, dockercfg=docker_push_secret)
-
-                    if source_oci_image_path:
-                        manifests_dict = get_all_manifests(registry_image, registry, insecure,
-                                                           docker_push_secret, versions=('v2',))
-                        try:
-                            koji_source_manifest_response = manifests_dict['v2']
-                        except KeyError as exc:
-                            raise RuntimeError(
-                                f'Unable to fetch v2 schema 2 digest for {registry_image.to_str()}'
-                            ) from exc
-
-                        self.workflow.koji_source_manifest = koji_source_manifest_response.json()
-
-                    digests = get_manifest_digests(registry_image, registry,
-                                                   insecure, docker_push_secret)
-
-                    if (not (digests.v2 or digests.oci) and (retry < max_retries)):
-                        sleep_time = DOCKER_PUSH_BACKOFF_FACTOR * (2 ** retry)
-                        self.log.info("Retrying push because V2 schema 2 or "
-                                      "OCI manifest not found in %is", sleep_time)
-
-                        time.sleep(sleep_time)
-                    else:
-                        if not self.need_skopeo_push():
-                            defer_removal(self.workflow, registry_image)
-                        break
+            for registry_image, digests, local_push in pushed:
+                if local_push:
+                    defer_removal(self.workflow, registry_image)
 
                 pushed_images.append(registry_image)
 
@@ -34,6 +34,9 @@ DEFAULT_HELP_FILENAME = "help.md"
 class AddHelpPlugin(PreBuildPlugin):
     key = "add_help"
     man_filename = "help.1"
+    depends_on = ()
+    workflow_reads = ('dockerfile', 'parent_images')
+    workflow_writes = ('dockerfile',)
 
     NO_HELP_FILE_FOUND = 1
     HELP_GENERATED = 2
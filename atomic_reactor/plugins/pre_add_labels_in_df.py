@@ -119,7 +119,7 @@ class AddLabelsPlugin(PreBuildPlugin):
             if labels:
                 labels.update(image_labels)
             else:
-                labels = image_labels
+                labels = image_labels.mutable_copy()
 
         self.labels = labels
 
@@ -12,9 +12,8 @@ from atomic_reactor.util import df_parser
 from osbs.utils import Labels, utcnow
 from atomic_reactor.plugins.pre_reactor_config import get_koji_session, get_koji
 from atomic_reactor.plugins.pre_check_and_set_rebuild import is_rebuild
-from atomic_reactor.plugins.pre_fetch_sources import PLUGIN_FETCH_SOURCES_KEY
 from atomic_reactor.constants import (PLUGIN_BUMP_RELEASE_KEY, PROG, KOJI_RESERVE_MAX_RETRIES,
-                                      KOJI_RESERVE_RETRY_DELAY)
+                                      KOJI_RESERVE_RETRY_DELAY, PLUGIN_FETCH_SOURCES_KEY)
 from atomic_reactor.util import get_build_json, is_scratch_build
 from koji import GenericError
 import koji
@@ -11,15 +11,14 @@ import koji
 import os
 
 from atomic_reactor import util
-from atomic_reactor.constants import (DEFAULT_DOWNLOAD_BLOCK_SIZE,
-                                      PLUGIN_FETCH_MAVEN_KEY,
+from atomic_reactor.download import DownloadManager, DownloadRequest
+from atomic_reactor.constants import (PLUGIN_FETCH_MAVEN_KEY,
                                       REPO_FETCH_ARTIFACTS_URL,
                                       REPO_FETCH_ARTIFACTS_KOJI)
 from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.plugins.pre_reactor_config import (get_koji_session,
                                                        get_koji_path_info,
                                                        get_artifacts_allowed_domains)
-from collections import namedtuple
 
 try:
     from urlparse import urlparse
@@ -63,13 +62,13 @@ class NvrRequest(object):
         return [archive for archive in self.archives if not archive['matched']]
 
 
-DownloadRequest = namedtuple('DownloadRequest', 'url dest checksums')
-
-
 class FetchMavenArtifactsPlugin(PreBuildPlugin):
 
     key = PLUGIN_FETCH_MAVEN_KEY
     is_allowed_to_fail = False
+    depends_on = ()
+    workflow_reads = ()
+    workflow_writes = ()
 
     DOWNLOAD_DIR = 'artifacts'
 
@@ -155,33 +154,8 @@ class FetchMavenArtifactsPlugin(PreBuildPlugin):
     def download_files(self, downloads):
         artifacts_path = os.path.join(self.workdir, self.DOWNLOAD_DIR)
 
-        self.log.debug('%d files to download', len(downloads))
-        session = util.get_retrying_requests_session()
-
-        for index, download in enumerate(downloads):
-            dest_path = os.path.join(artifacts_path, download.dest)
-            dest_dir = dest_path.rsplit('/', 1)[0]
-            if not os.path.exists(dest_dir):
-                os.makedirs(dest_dir)
-
-            self.log.debug('%d/%d downloading %s', index + 1, len(downloads),
-                           download.url)
-
-            checksums = {algo: hashlib.new(algo) for algo in download.checksums}
-            request = session.get(download.url, stream=True)
-            request.raise_for_status()
-
-            with open(dest_path, 'wb') as f:
-                for chunk in request.iter_content(chunk_size=DEFAULT_DOWNLOAD_BLOCK_SIZE):
-                    f.write(chunk)
-                    for checksum in checksums.values():
-                        checksum.update(chunk)
-
-            for algo, checksum in checksums.items():
-                if checksum.hexdigest() != download.checksums[algo]:
-                    raise ValueError(
-                        'Computed {} checksum, {}, does not match expected checksum, {}'
-                        .format(algo, checksum.hexdigest(), download.checksums[algo]))
+        download_manager = DownloadManager(session=util.get_retrying_requests_session())
+        download_manager.download(downloads, artifacts_path)
 
     def run(self):
         self.session = get_koji_session(self.workflow)
@@ -8,6 +8,7 @@ of the BSD license. See the LICENSE file for details.
 import os
 import shutil
 import tempfile
+from urllib.parse import urlparse
 
 import koji
 import tarfile
@@ -24,7 +25,7 @@ from atomic_reactor.plugins.pre_reactor_config import (
 )
 from atomic_reactor.source import GitSource
 from atomic_reactor.util import get_retrying_requests_session
-from atomic_reactor.download import download_url
+from atomic_reactor.download import DownloadManager, DownloadRequest
 from atomic_reactor.metadata import label_map
 
 
@@ -118,10 +119,15 @@ class FetchSourcesPlugin(PreBuildPlugin):
         if not os.path.exists(dest_dir):
             os.makedirs(dest_dir)
 
-        req_session = get_retrying_requests_session()
-        for source in sources:
-            download_url(source['url'], dest_dir, insecure=insecure,
-                         session=req_session, dest_filename=source.get('dest'))
+        downloads = [
+            DownloadRequest(source['url'],
+                            source.get('dest') or os.path.basename(urlparse(source['url']).path),
+                            {})
+            for source in sources
+        ]
+        download_manager = DownloadManager(session=get_retrying_requests_session(),
+                                           insecure=insecure)
+        download_manager.download(downloads, dest_dir)
 
         return dest_dir
 
@@ -8,14 +8,14 @@ of the BSD license. See the LICENSE file for details.
 from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.constants import (
     INSPECT_CONFIG, PLUGIN_KOJI_PARENT_KEY, BASE_IMAGE_KOJI_BUILD, PARENT_IMAGES_KOJI_BUILDS,
-    KOJI_BTYPE_IMAGE
+    KOJI_BTYPE_IMAGE, PLUGIN_CHECK_AND_SET_PLATFORMS_KEY
 )
 from atomic_reactor.plugins.pre_reactor_config import (
     get_deep_manifest_list_inspection, get_koji_session,
     get_skip_koji_check_for_base_image, get_fail_on_digest_mismatch,
     get_platform_to_goarch_mapping
 )
-from atomic_reactor.plugins.pre_check_and_set_rebuild import is_rebuild
+from atomic_reactor.plugins.pre_check_and_set_rebuild import CheckAndSetRebuildPlugin, is_rebuild
 from atomic_reactor.util import (
     base_image_is_custom, get_manifest_media_type, is_scratch_build,
     get_platforms, RegistrySession, RegistryClient
@@ -54,6 +54,9 @@ class KojiParentPlugin(PreBuildPlugin):
 
     key = PLUGIN_KOJI_PARENT_KEY
     is_allowed_to_fail = False
+    depends_on = (PLUGIN_CHECK_AND_SET_PLATFORMS_KEY, CheckAndSetRebuildPlugin.key)
+    workflow_reads = ('parent_images',)
+    workflow_writes = ('cancel_isolated_autorebuild',)
 
     def __init__(self, tasker, workflow, poll_interval=DEFAULT_POLL_INTERVAL,
                  poll_timeout=DEFAULT_POLL_TIMEOUT):
@@ -7,12 +7,16 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from osbs.utils import Labels, ImageName
 
 from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.constants import (
     PLUGIN_PIN_OPERATOR_DIGESTS_KEY,
+    DEFAULT_REGISTRY_QUERY_WORKERS,
     INSPECT_CONFIG,
     REPO_CONTAINER_CONFIG,
 )
@@ -20,11 +24,8 @@ from atomic_reactor.util import (RegistrySession,
                                  RegistryClient,
                                  has_operator_bundle_manifest,
                                  read_yaml_from_url, df_parser,
-                                 terminal_key_paths,)
-from osbs.utils.yaml import (
-    load_schema,
-    validate_with_schema,
-)
+                                 terminal_key_paths,
+                                 validate_with_cached_schema)
 from atomic_reactor.plugins.pre_reactor_config import get_operator_manifests
 from atomic_reactor.plugins.build_orchestrate_build import override_build_kwarg
 from atomic_reactor.utils.operator import OperatorManifest
@@ -85,11 +86,7 @@ class PinOperatorDigestsPlugin(PreBuildPlugin):
 
     def _validate_operator_csv_modifications_schema(self, modifications):
         """Validate if provided operator CSV modification are valid according schema"""
-        schema = load_schema(
-            'atomic_reactor',
-            'schemas/operator_csv_modifications.json'
-        )
-        validate_with_schema(modifications, schema)
+        validate_with_cached_schema(modifications, 'schemas/operator_csv_modifications.json')
 
     def _validate_operator_csv_modifications_duplicated_images(self, modifications):
         """Validate if provided operator CSV modifications doesn't provide duplicated entries"""
@@ -509,6 +506,16 @@ class PinOperatorDigestsPlugin(PreBuildPlugin):
             if not replacer.registry_is_allowed(p):
                 raise RuntimeError("Registry not allowed: {} (in {})".format(p.registry, p))
 
+        # Query registries for all pullspecs up front, concurrently
+        pinned_pullspecs = {}
+        if pin_digest:
+            self.log.info("Querying registries for manifest list digests")
+            pinned_pullspecs = replacer.pin_digests(pullspecs)
+        if replace_repo:
+            self.log.info("Querying registries for component names")
+            replacer.get_component_names([pinned_pullspecs.get(p, p) for p in pullspecs])
+        self._log_query_times(replacer)
+
         for original in pullspecs:
             self.log.info("Computing replacement for %s", original)
             replaced = original
@@ -516,7 +523,7 @@ class PinOperatorDigestsPlugin(PreBuildPlugin):
 
             if pin_digest:
                 self.log.debug("Making sure tag is manifest list digest")
-                replaced = replacer.pin_digest(original)
+                replaced = pinned_pullspecs[original]
                 if replaced != original:
                     pinned = True
 
@@ -539,6 +546,15 @@ class PinOperatorDigestsPlugin(PreBuildPlugin):
 
         return replacements
 
+    def _log_query_times(self, replacer):
+        if not replacer.query_times:
+            return
+        query_times_lines = "\n".join(
+            "{}: {:.3f}s".format(image, duration)
+            for image, duration in sorted(replacer.query_times.items(), key=lambda x: str(x[0]))
+        )
+        self.log.info("Registry query times:\n%s", query_times_lines)
+
     def _are_features_enabled(self):
         pin_digest = self.user_config.get("enable_digest_pinning", True)
         replace_repo = self.user_config.get("enable_repo_replacements", True)
@@ -610,6 +626,13 @@ class PullspecReplacer(object):
 
         # RegistryClient instances cached by registry name
         self.registry_clients = {}
+        # Component names of images, see get_component_names
+        self.component_names = {}
+        # Time spent querying registries (in seconds) by image
+        self.query_times = {}
+        self.registry_query_workers = site_config.get("registry_query_workers",
+                                                      DEFAULT_REGISTRY_QUERY_WORKERS)
+        self._lock = threading.Lock()
 
     def registry_is_allowed(self, image):
         """
@@ -635,6 +658,26 @@ class PullspecReplacer(object):
         digest = registry_client.get_manifest_list_digest(image)
         return self._replace(image, tag=digest)
 
+    def pin_digests(self, images):
+        """
+        Replace tags with manifest list digests for multiple images,
+        querying the registries concurrently
+
+        :param images: list[ImageName]
+        :return: dict[ImageName, ImageName], pinned image for each image
+        """
+        return self._query_registries(self.pin_digest, images)
+
+    def get_component_names(self, images):
+        """
+        Query registries concurrently for component names of images which
+        will need repo replacement, replace_repo then uses the results
+
+        :param images: list[ImageName]
+        """
+        images = [image for image in images if self._has_repo_replacements(image.registry)]
+        self.component_names.update(self._query_registries(self._get_component_name, images))
+
     def replace_registry(self, image):
         """
         Replace image registry based on OSBS config
@@ -656,12 +699,13 @@ class PullspecReplacer(object):
         :param image: ImageName
         :return: ImageName
         """
-        site_mapping = self._get_site_mapping(image.registry)
-        if site_mapping is None and image.registry not in self.user_package_mappings:
+        if not self._has_repo_replacements(image.registry):
             self.log.debug("repo_replacements not configured for %s", image.registry)
             return image
 
-        package = self._get_component_name(image)
+        package = self.component_names.get(image)
+        if package is None:
+            package = self._get_component_name(image)
         mapping = self._get_final_mapping(image.registry, package)
         replacements = mapping.get(package)
 
@@ -679,6 +723,10 @@ class PullspecReplacer(object):
         replacement = ImageName.parse(replacements[0])
         return self._replace(image, namespace=replacement.namespace, repo=replacement.repo)
 
+    def _has_repo_replacements(self, registry):
+        site_mapping = self._get_site_mapping(registry)
+        return site_mapping is not None or registry in self.user_package_mappings
+
     def _get_site_mapping(self, registry):
         """
         Get the package mapping file for the given registry. If said file has
@@ -748,13 +796,52 @@ class PullspecReplacer(object):
         """
         Get registry client for specified registry, cached by registry name
         """
-        client = self.registry_clients.get(registry)
-        if client is None:
-            session = RegistrySession.create_from_config(self.workflow, registry=registry)
-            client = RegistryClient(session)
-            self.registry_clients[registry] = client
+        with self._lock:
+            client = self.registry_clients.get(registry)
+            if client is None:
+                session = RegistrySession.create_from_config(self.workflow, registry=registry)
+                client = RegistryClient(session)
+                self.registry_clients[registry] = client
         return client
 
+    def _query_registries(self, query, images):
+        """
+        Call query for each unique image. Images from different registries are
+        queried in parallel, with at most registry_query_workers concurrent
+        queries per registry.
+
+        :param query: callable, takes ImageName
+        :param images: list[ImageName]
+        :return: dict[ImageName, Any], results of query by image, in order of images
+        :raises: exception raised by query for the first failed image in images
+        """
+        executors = {}
+        futures = {}
+        try:
+            for image in images:
+                if image in futures:
+                    continue
+                executor = executors.get(image.registry)
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=self.registry_query_workers)
+                    executors[image.registry] = executor
+                futures[image] = executor.submit(self._timed_query, query, image)
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+
+        return {image: future.result() for image, future in futures.items()}
+
+    def _timed_query(self, query, image):
+        start_time = time.time()
+        try:
+            return query(image)
+        finally:
+            duration = time.time() - start_time
+            self.log.debug("Query for %s took %.3f s", image, duration)
+            with self._lock:
+                self.query_times[image] = self.query_times.get(image, 0) + duration
+
     def _replace(self, image, registry=_KEEP, namespace=_KEEP, repo=_KEEP, tag=_KEEP):
         """
         Replace specified parts of image pullspec, keep the rest
@@ -12,25 +12,31 @@ If this build is an auto-rebuild, use the base image from the image change
 trigger instead of what is in the Dockerfile.
 Tag each image to a unique name (the build name plus a nonce) to be used during
 this build so that it isn't removed by other builds doing clean-up.
+When the parent image cache is configured, parent images are shared with other
+builds on the node and only removed once no build has used them for a while.
 """
 
 import docker
 
+from atomic_reactor.constants import PLUGIN_PULL_BASE_IMAGE_KEY
 from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.util import (get_build_json, get_platforms, base_image_is_custom,
                                  get_checksums, get_manifest_media_type,
                                  RegistrySession, RegistryClient)
 from atomic_reactor.core import RetryGeneratorException
+from atomic_reactor.plugins.exit_remove_built_image import defer_release
 from atomic_reactor.plugins.pre_reactor_config import (get_source_registry,
                                                        get_platform_to_goarch_mapping,
-                                                       get_pull_registries)
+                                                       get_pull_registries,
+                                                       get_parent_image_cache)
+from atomic_reactor.utils.image_cache import ParentImageCache
 from io import BytesIO
 from requests.exceptions import HTTPError, RetryError, Timeout
 from osbs.utils import ImageName
 
 
 class PullBaseImagePlugin(PreBuildPlugin):
-    key = "pull_base_image"
+    key = PLUGIN_PULL_BASE_IMAGE_KEY
     is_allowed_to_fail = False
 
     def __init__(self, tasker, workflow, check_platforms=False, inspect_only=False,
@@ -64,6 +70,12 @@ class PullBaseImagePlugin(PreBuildPlugin):
         # RegistryClient instances cached by registry name
         self.registry_clients = {}
 
+        parent_image_cache_conf = get_parent_image_cache(workflow, None)
+        if parent_image_cache_conf is not None:
+            self.parent_image_cache = ParentImageCache(tasker, **parent_image_cache_conf)
+        else:
+            self.parent_image_cache = None
+
     def run(self):
         """
         Pull parent images and retag them uniquely for this build.
@@ -199,14 +211,26 @@ class PullBaseImagePlugin(PreBuildPlugin):
         """Docker pull the image and tag it uniquely for use by this build"""
         image = image.copy()
         reg_client = self._get_registry_client(image.registry)
+        # Use the OpenShift build name as the unique ID
+        unique_id = build_json['metadata']['name']
+        if self.parent_image_cache is not None:
+            # release even if the pull fails, the use is registered first
+            defer_release(self.workflow, image.to_str(), unique_id)
+
         for _ in range(20):
             # retry until pull and tag is successful or definitively fails.
             # should never require 20 retries but there's a race condition at work.
             # just in case something goes wildly wrong, limit to 20 so it terminates.
             try:
-                self.tasker.pull_image(image, insecure=reg_client.insecure,
-                                       dockercfg_path=reg_client.dockercfg_path)
-                self.workflow.pulled_base_images.add(image.to_str())
+                if self.parent_image_cache is not None:
+                    # the image is removed by the cache once no build uses it
+                    self.parent_image_cache.acquire(image, unique_id,
+                                                    insecure=reg_client.insecure,
+                                                    dockercfg_path=reg_client.dockercfg_path)
+                else:
+                    self.tasker.pull_image(image, insecure=reg_client.insecure,
+                                           dockercfg_path=reg_client.dockercfg_path)
+                    self.workflow.pulled_base_images.add(image.to_str())
             except RetryGeneratorException:
                 self.log.error('failed to pull image: %s', image)
                 raise
@@ -214,9 +238,6 @@ class PullBaseImagePlugin(PreBuildPlugin):
             # Attempt to tag it using a unique ID. We might have to retry
             # if another build with the same parent image is finishing up
             # and removing images it pulled.
-
-            # Use the OpenShift build name as the unique ID
-            unique_id = build_json['metadata']['name']
             new_image = ImageName(repo=unique_id, tag=nonce)
 
             try:
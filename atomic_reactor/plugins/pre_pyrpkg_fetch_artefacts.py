@@ -13,6 +13,7 @@ This plugin should do it.
 import os
 import subprocess
 
+from atomic_reactor import tracing
 from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.plugins.pre_reactor_config import get_sources_command
 from atomic_reactor.constants import PLUGIN_DISTGIT_FETCH_KEY
@@ -43,6 +44,8 @@ class DistgitFetchArtefactsPlugin(PreBuildPlugin):
         cur_dir = os.getcwd()
         os.chdir(source_path)
         try:
-            subprocess.check_call(self.command.split())
+            command = self.command.split()
+            with tracing.span(command[0], tracing.SPAN_SUBPROCESS):
+                subprocess.check_call(command)
         finally:
             os.chdir(cur_dir)
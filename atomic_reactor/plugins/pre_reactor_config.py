@@ -12,7 +12,9 @@ from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.constants import (CONTAINER_BUILD_METHODS, CONTAINER_DEFAULT_BUILD_METHOD,
                                       CONTAINER_BUILDAH_BUILD_METHOD)
 from atomic_reactor.util import (read_yaml, read_yaml_from_file_path,
-                                 get_build_json, DefaultKeyDict)
+                                 get_build_json, DefaultKeyDict, freeze)
+from atomic_reactor.utils.registry_cache import RegistryCache, set_registry_cache
+from atomic_reactor.utils.retries import get_connection_pools
 from osbs.utils import RegistryURI
 
 import logging
@@ -44,9 +46,8 @@ def get_config(workflow):
 
 def get_value(workflow, name, fallback):
     try:
-        # make a deep copy to prevent plugins from changing the value for other plugins
-        value = deepcopy(get_config(workflow).conf[name])
-        return value
+        # the value is shared by all plugins and read-only, use mutable_copy() to change it
+        return get_config(workflow).conf[name]
     except KeyError:
         if fallback != NO_FALLBACK:
             return fallback
@@ -450,6 +451,18 @@ def get_builder_ca_bundle(workflow, fallback=NO_FALLBACK):
     return get_value(workflow, 'builder_ca_bundle', fallback)
 
 
+def get_registry_metadata_cache(workflow, fallback=NO_FALLBACK):
+    return get_value(workflow, 'registry_metadata_cache', fallback)
+
+
+def get_http_connection_pool(workflow, fallback=NO_FALLBACK):
+    return get_value(workflow, 'http_connection_pool', fallback)
+
+
+def get_parent_image_cache(workflow, fallback=NO_FALLBACK):
+    return get_value(workflow, 'parent_image_cache', fallback)
+
+
 class ClusterConfig(object):
     """
     Configuration relating to a particular cluster
@@ -489,7 +502,7 @@ class ReactorConfig(object):
     DEFAULT_CONFIG = {ReactorConfigKeys.VERSION_KEY: 1}
 
     def __init__(self, config=None):
-        self.conf = deepcopy(config or self.DEFAULT_CONFIG)
+        self.conf = freeze(config or self.DEFAULT_CONFIG)
 
         version = self.conf[ReactorConfigKeys.VERSION_KEY]
         if version != 1:
@@ -652,6 +665,17 @@ class ReactorConfigPlugin(PreBuildPlugin):
         self.workflow.builder.tasker.build_method = (source_image_build_method or
                                                      default_image_build_method)
 
+        registry_cache_conf = get_registry_metadata_cache(self.workflow, None)
+        if registry_cache_conf is not None:
+            self.log.info("caching registry metadata: %s", registry_cache_conf)
+            set_registry_cache(RegistryCache(**registry_cache_conf))
+
+        connection_pool_conf = get_http_connection_pool(self.workflow, None)
+        connection_pools = get_connection_pools()
+        if connection_pool_conf is not None and connection_pools is not None:
+            self.log.info("sharing http connections: %s", connection_pool_conf)
+            connection_pools.configure(**connection_pool_conf)
+
         # set source registry and organization
         if self.workflow.builder.dockerfile_images:
             source_registry_docker_uri = get_source_registry(self.workflow)['uri'].docker_uri
@@ -5,6 +5,7 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -13,13 +14,14 @@ from atomic_reactor import util
 from atomic_reactor.utils.odcs import WaitComposeToFinishTimeout
 from osbs.repo_utils import ModuleSpec
 
-from atomic_reactor.constants import (PLUGIN_KOJI_PARENT_KEY,
+from atomic_reactor.constants import (PLUGIN_CHECK_AND_SET_PLATFORMS_KEY,
+                                      PLUGIN_KOJI_PARENT_KEY,
                                       PLUGIN_RESOLVE_COMPOSES_KEY,
                                       BASE_IMAGE_KOJI_BUILD)
 
 from atomic_reactor.plugin import PreBuildPlugin
 from atomic_reactor.plugins.build_orchestrate_build import override_build_kwarg
-from atomic_reactor.plugins.pre_check_and_set_rebuild import is_rebuild
+from atomic_reactor.plugins.pre_check_and_set_rebuild import CheckAndSetRebuildPlugin, is_rebuild
 from atomic_reactor.plugins.pre_reactor_config import (get_config,
                                                        get_odcs_session,
                                                        get_koji_session, get_koji)
@@ -42,6 +44,10 @@ class ResolveComposesPlugin(PreBuildPlugin):
 
     key = PLUGIN_RESOLVE_COMPOSES_KEY
     is_allowed_to_fail = False
+    depends_on = (PLUGIN_KOJI_PARENT_KEY, PLUGIN_CHECK_AND_SET_PLATFORMS_KEY,
+                  CheckAndSetRebuildPlugin.key)
+    workflow_reads = ('parent_images',)
+    workflow_writes = ('all_yum_repourls', 'build_kwargs_override')
 
     def __init__(self, tasker, workflow,
                  koji_target=None,
@@ -282,28 +288,14 @@ class ResolveComposesPlugin(PreBuildPlugin):
     def wait_for_composes(self):
         self.log.debug('Waiting for ODCS composes to be available: %s', self.all_compose_ids)
         self.composes_info = []
-        for compose_id in self.all_compose_ids:
-            compose_info = self.odcs_client.wait_for_compose(compose_id)
-
-            if self._needs_renewal(compose_info):
-                sigkeys = compose_info.get('sigkeys', '').split()
-                updated_signing_intent = self.odcs_config.get_signing_intent_by_keys(sigkeys)
-                if set(sigkeys) != set(updated_signing_intent['keys']):
-                    self.log.info('Updating signing keys in "%s" from "%s", to "%s" in compose '
-                                  '"%s" due to sigkeys deprecation',
-                                  updated_signing_intent['name'],
-                                  sigkeys,
-                                  updated_signing_intent['keys'],
-                                  compose_info['id']
-                                  )
-                    sigkeys = updated_signing_intent['keys']
-
-                compose_info = self.odcs_client.renew_compose(compose_id, sigkeys)
-                compose_id = compose_info['id']
-                compose_info = self.odcs_client.wait_for_compose(compose_id)
-
-            self.composes_info.append(compose_info)
+        if self.all_compose_ids:
+            # composes are generated independently, wait for all of them at once
+            # so that the total wait is the longest compose, not the sum of them
+            with ThreadPoolExecutor(max_workers=len(self.all_compose_ids)) as executor:
+                self.composes_info = list(executor.map(self._wait_for_compose,
+                                                       self.all_compose_ids))
 
+        for compose_info in self.composes_info:
             # A module compose is not standalone - it depends on packages from the
             # virtual platform module - if no extra repourls or other composes are
             # provided, we'll need packages from the target build tag using the
@@ -319,6 +311,34 @@ class ResolveComposesPlugin(PreBuildPlugin):
 
         self.all_compose_ids = [item['id'] for item in self.composes_info]
 
+    def _wait_for_compose(self, compose_id):
+        """
+        Wait for the compose, renew it if it expires too soon
+
+        :param compose_id: int, compose ID to wait for
+        :return: dict, status of the finished compose
+        """
+        compose_info = self.odcs_client.wait_for_compose(compose_id)
+
+        if self._needs_renewal(compose_info):
+            sigkeys = compose_info.get('sigkeys', '').split()
+            updated_signing_intent = self.odcs_config.get_signing_intent_by_keys(sigkeys)
+            if set(sigkeys) != set(updated_signing_intent['keys']):
+                self.log.info('Updating signing keys in "%s" from "%s", to "%s" in compose '
+                              '"%s" due to sigkeys deprecation',
+                              updated_signing_intent['name'],
+                              sigkeys,
+                              updated_signing_intent['keys'],
+                              compose_info['id']
+                              )
+                sigkeys = updated_signing_intent['keys']
+
+            compose_info = self.odcs_client.renew_compose(compose_id, sigkeys)
+            compose_id = compose_info['id']
+            compose_info = self.odcs_client.wait_for_compose(compose_id)
+
+        return compose_info
+
     def _needs_renewal(self, compose_info):
         if compose_info['state_name'] == 'removed':
             return True
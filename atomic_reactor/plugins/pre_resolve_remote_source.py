@@ -28,6 +28,9 @@ class ResolveRemoteSourcePlugin(PreBuildPlugin):
 
     key = PLUGIN_RESOLVE_REMOTE_SOURCE
     is_allowed_to_fail = False
+    depends_on = ()
+    workflow_reads = ()
+    workflow_writes = ('build_kwargs_override',)
 
     def __init__(self, tasker, workflow, dependency_replacements=None):
         """
@@ -25,41 +25,6 @@ from atomic_reactor.util import df_parser, get_exported_image_metadata, is_flatp
 from osbs.utils import Labels
 
 
-# This converts the generator provided by the export() operation to a file-like
-# object with a read that we can pass to tarfile.
-class StreamAdapter(object):
-    def __init__(self, gen):
-        self.gen = gen
-        self.buf = None
-        self.pos = None
-
-    def read(self, count):
-        pieces = []
-        remaining = count
-        while remaining > 0:
-            if not self.buf:
-                try:
-                    self.buf = next(self.gen)
-                    self.pos = 0
-                except StopIteration:
-                    break
-
-            if len(self.buf) - self.pos < remaining:
-                pieces.append(self.buf[self.pos:])
-                remaining -= (len(self.buf) - self.pos)
-                self.buf = None
-                self.pos = None
-            else:
-                pieces.append(self.buf[self.pos:self.pos + remaining])
-                self.pos += remaining
-                remaining = 0
-
-        return b''.join(pieces)
-
-    def close(self):
-        pass
-
-
 class FlatpakCreateOciPlugin(PrePublishPlugin):
     key = 'flatpak_create_oci'
     is_allowed_to_fail = False
@@ -74,10 +39,8 @@ class FlatpakCreateOciPlugin(PrePublishPlugin):
         self.flatpak_metadata = get_flatpak_metadata(workflow, FLATPAK_METADATA_ANNOTATIONS)
 
     def _export_container(self, container_id):
-        export_generator = self.tasker.export_container(container_id)
-        export_stream = StreamAdapter(export_generator)
-
-        outfile, manifestfile = self.builder._export_from_stream(export_stream)
+        with self.tasker.export_container_stream(container_id) as export_stream:
+            outfile, manifestfile = self.builder._export_from_stream(export_stream)
 
         return outfile, manifestfile
 
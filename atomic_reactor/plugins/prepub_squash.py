@@ -10,14 +10,23 @@ It returns the dockerfile itself and therefore displays it in results.
 """
 import os
 
-from atomic_reactor.constants import EXPORTED_SQUASHED_IMAGE_NAME, IMAGE_TYPE_DOCKER_ARCHIVE
+from atomic_reactor.constants import (EXPORTED_SQUASHED_IMAGE_NAME,
+                                      EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE,
+                                      IMAGE_TYPE_DOCKER_ARCHIVE)
 from atomic_reactor.plugin import PrePublishPlugin
 from atomic_reactor.plugins.exit_remove_built_image import defer_removal
-from atomic_reactor.util import get_exported_image_metadata, is_flatpak_build
-from docker_squash.squash import Squash
+from atomic_reactor.plugins.post_compress import CompressPlugin
+from atomic_reactor.util import (get_exported_image_metadata, is_flatpak_build,
+                                 ChecksumWriter, remember_checksums)
+from atomic_reactor.utils.compress import get_compressor
+from atomic_reactor.utils.squash import ImageSquasher
 
 __all__ = ('PrePublishSquashPlugin', )
 
+SQUASH_ENGINE_DOCKER_SQUASH = 'docker-squash'
+SQUASH_ENGINE_NATIVE = 'native'
+SQUASH_ENGINES = (SQUASH_ENGINE_DOCKER_SQUASH, SQUASH_ENGINE_NATIVE)
+
 
 class PrePublishSquashPlugin(PrePublishPlugin):
 
@@ -35,7 +44,8 @@ class PrePublishSquashPlugin(PrePublishPlugin):
           "args": {
             "tag": "SQUASH_TAG",
             "from_layer": "FROM_LAYER",
-            "dont_load": false
+            "dont_load": false,
+            "engine": "native"
           }
         }
       ]
@@ -45,6 +55,12 @@ class PrePublishSquashPlugin(PrePublishPlugin):
     be registered. The `from_layer` argument specifies from which layer we want
     to squash.
 
+    The `engine` argument selects how the image is squashed: "docker-squash"
+    (default) uses the docker-squash package, "native" squashes the layers
+    while streaming the image from docker. When the compress plugin is set to
+    compress the exported image, the native engine writes the archive
+    compressed right away and the compress plugin has nothing left to do.
+
     Of course it's possible to override it at runtime, like this: `--substitute
     prepublish_plugins.squash.tag=image:squashed
       --substitute prepublish_plugins.squash.from_layer=asdasd2332`.
@@ -55,7 +71,7 @@ class PrePublishSquashPlugin(PrePublishPlugin):
     is_allowed_to_fail = False
 
     def __init__(self, tasker, workflow, tag=None, from_base=True, from_layer=None,
-                 dont_load=False, save_archive=True):
+                 dont_load=False, save_archive=True, engine=SQUASH_ENGINE_DOCKER_SQUASH):
         """
         :param tasker: ContainerTasker instance
         :param workflow: DockerBuildWorkflow instance
@@ -66,6 +82,7 @@ class PrePublishSquashPlugin(PrePublishPlugin):
             if `True`, squashed image is not loaded back into Docker
         :param save_archive: if `True` (default), squashed image is saved in an archive on the
             disk under the image.tar name; if `False`, archive is not generated
+        :param engine: str, "docker-squash" or "native"
         """
         super(PrePublishSquashPlugin, self).__init__(tasker, workflow)
         self.image = self.workflow.builder.image_id
@@ -86,6 +103,10 @@ class PrePublishSquashPlugin(PrePublishPlugin):
 
         self.dont_load = dont_load
         self.save_archive = save_archive
+        if engine not in SQUASH_ENGINES:
+            raise ValueError("unknown squash engine {}, expected one of {}"
+                             .format(engine, ', '.join(SQUASH_ENGINES)))
+        self.engine = engine
 
     def run(self):
         if is_flatpak_build(self.workflow):
@@ -96,12 +117,19 @@ class PrePublishSquashPlugin(PrePublishPlugin):
 
         if self.workflow.build_result.skip_layer_squash:
             return  # enable build plugins to prevent unnecessary squashes
+        if self.engine == SQUASH_ENGINE_NATIVE:
+            self.squash_native()
+            return
+
         if self.save_archive:
             output_path = os.path.join(self.workflow.source.workdir, EXPORTED_SQUASHED_IMAGE_NAME)
             metadata = {"path": output_path}
         else:
             output_path = None
 
+        # docker-squash is slow to import and not needed by the native engine
+        from docker_squash.squash import Squash
+
         # Squash the image and output tarfile
         # If the parameter dont_load is set to True squashed image won't be
         # loaded in to Docker daemon. If it's set to False it will be loaded.
@@ -119,3 +147,59 @@ class PrePublishSquashPlugin(PrePublishPlugin):
             metadata.update(get_exported_image_metadata(output_path, IMAGE_TYPE_DOCKER_ARCHIVE))
             self.workflow.exported_image_sequence.append(metadata)
         defer_removal(self.workflow, self.image)
+
+    def get_exported_image_compressor(self):
+        """
+        Get compressor the compress plugin would use for the exported image
+
+        :return: Compressor instance, or None if exported image is not compressed
+        """
+        for plugin in self.workflow.postbuild_plugins_conf or []:
+            if plugin.get('name') != CompressPlugin.key:
+                continue
+            args = plugin.get('args') or {}
+            if args.get('load_exported_image'):
+                return get_compressor(args.get('method', 'gzip'), level=args.get('level'),
+                                      threads=args.get('threads'))
+        return None
+
+    def squash_native(self):
+        if self.dont_load and not self.save_archive:
+            self.log.info('squashed image would be neither loaded nor saved, skipping')
+            return
+
+        workdir = self.workflow.source.workdir
+        squasher = ImageSquasher(self.tasker, self.image, from_layer=self.from_layer,
+                                 tag=self.tag, tmpdir=workdir)
+        compressor = self.get_exported_image_compressor() if self.save_archive else None
+        if compressor is not None:
+            output_path = os.path.join(workdir, EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE
+                                       .format(compressor.extension))
+        else:
+            output_path = os.path.join(workdir, EXPORTED_SQUASHED_IMAGE_NAME)
+
+        uncompressed_size = None
+        with open(output_path, 'wb') as f:
+            # compute checksums while writing, not to read the archive again
+            writer = ChecksumWriter(f)
+            if compressor is not None:
+                self.log.info('squashing image %s to compressed %s', self.image, output_path)
+                uncompressed_size, new_id = compressor.compress_writer(squasher.write, writer)
+            else:
+                self.log.info('squashing image %s to %s', self.image, output_path)
+                new_id = squasher.write(writer)
+        remember_checksums(output_path, writer.checksums)
+
+        if not self.dont_load:
+            # docker loads compressed archives as well
+            self.tasker.load_image(output_path)
+            self.workflow.builder.image_id = new_id
+
+        if self.save_archive:
+            metadata = get_exported_image_metadata(output_path, IMAGE_TYPE_DOCKER_ARCHIVE)
+            if uncompressed_size is not None:
+                metadata['uncompressed_size'] = uncompressed_size
+            self.workflow.exported_image_sequence.append(metadata)
+        else:
+            os.remove(output_path)
+        defer_removal(self.workflow, self.image)
@@ -0,0 +1,268 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Tracing of build phases, plugins and calls of external services.
+
+Spans are nested: phase -> plugin -> HTTP request, docker API call or
+subprocess. Traces are exported in the Chrome trace event format, which can
+be loaded e.g. in chrome://tracing or Perfetto.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_tracer = None
+
+SPAN_PHASE = 'phase'
+SPAN_PLUGIN = 'plugin'
+SPAN_HTTP = 'http'
+SPAN_DOCKER = 'docker'
+SPAN_SUBPROCESS = 'subprocess'
+# categories of calls of external services, summarized by Tracer.summary
+CALL_CATEGORIES = (SPAN_HTTP, SPAN_DOCKER, SPAN_SUBPROCESS)
+
+
+def get_tracer():
+    """
+    Get the tracer used in this process
+
+    :return: Tracer instance, or None if tracing is not enabled
+    """
+    return _tracer
+
+
+def set_tracer(tracer):
+    """
+    Set the tracer used in this process
+
+    :param tracer: Tracer instance, or None to disable tracing
+    """
+    global _tracer  # pylint: disable=global-statement
+    _tracer = tracer
+
+
+class Span(object):
+    """
+    Timed operation, with attributes such as bytes transferred or retries
+    """
+
+    __slots__ = ('id', 'name', 'category', 'parent', 'start', 'duration', 'thread',
+                 'attributes')
+
+    def __init__(self, span_id, name, category, parent, attributes):
+        self.id = span_id
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.start = time.time()
+        self.duration = None
+        self.thread = threading.get_ident()
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Set attributes of the span"""
+        self.attributes.update(attributes)
+
+    def add(self, attribute, value=1):
+        """Add value to a numeric attribute, e.g. count of retries"""
+        self.attributes[attribute] = self.attributes.get(attribute, 0) + value
+
+
+class NullSpan(object):
+    """
+    Span used when tracing is not enabled, all operations do nothing
+    """
+
+    id = None
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, attribute, value=1):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer(object):
+    """
+    Collects spans from all threads of the build
+
+    The current span is tracked for each thread. Spans started in threads
+    created by plugins have no parent unless one is passed explicitly.
+    """
+
+    def __init__(self):
+        self.spans = []
+        # (timestamp, name, values) of sampled values, e.g. disk usage
+        self.counters = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_id = 1
+
+    def current_span(self):
+        """
+        :return: Span started last in the current thread and not finished yet, or None
+        """
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, category, parent=None, **attributes):
+        """
+        Trace the operation running in the context
+
+        :param name: str, name of the operation
+        :param category: str, kind of the operation, e.g. SPAN_HTTP
+        :param parent: Span, parent span, defaults to the current span
+        :param attributes: initial attributes of the span
+        """
+        if parent is None:
+            parent = self.current_span()
+        with self._lock:
+            span_id = self._next_id
+            self._next_id += 1
+        new_span = Span(span_id, name, category, parent.id if parent else None, attributes)
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(new_span)
+        try:
+            yield new_span
+        except Exception as exc:
+            new_span.set(error=exc.__class__.__name__)
+            raise
+        finally:
+            new_span.duration = time.time() - new_span.start
+            stack.pop()
+            with self._lock:
+                self.spans.append(new_span)
+
+    def counter(self, name, **values):
+        """
+        Record current values of a sampled resource, e.g. disk usage
+
+        :param name: str, name of the resource
+        :param values: numbers to record
+        """
+        with self._lock:
+            self.counters.append((time.time(), name, values))
+
+    def to_chrome_trace(self):
+        """
+        :return: dict, finished spans in the Chrome trace event format
+        """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            counters = list(self.counters)
+
+        events = []
+        for finished in sorted(spans, key=lambda s: s.start):
+            args = dict(finished.attributes, span_id=finished.id)
+            if finished.parent is not None:
+                args['parent_id'] = finished.parent
+            events.append({
+                'name': finished.name,
+                'cat': finished.category,
+                'ph': 'X',
+                'ts': int(finished.start * 1e6),
+                'dur': int(finished.duration * 1e6),
+                'pid': pid,
+                'tid': finished.thread,
+                'args': args,
+            })
+        for timestamp, name, values in counters:
+            events.append({
+                'name': name,
+                'ph': 'C',
+                'ts': int(timestamp * 1e6),
+                'pid': pid,
+                'args': values,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        """
+        Write finished spans to a file in the Chrome trace event format
+
+        :param path: str, path to the file
+        """
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.to_chrome_trace(), f)
+        except (IOError, OSError) as exc:
+            # tracing must never fail the build
+            logger.warning('failed to write trace to %s: %s', path, exc)
+        else:
+            logger.info('trace written to %s', path)
+
+    def summary(self):
+        """
+        Summarize finished spans, to find out where the build spent its time
+
+        :return: dict, with keys
+            'phases': phase name -> duration in seconds
+            'calls': category -> dict with 'count', 'duration', 'bytes' and 'retries'
+            'hosts': HTTP host -> dict with the same keys as for 'calls'
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        def add(stats, finished):
+            stats['count'] += 1
+            stats['duration'] = round(stats['duration'] + finished.duration, 3)
+            stats['bytes'] += finished.attributes.get('bytes', 0)
+            stats['retries'] += finished.attributes.get('retries', 0)
+
+        def new_stats():
+            return {'count': 0, 'duration': 0.0, 'bytes': 0, 'retries': 0}
+
+        phases = {}
+        calls = {category: new_stats() for category in CALL_CATEGORIES}
+        hosts = {}
+        for finished in spans:
+            if finished.category == SPAN_PHASE:
+                phases[finished.name] = round(phases.get(finished.name, 0) + finished.duration, 3)
+            elif finished.category in calls:
+                add(calls[finished.category], finished)
+                if finished.category == SPAN_HTTP and 'host' in finished.attributes:
+                    add(hosts.setdefault(finished.attributes['host'], new_stats()), finished)
+
+        return {'phases': phases, 'calls': calls, 'hosts': hosts}
+
+
+@contextmanager
+def span(name, category, parent=None, **attributes):
+    """
+    Trace the operation running in the context using the tracer of this
+    process, does nothing when tracing is not enabled
+
+    :return: context manager, yielding Span or NULL_SPAN
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield NULL_SPAN
+        return
+    with tracer.span(name, category, parent=parent, **attributes) as new_span:
+        yield new_span
+
+
+def current_span():
+    """
+    :return: current Span in this thread, or NULL_SPAN when there is none
+    """
+    tracer = get_tracer()
+    current = tracer.current_span() if tracer else None
+    return current or NULL_SPAN
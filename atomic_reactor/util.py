@@ -9,6 +9,7 @@ of the BSD license. See the LICENSE file for details.
 import hashlib
 from itertools import chain
 import json
+import jsonschema
 import io
 import os
 import re
@@ -22,6 +23,7 @@ import uuid
 import yaml
 import string
 import signal
+import threading
 from collections import namedtuple
 from copy import deepcopy
 from base64 import b64decode
@@ -29,6 +31,7 @@ from base64 import b64decode
 from urllib.parse import urlparse
 
 import atomic_reactor.utils.retries
+from atomic_reactor.utils.registry_cache import get_registry_cache
 from atomic_reactor.constants import (DOCKERFILE_FILENAME, REPO_CONTAINER_CONFIG, TOOLS_USED,
                                       INSPECT_CONFIG,
                                       IMAGE_TYPE_DOCKER_ARCHIVE, IMAGE_TYPE_OCI, IMAGE_TYPE_OCI_TAR,
@@ -54,7 +57,7 @@ from requests.utils import guess_json_utf
 
 from osbs.exceptions import OsbsException
 from osbs.utils import clone_git_repo, reset_git_repo, Labels, ImageName
-from osbs.utils.yaml import read_yaml as osbs_read_yaml
+from osbs.utils.yaml import load_schema, validate_with_schema
 
 from tempfile import NamedTemporaryFile
 from faulthandler import dump_traceback
@@ -63,6 +66,11 @@ Output = namedtuple('Output', ['file', 'metadata'])
 
 logger = logging.getLogger(__name__)
 
+# (package, schema path) -> jsonschema validator
+_schema_validators = {}
+# (package, schema path, sha256 of yaml data) already validated successfully
+_validated_yaml = set()
+
 
 # Should be a member of 'util' module for backwards compatibility
 get_retrying_requests_session = atomic_reactor.utils.retries.get_retrying_requests_session
@@ -361,10 +369,37 @@ def _compute_checksums(fd, hash_objs, blocksize=65536):
         buf = fd.read(blocksize)
 
 
+# checksums of files by (path, inode, size, mtime), see remember_checksums
+_checksums_memo = {}
+_checksums_memo_lock = threading.Lock()
+
+
+def _get_checksums_memo_key(path):
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def remember_checksums(path, checksums):
+    """
+    Remember checksums of a file, e.g. computed by ChecksumWriter while
+    writing it, so that get_checksums does not need to read the file again.
+    Checksums are forgotten when the file changes.
+
+    :param path: str, path to file
+    :param checksums: dict, as returned by get_checksums
+    """
+    key = _get_checksums_memo_key(path)
+    with _checksums_memo_lock:
+        _checksums_memo.setdefault(key, {}).update(checksums)
+
+
 def get_checksums(filename, algorithms):
     """
     Compute a checksum(s) of given file using specified algorithms.
 
+    Checksums of files (not file-like objects) are computed only once
+    while the file does not change.
+
     :param filename: path to file or file-like object
     :param algorithms: list of cryptographic hash functions, currently supported: md5, sha256
     :return: dictionary
@@ -376,21 +411,104 @@ def get_checksums(filename, algorithms):
     if not all(elem in allowed_algorithms for elem in algorithms):
         raise ValueError('Algorithms supported {}. Found {}'.format(allowed_algorithms, algorithms))
 
-    hash_objs = [getattr(hashlib, algorithm)() for algorithm in algorithms]
     if hasattr(filename, 'read'):
-        _compute_checksums(filename, hash_objs)
+        memo_key = None
+        known_checksums = {}
     else:
-        with open(filename, mode='rb') as f:
-            _compute_checksums(f, hash_objs)
+        memo_key = _get_checksums_memo_key(filename)
+        with _checksums_memo_lock:
+            known_checksums = dict(_checksums_memo.get(memo_key, {}))
+
+    hash_objs = [getattr(hashlib, algorithm)() for algorithm in algorithms
+                 if '{}sum'.format(algorithm) not in known_checksums]
+    if hash_objs:
+        if memo_key is None:
+            _compute_checksums(filename, hash_objs)
+        else:
+            with open(filename, mode='rb') as f:
+                _compute_checksums(f, hash_objs)
 
     checksums = {}
     for hash_obj in hash_objs:
-        sum_name = '{}sum'.format(hash_obj.name)
-        checksums[sum_name] = hash_obj.hexdigest()
+        checksums['{}sum'.format(hash_obj.name)] = hash_obj.hexdigest()
+    if memo_key is not None and checksums:
+        with _checksums_memo_lock:
+            _checksums_memo.setdefault(memo_key, {}).update(checksums)
+
+    for algorithm in algorithms:
+        sum_name = '{}sum'.format(algorithm)
+        checksums[sum_name] = checksums.get(sum_name) or known_checksums[sum_name]
         logger.debug('%s: %s', sum_name, checksums[sum_name])
     return checksums
 
 
+class ChecksumWriter(object):
+    """
+    Writable file-like object computing checksums and size of everything
+    written to the wrapped file
+    """
+
+    def __init__(self, fileobj, algorithms=('md5', 'sha256')):
+        """
+        :param fileobj: writable binary file-like object
+        :param algorithms: list of cryptographic hash functions, as for get_checksums
+        """
+        self.fileobj = fileobj
+        self.size = 0
+        self._hash_objs = [getattr(hashlib, algorithm)() for algorithm in algorithms]
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.size += len(data)
+        for hash_obj in self._hash_objs:
+            hash_obj.update(data)
+        return len(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    @property
+    def checksums(self):
+        """
+        :return: dict, checksums in the same format as get_checksums
+        """
+        return {'{}sum'.format(hash_obj.name): hash_obj.hexdigest()
+                for hash_obj in self._hash_objs}
+
+
+class StreamAdapter(object):
+    """
+    Readable file-like object for a generator of bytes chunks, such as the
+    ones returned by docker export() and get_archive(), which can be passed
+    to tarfile in stream mode
+    """
+
+    def __init__(self, gen):
+        self.gen = gen
+        # rest of the current chunk, slicing a memoryview doesn't copy data
+        self.buf = None
+
+    def read(self, count):
+        pieces = []
+        remaining = count
+        while remaining > 0:
+            if self.buf is None:
+                try:
+                    self.buf = memoryview(next(self.gen))
+                except StopIteration:
+                    break
+
+            piece = self.buf[:remaining]
+            pieces.append(piece)
+            remaining -= len(piece)
+            self.buf = self.buf[len(piece):] if len(piece) < len(self.buf) else None
+
+        return b''.join(pieces)
+
+    def close(self):
+        pass
+
+
 def get_docker_architecture(tasker):
     docker_version = tasker.get_version()
     host_arch = docker_version['Arch']
@@ -593,11 +711,23 @@ class Dockercfg(object):
 
 
 class RegistrySession(object):
-    def __init__(self, registry, insecure=False, dockercfg_path=None, access=None):
+    def __init__(self, registry, insecure=False, dockercfg_path=None, access=None,
+                 cache_tags=False):
+        """
+        :param registry: str, registry hostname[:port], optionally with http(s):// prefix
+        :param insecure: bool, when True registry's cert is not verified
+        :param dockercfg_path: str, dirname of .dockercfg location
+        :param access: List of actions this session is allowed to perform, e.g. ('push', 'pull')
+        :param cache_tags: bool, whether tag -> digest mappings may be served from the
+                           registry cache; only safe for images which are not pushed
+                           during the build, e.g. parent images
+        """
         self.registry = registry
         self._resolved = None
         self.insecure = insecure
         self.dockercfg_path = dockercfg_path
+        self.cache = get_registry_cache()
+        self.cache_tags = cache_tags
 
         username = None
         password = None
@@ -667,7 +797,8 @@ class RegistrySession(object):
         return cls(matched_registry['uri'].uri,
                    insecure=matched_registry['insecure'],
                    dockercfg_path=matched_registry['dockercfg_path'],
-                   access=access)
+                   access=access,
+                   cache_tags=True)
 
     def _do(self, f, relative_url, *args, **kwargs):
         kwargs['auth'] = self.auth
@@ -1013,9 +1144,60 @@ def get_digests_map_from_annotations(digests_str):
     return digests
 
 
+def _get_cached_response(cache, registry_session, context, reference, media_type, is_blob):
+    """
+    Find response for query_registry in registry cache
+
+    :return: requests.Response object, or None if the response is not cached
+    """
+    if reference.startswith('sha256:'):
+        digest = reference
+    elif getattr(registry_session, 'cache_tags', False) and not is_blob:
+        digest = cache.get_tag_digest(registry_hostname(registry_session.registry), context,
+                                      reference, media_type)
+        if digest is None:
+            return None
+    else:
+        return None
+
+    cached = cache.get_content(digest)
+    if cached is None:
+        return None
+    cached_media_type, content = cached
+    # registries refuse to return manifests of other media types than requested
+    if not is_blob and cached_media_type != media_type:
+        return None
+
+    response = requests.Response()
+    response.status_code = requests.codes.ok
+    response._content = content  # pylint: disable=protected-access
+    response.headers['Content-Type'] = cached_media_type
+    response.headers['Docker-Content-Digest'] = digest
+    logger.debug("query_registry: using cached response for %s/%s (%s)",
+                 context, reference, digest)
+    return response
+
+
+def _cache_response(cache, registry_session, context, reference, media_type, is_blob,
+                    response):
+    digest = response.headers.get('Docker-Content-Digest') or reference
+    if not digest.startswith('sha256:'):
+        return
+    cached_media_type = response.headers.get('Content-Type', media_type)
+    if not cache.set_content(digest, cached_media_type, response.content):
+        return
+    if not reference.startswith('sha256:') and not is_blob:
+        cache.set_tag_digest(registry_hostname(registry_session.registry), context, reference,
+                             media_type, digest)
+
+
 def query_registry(registry_session, image, digest=None, version='v1', is_blob=False):
     """Return manifest digest for image.
 
+    When the registry session has a registry cache (see
+    atomic_reactor.utils.registry_cache), content referenced by digest is
+    served from the cache when possible.
+
     :param registry_session: RegistrySession
     :param image: ImageName, the remote image to inspect
     :param digest: str, digest of the image manifest
@@ -1031,7 +1213,15 @@ def query_registry(registry_session, image, digest=None, version='v1', is_blob=F
     if is_blob:
         object_type = 'blobs'
 
-    headers = {'Accept': (get_manifest_media_type(version))}
+    media_type = get_manifest_media_type(version)
+    cache = getattr(registry_session, 'cache', None)
+    if cache is not None:
+        response = _get_cached_response(cache, registry_session, context, reference,
+                                        media_type, is_blob)
+        if response is not None:
+            return response
+
+    headers = {'Accept': media_type}
     url = '/v2/{}/{}/{}'.format(context, object_type, reference)
     logger.debug("query_registry: querying %s, headers: %s", url, headers)
 
@@ -1042,6 +1232,10 @@ def query_registry(registry_session, image, digest=None, version='v1', is_blob=F
     logger.debug("query_registry: response headers: %s", response.headers)
     response.raise_for_status()
 
+    if cache is not None:
+        _cache_response(cache, registry_session, context, reference, media_type, is_blob,
+                        response)
+
     return response
 
 
@@ -1160,7 +1354,8 @@ def get_all_manifests(image, registry, insecure=False, dockercfg_path=None,
     return registry_client.get_all_manifests(image, versions=versions)
 
 
-def get_inspect_for_image(image, registry, insecure=False, dockercfg_path=None):
+def get_inspect_for_image(image, registry, insecure=False, dockercfg_path=None,
+                          cache_tags=False):
     """Return inspect for image.
 
     :param image: ImageName, the remote image to inspect
@@ -1168,10 +1363,12 @@ def get_inspect_for_image(image, registry, insecure=False, dockercfg_path=None):
                           https:// will be used
     :param insecure: bool, when True registry's cert is not verified
     :param dockercfg_path: str, dirname of .dockercfg location
+    :param cache_tags: bool, whether the tag may be resolved using the registry cache
 
     :return: dict of inspected image
     """
-    registry_session = RegistrySession(registry, insecure=insecure, dockercfg_path=dockercfg_path)
+    registry_session = RegistrySession(registry, insecure=insecure, dockercfg_path=dockercfg_path,
+                                       cache_tags=cache_tags)
     registry_client = RegistryClient(registry_session)
     return registry_client.get_inspect_for_image(image)
 
@@ -1302,7 +1499,7 @@ def read_yaml_from_file_path(file_path, schema, package='atomic_reactor'):
     """
     with open(file_path) as f:
         yaml_data = f.read()
-    return osbs_read_yaml(yaml_data, schema, package)
+    return read_yaml(yaml_data, schema, package)
 
 
 def read_yaml_from_url(url, schema, package='atomic_reactor'):
@@ -1320,16 +1517,69 @@ def read_yaml_from_url(url, schema, package='atomic_reactor'):
         f.write(chunk.decode('utf-8'))
 
     f.seek(0)
-    return osbs_read_yaml(f.read(), schema, package)
+    return read_yaml(f.read(), schema, package)
 
 
 def read_yaml(yaml_data, schema, package='atomic_reactor'):
     """
+    Parse yaml data and validate them against the JSON schema
+
+    The same data (e.g. the reactor config map read by several plugins)
+    is validated only once per process.
+
     :param yaml_data: string, yaml content
     :param schema: string, path to the JSON schema file
     :param package: string, package name containing the JSON schema file
+    :return: parsed yaml data
+    :raises jsonschema.SchemaError: if the schema is invalid
+    :raises OsbsValidationException: if the validation fails
+    """
+    data = yaml.safe_load(yaml_data)
+    key = (package, schema, sha256sum(yaml_data))
+    if key not in _validated_yaml:
+        validate_with_cached_schema(data, schema, package)
+        _validated_yaml.add(key)
+    return data
+
+
+def get_schema_validator(schema, package='atomic_reactor'):
+    """
+    Get validator for the JSON schema, the schema is loaded and checked
+    only once per process
+
+    :param schema: string, path to the JSON schema file
+    :param package: string, package name containing the JSON schema file
+    :return: jsonschema.Draft4Validator
+    :raises jsonschema.SchemaError: if the schema is invalid
     """
-    return osbs_read_yaml(yaml_data, schema, package)
+    key = (package, schema)
+    validator = _schema_validators.get(key)
+    if validator is None:
+        schema_data = load_schema(package, schema)
+        try:
+            jsonschema.Draft4Validator.check_schema(schema_data)
+        except jsonschema.SchemaError:
+            logger.error('invalid schema %s, cannot validate', schema)
+            raise
+        validator = jsonschema.Draft4Validator(schema_data)
+        _schema_validators[key] = validator
+    return validator
+
+
+def validate_with_cached_schema(data, schema, package='atomic_reactor'):
+    """
+    Validate data against the JSON schema using a cached validator
+
+    :param data: data to validate
+    :param schema: string, path to the JSON schema file
+    :param package: string, package name containing the JSON schema file
+    :raises jsonschema.SchemaError: if the schema is invalid
+    :raises OsbsValidationException: if the validation fails
+    """
+    validator = get_schema_validator(schema, package)
+    if not validator.is_valid(data):
+        # let osbs report all the errors the usual way
+        validate_with_schema(data, validator.schema)
 
 
 def allow_repo_dir_in_dockerignore(build_path):
@@ -1459,13 +1709,15 @@ class OSBSLogs(object):
             platform = entry.platform
             if platform not in platform_logs:
                 filename = 'orchestrator' if platform is None else platform
-                platform_logs[platform] = NamedTemporaryFile(prefix="%s-%s" %
-                                                             (build_id, filename),
-                                                             suffix=".log", mode='r+b')
+                logfile = NamedTemporaryFile(prefix="%s-%s" % (build_id, filename),
+                                             suffix=".log", mode='r+b')
+                platform_logs[platform] = ChecksumWriter(logfile, algorithms=['md5'])
             platform_logs[platform].write((entry.line + '\n').encode('utf-8'))
 
-        for platform, logfile in platform_logs.items():
+        for platform, writer in platform_logs.items():
+            logfile = writer.fileobj
             logfile.flush()
+            remember_checksums(logfile.name, writer.checksums)
             filename = 'orchestrator' if platform is None else platform
             metadata = self.get_log_metadata(logfile.name, "%s.log" % filename)
             output.append(Output(file=logfile, metadata=metadata))
@@ -1480,6 +1732,84 @@ class DefaultKeyDict(dict):
         return key
 
 
+def _read_only(self, *args, **kwargs):
+    raise TypeError("'{}' object is read-only, use mutable_copy() to get a modifiable copy"
+                    .format(type(self).__name__))
+
+
+def _thaw(value):
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value.mutable_copy()
+    return value
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict, to be created by freeze()
+
+    It is still a dict, compares equal to and serializes like the plain one,
+    so it can be shared instead of handing out deep copies.
+    """
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def mutable_copy(self):
+        """
+        :return: dict, deep copy which can be modified
+        """
+        return {key: _thaw(value) for key, value in self.items()}
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return self.mutable_copy()
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    """
+    Read-only list, to be created by freeze()
+    """
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def mutable_copy(self):
+        """
+        :return: list, deep copy which can be modified
+        """
+        return [_thaw(value) for value in self]
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return self.mutable_copy()
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(value):
+    """
+    Make read-only copy of data loaded from json or yaml
+
+    :param value: dicts and lists are frozen recursively, anything else is kept
+    :return: FrozenDict, FrozenList or value
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
 def get_platforms_in_limits(workflow, input_platforms=None):
     def make_list(value):
         if not isinstance(value, list):
@@ -1850,7 +2180,7 @@ def read_user_config_file(workflow, filename):
     :rtype: None or dict
     :raises jsonschema.SchemaError: if the schema is loaded incorrectly.
     :raises OsbsValidationException: if the validation fails.
-    :raises: any other errors raised from ``osbs.utils.yaml.read_yaml``.
+    :raises: any other errors raised from ``read_yaml``.
     """
     _, work_dir = workflow.source.get_build_file_path()
     schema_file = USER_CONFIG_FILES[filename]
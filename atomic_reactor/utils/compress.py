@@ -0,0 +1,207 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Compression of (potentially very large) image tarballs.
+"""
+
+import gzip
+import logging
+import lzma
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024**2  # 1 MB chunk size for reading/writing
+GZIP_BLOCK_SIZE = 1024**2
+# deflate looks back at most 32 KB, this much of the previous block is used as dictionary
+GZIP_WINDOW_SIZE = 32 * 1024
+# magic, deflate method, no flags, no mtime, no extra flags, unknown OS
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+class Compressor(object):
+    """
+    Base class for compression methods
+    """
+    # extension of compressed files
+    extension = None
+
+    def __init__(self, level=None, threads=1):
+        """
+        :param level: int, compression level, None for the method's default
+        :param threads: int, maximum number of threads to use for compression
+        """
+        self.level = level
+        self.threads = threads
+
+    def compress(self, stream, fileobj):
+        """
+        Compress data from stream
+
+        :param stream: readable file-like object
+        :param fileobj: writable file-like object for compressed data
+        :return: int, size of uncompressed data
+        """
+        raise NotImplementedError
+
+    def compress_writer(self, write, fileobj):
+        """
+        Compress data written by a function, without storing them first
+
+        The function runs in another thread and writes into a pipe, which is
+        read by compress().
+
+        :param write: callable, writes uncompressed data to the writable
+                      file-like object it is called with
+        :param fileobj: writable file-like object for compressed data
+        :return: tuple, size of uncompressed data and return value of write
+        """
+        read_fd, write_fd = os.pipe()
+
+        def write_to_pipe():
+            with os.fdopen(write_fd, 'wb') as pipe:
+                return write(pipe)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(write_to_pipe)
+            # closing the pipe makes write() fail if compression failed
+            with os.fdopen(read_fd, 'rb') as pipe:
+                size = self.compress(pipe, fileobj)
+            return size, future.result()
+
+    def _copy(self, stream, fp):
+        size = 0
+        data = stream.read(CHUNK_SIZE)
+        while data:
+            fp.write(data)
+            size += len(data)
+            data = stream.read(CHUNK_SIZE)
+        return size
+
+
+class GzipCompressor(Compressor):
+    """
+    gzip compression
+
+    With more than one thread, input is split into blocks which are compressed
+    in parallel, in the same way as pigz does it. Every block uses the end of
+    the previous block as dictionary and the compressed blocks together form
+    a single deflate stream, so the output is a standard gzip file.
+    """
+    extension = 'gz'
+
+    def __init__(self, level=None, threads=1):
+        super(GzipCompressor, self).__init__(6 if level is None else level, threads)
+
+    def compress(self, stream, fileobj):
+        if self.threads <= 1:
+            with gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=self.level) as fp:
+                return self._copy(stream, fp)
+
+        fileobj.write(GZIP_HEADER)
+        crc = 0
+        size = 0
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            block = stream.read(GZIP_BLOCK_SIZE)
+            zdict = None
+            while True:
+                next_block = stream.read(GZIP_BLOCK_SIZE)
+                last = not next_block
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                pending.append(executor.submit(self._compress_block, block, zdict, last))
+                # limit memory used by blocks waiting to be written
+                while len(pending) > 2 * self.threads:
+                    fileobj.write(pending.popleft().result())
+                if last:
+                    break
+                zdict = block[-GZIP_WINDOW_SIZE:]
+                block = next_block
+
+            while pending:
+                fileobj.write(pending.popleft().result())
+
+        fileobj.write(struct.pack('<II', crc & 0xffffffff, size & 0xffffffff))
+        return size
+
+    def _compress_block(self, block, zdict, last):
+        if zdict:
+            compressobj = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                           zdict=zdict)
+        else:
+            compressobj = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        # sync flush ends the block on a byte boundary, so that next block can follow
+        flush_mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        return compressobj.compress(block) + compressobj.flush(flush_mode)
+
+
+class LzmaCompressor(Compressor):
+    """
+    xz compression
+    """
+    extension = 'xz'
+
+    def compress(self, stream, fileobj):
+        with lzma.LZMAFile(fileobj, mode='wb', preset=self.level) as fp:
+            return self._copy(stream, fp)
+
+
+class ZstdCompressor(Compressor):
+    """
+    zstd compression, requires the zstandard module
+    """
+    extension = 'zst'
+
+    def __init__(self, level=None, threads=1):
+        if zstandard is None:
+            raise RuntimeError('zstd compression requires the zstandard module')
+        super(ZstdCompressor, self).__init__(3 if level is None else level, threads)
+
+    def compress(self, stream, fileobj):
+        # zstd uses one thread for I/O in addition to the compression threads
+        threads = self.threads if self.threads > 1 else 0
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=threads)
+        size, _ = compressor.copy_stream(stream, fileobj, read_size=CHUNK_SIZE,
+                                         write_size=CHUNK_SIZE)
+        return size
+
+
+COMPRESSORS = {
+    'gzip': GzipCompressor,
+    'lzma': LzmaCompressor,
+    'zstd': ZstdCompressor,
+}
+
+
+def get_compressor(method, level=None, threads=None):
+    """
+    Get compressor for compression method
+
+    :param method: str, one of COMPRESSORS
+    :param level: int, compression level, None for the method's default
+    :param threads: int, number of threads to use, None to use all CPUs
+    :return: Compressor instance
+    """
+    try:
+        compressor_class = COMPRESSORS[method]
+    except KeyError as exc:
+        raise RuntimeError('Unsupported compression format {0}'.format(method)) from exc
+    if threads is None:
+        threads = os.cpu_count() or 1
+    return compressor_class(level=level, threads=threads)
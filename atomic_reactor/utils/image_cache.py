@@ -0,0 +1,180 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Reference counted cache of parent images shared by builds on the same node.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from docker.errors import APIError
+
+from atomic_reactor.constants import (PARENT_IMAGE_CACHE_GRACE_PERIOD,
+                                      PARENT_IMAGE_CACHE_STALE_USE)
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'state.json'
+STATE_LOCK_FILE = 'state.lock'
+
+
+class ParentImageCache(object):
+    """
+    Parent images pulled by builds running against the same docker daemon
+
+    Every build registers its use of a parent image (preferably referenced by
+    digest) before pulling it and unregisters it when it finishes. An image
+    referenced by digest is pulled only when it is not present yet; concurrent
+    builds pulling the same image wait for the first pull instead of pulling it
+    again. An image referenced by tag is pulled every time, the tag may point to
+    a newer image than the one present. An image is
+    removed only when no build has used it for grace_period seconds. Removal is
+    done by whichever build acquires or releases an image later on.
+
+    The reference counts are kept in a directory shared by all the builds and
+    guarded by file locks, the directory must be on the node the docker daemon
+    runs on.
+    """
+
+    def __init__(self, tasker, directory, grace_period=PARENT_IMAGE_CACHE_GRACE_PERIOD,
+                 stale_after=PARENT_IMAGE_CACHE_STALE_USE):
+        """
+        :param tasker: ContainerTasker instance
+        :param directory: str, path to directory for the shared state
+        :param grace_period: int, for how many seconds unused images are kept
+        :param stale_after: int, after how many seconds is use of an image by a build
+                            which never released it ignored
+        """
+        self.tasker = tasker
+        self.directory = directory
+        self.grace_period = grace_period
+        self.stale_after = stale_after
+
+    def acquire(self, image, user, insecure=False, dockercfg_path=None):
+        """
+        Register use of an image and pull it, unless it is referenced by digest
+        and present already
+
+        :param image: ImageName, image to pull
+        :param user: str, unique id of the build using the image
+        :param insecure: bool, allow connecting to registry over plain http
+        :param dockercfg_path: str, path to dockercfg
+        :return: bool, whether the image was pulled
+        """
+        key = image.to_str()
+        with self._state() as state:
+            entry = state.setdefault(key, {'users': {}, 'released': None})
+            entry['users'][user] = time.time()
+            entry['released'] = None
+            self._collect(state)
+
+        # the image can't be removed now, only wait for other builds pulling it
+        with self._lock(self._pull_lock_path(key)):
+            is_digest = image.tag is not None and image.tag.startswith('sha256:')
+            if is_digest and self.tasker.image_exists(key):
+                logger.info("parent image '%s' is already present", key)
+                return False
+            self.tasker.pull_image(image, insecure=insecure, dockercfg_path=dockercfg_path)
+            return True
+
+    def release(self, image, user):
+        """
+        Unregister use of an image, remove images unused for the grace period
+
+        :param image: str, image passed to acquire(), as returned by ImageName.to_str()
+        :param user: str, unique id of the build using the image
+        """
+        with self._state() as state:
+            entry = state.get(image)
+            if entry is not None and entry['users'].pop(user, None) is not None:
+                if not entry['users']:
+                    logger.debug("parent image '%s' is not used by any build", image)
+                    entry['released'] = time.time()
+            self._collect(state)
+
+    def _collect(self, state):
+        now = time.time()
+        for key, entry in list(state.items()):
+            users = entry['users']
+            for user, timestamp in list(users.items()):
+                if now - timestamp > self.stale_after:
+                    logger.warning("build %s didn't release parent image '%s', ignoring it",
+                                   user, key)
+                    del users[user]
+                    if not users:
+                        entry['released'] = now
+
+            if users or now - entry['released'] < self.grace_period:
+                continue
+            if self._remove_image(key):
+                del state[key]
+
+    def _remove_image(self, image):
+        """
+        :return: bool, False when the image should be removed later
+        """
+        logger.info("removing unused parent image '%s'", image)
+        try:
+            self.tasker.remove_image(image, force=False)
+        except APIError as ex:
+            if not ex.is_client_error():
+                logger.warning("failed to remove image %s: %s, will retry later", image, ex)
+                return False
+            # not present any more, or used by containers this cache doesn't know about
+            logger.warning("failed to remove image %s (%s: %s), ignoring",
+                           image, ex.response.status_code, ex.response.reason)
+        except Exception as ex:
+            logger.warning("exception while removing image %s: %r, will retry later",
+                           image, ex)
+            return False
+        return True
+
+    @contextmanager
+    def _state(self):
+        """
+        Lock the shared state and yield it, changes are stored on exit
+
+        :return: dict, image -> {'users': {build: timestamp}, 'released': timestamp}
+        """
+        path = os.path.join(self.directory, STATE_FILE)
+        with self._lock(os.path.join(self.directory, STATE_LOCK_FILE)):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except FileNotFoundError:
+                state = {}
+            except ValueError:
+                logger.warning("ignoring corrupted parent image cache state %s", path)
+                state = {}
+
+            yield state
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+
+    @contextmanager
+    def _lock(self, path):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _pull_lock_path(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'pull-{}.lock'.format(name))
@@ -367,7 +367,8 @@ def get_image_components(workflow):
         logger.error("%s plugin did not run!", PostBuildRPMqaPlugin.key)
         output = []
 
-    return output
+    # components may be read-only rows of a table, metadata must be plain dicts
+    return [dict(component) for component in output]
 
 
 def add_custom_type(output, custom_type, content=None):
@@ -539,7 +540,7 @@ def get_rpms():
 
     output = get_rpm_list(tags)
 
-    return parse_rpm_output(output, tags)
+    return parse_rpm_output(output, tags).to_dicts()
 
 
 def get_builder_image_id(build_id, osbs):
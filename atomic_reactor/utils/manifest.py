@@ -7,7 +7,9 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import json
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 
 from atomic_reactor.plugin import PluginFailedException
@@ -16,7 +18,7 @@ from atomic_reactor.util import (registry_hostname, RegistrySession, ManifestDig
                                  get_manifest_media_type)
 from atomic_reactor.constants import (MEDIA_TYPE_DOCKER_V2_SCHEMA2,
                                       MEDIA_TYPE_DOCKER_V2_MANIFEST_LIST, MEDIA_TYPE_OCI_V1,
-                                      MEDIA_TYPE_OCI_V1_INDEX)
+                                      MEDIA_TYPE_OCI_V1_INDEX, DEFAULT_REGISTRY_QUERY_WORKERS)
 
 
 class ManifestUtil(object):
@@ -27,11 +29,46 @@ class ManifestUtil(object):
         MEDIA_TYPE_OCI_V1_INDEX
     )
 
-    def __init__(self, workflow, registries, log):
+    def __init__(self, workflow, registries, log, max_workers=DEFAULT_REGISTRY_QUERY_WORKERS):
+        """
+        :param workflow: DockerBuildWorkflow instance
+        :param registries: dict, registries to use if not configured in reactor config
+        :param log: logger
+        :param max_workers: int, maximum number of concurrent requests to a registry
+        """
         self.push_conf = workflow.push_conf
         self.registries = get_registries(workflow, deepcopy(registries or {}))
         self.worker_registries = {}
         self.log = log
+        self.max_workers = max_workers
+        # (registry, repository, digest) of blobs and manifests known to be
+        # present in the repository, these don't have to be linked or stored again
+        self._present = set()
+        self._lock = threading.Lock()
+
+    def map_concurrently(self, func, *iterables):
+        """
+        Call func for each item of iterables, like map(), but with up to
+        max_workers calls running at the same time
+
+        :return: list of results, in the order of the items
+        """
+        args = list(zip(*iterables))
+        if len(args) <= 1 or self.max_workers <= 1:
+            return [func(*arg) for arg in args]
+
+        with ThreadPoolExecutor(max_workers=min(len(args), self.max_workers)) as executor:
+            futures = [executor.submit(func, *arg) for arg in args]
+            # the first failure in the order of the items is raised
+            return [future.result() for future in futures]
+
+    def _is_present(self, session, repository, digest):
+        with self._lock:
+            return (session.registry, repository, digest) in self._present
+
+    def _set_present(self, session, repository, digest):
+        with self._lock:
+            self._present.add((session.registry, repository, digest))
 
     def valid_media_type(self, media_type):
         return media_type in self.manifest_media_types
@@ -91,6 +128,9 @@ class ManifestUtil(object):
         Links ("mounts" in Docker Registry terminology) a blob from one repository in a
         registry into another repository in the same registry.
         """
+        if self._is_present(session, target_repo, digest):
+            return
+
         self.log.debug("%s: Linking blob %s from %s to %s",
                        session.registry, digest, source_repo, target_repo)
 
@@ -101,6 +141,7 @@ class ManifestUtil(object):
             self.log.debug("%s: blob %s, not present in %s, skipping",
                            session.registry, digest, source_repo)
             # Assume we don't need to copy it - maybe it's a foreign layer
+            self._set_present(session, target_repo, digest)
             return
         result.raise_for_status()
 
@@ -113,15 +154,12 @@ class ManifestUtil(object):
             # we're starting an upload - but we've checked that above
             raise RuntimeError("Blob mount had unexpected status {}".format(result.status_code))
 
-    def link_manifest_references_into_repository(self, session, manifest, media_type,
-                                                 source_repo, target_repo):
+        self._set_present(session, target_repo, digest)
+
+    def get_manifest_references(self, manifest, media_type):
         """
-        Links all the blobs referenced by the manifest from source_repo into target_repo.
+        Returns digests of all the blobs referenced by the manifest
         """
-
-        if source_repo == target_repo:
-            return
-
         parsed = json.loads(manifest.decode('utf-8'))
 
         references = []
@@ -134,8 +172,51 @@ class ManifestUtil(object):
             # we never copy a manifest list as a whole between repositories
             raise RuntimeError("Unhandled media-type {}".format(media_type))
 
-        for digest in references:
-            self.link_blob_into_repository(session, digest, source_repo, target_repo)
+        return references
+
+    def link_manifests_into_repositories(self, session, manifests, target_repos):
+        """
+        Links all the blobs referenced by the manifests into all target_repos. Each
+        blob is linked into each repository only once, concurrently with other blobs.
+
+        :param manifests: list of dicts with 'content', 'media_type' and 'repository'
+                          (the source repository) of each manifest
+        :param target_repos: list of str, repositories to link the blobs into
+        """
+        links = []
+        seen = set()
+        for target_repo in target_repos:
+            for manifest in manifests:
+                source_repo = manifest['repository']
+                if source_repo == target_repo:
+                    continue
+                for digest in self.get_manifest_references(manifest['content'],
+                                                           manifest['media_type']):
+                    # the same layer may be referenced by several manifests
+                    if (digest, target_repo) in seen:
+                        continue
+                    seen.add((digest, target_repo))
+                    if not self._is_present(session, target_repo, digest):
+                        links.append((digest, source_repo, target_repo))
+
+        def link(args):
+            self.link_blob_into_repository(session, *args)
+
+        self.map_concurrently(link, links)
+
+    def link_manifest_references_into_repository(self, session, manifest, media_type,
+                                                 source_repo, target_repo):
+        """
+        Links all the blobs referenced by the manifest from source_repo into target_repo.
+        """
+
+        if source_repo == target_repo:
+            return
+
+        self.link_manifests_into_repositories(
+            session,
+            [{'content': manifest, 'media_type': media_type, 'repository': source_repo}],
+            [target_repo])
 
     def store_manifest_in_repository(self, session, manifest, media_type,
                                      source_repo, target_repo, ref=None):
@@ -147,6 +228,12 @@ class ManifestUtil(object):
         if not ref:
             raise RuntimeError("Either a digest or tag must be specified as ref")
 
+        # a manifest stored by digest can't change, tags always have to be stored
+        if self._is_present(session, target_repo, ref):
+            self.log.debug("%s: manifest %s already stored in %s",
+                           session.registry, ref, target_repo)
+            return
+
         self.link_manifest_references_into_repository(session, manifest, media_type,
                                                       source_repo, target_repo)
 
@@ -155,6 +242,9 @@ class ManifestUtil(object):
         response = session.put(url, data=manifest, headers=headers)
         response.raise_for_status()
 
+        if ref.startswith('sha256:'):
+            self._set_present(session, target_repo, ref)
+
     def get_registry_session(self, registry):
         registry_conf = self.registries[registry]
 
@@ -169,11 +259,19 @@ class ManifestUtil(object):
                              source_repo, configured_tags):
         push_conf_registry = self.push_conf.add_docker_registry(session.registry,
                                                                 insecure=session.insecure)
-        for image in configured_tags:
-            target_repo = image.to_str(registry=False, tag=False)
+        target_repos = [image.to_str(registry=False, tag=False) for image in configured_tags]
+        manifest = {'content': image_manifest, 'media_type': media_type,
+                    'repository': source_repo}
+        self.link_manifests_into_repositories(session, [manifest],
+                                              list(dict.fromkeys(target_repos)))
+
+        def store(image, target_repo):
             self.store_manifest_in_repository(session, image_manifest, media_type,
                                               source_repo, target_repo, ref=image.tag)
 
+        self.map_concurrently(store, configured_tags, target_repos)
+
+        for image in configured_tags:
             # add a tag for any plugins running later that expect it
             push_conf_registry.digests[image.tag] = manifest_digest
 
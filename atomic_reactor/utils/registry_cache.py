@@ -0,0 +1,247 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Cache of manifests and blobs fetched from container registries.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from atomic_reactor.constants import (REGISTRY_CACHE_TAG_TTL,
+                                      MEDIA_TYPE_DOCKER_V2_SCHEMA1,
+                                      MEDIA_TYPE_DOCKER_V2_SCHEMA2,
+                                      MEDIA_TYPE_DOCKER_V2_MANIFEST_LIST,
+                                      MEDIA_TYPE_OCI_V1,
+                                      MEDIA_TYPE_OCI_V1_INDEX)
+
+logger = logging.getLogger(__name__)
+
+_registry_cache = None
+
+MANIFEST_MEDIA_TYPES = {
+    MEDIA_TYPE_DOCKER_V2_SCHEMA1,
+    MEDIA_TYPE_DOCKER_V2_SCHEMA2,
+    MEDIA_TYPE_DOCKER_V2_MANIFEST_LIST,
+    MEDIA_TYPE_OCI_V1,
+    MEDIA_TYPE_OCI_V1_INDEX,
+}
+
+
+def get_registry_cache():
+    """
+    Get the cache shared by all registry sessions in this process
+
+    :return: RegistryCache instance, or None if caching is not enabled
+    """
+    return _registry_cache
+
+
+def set_registry_cache(cache):
+    """
+    Set the cache shared by all registry sessions in this process
+
+    :param cache: RegistryCache instance, or None to disable caching
+    """
+    global _registry_cache  # pylint: disable=global-statement
+    _registry_cache = cache
+
+
+def compute_digest(content):
+    return 'sha256:{}'.format(hashlib.sha256(content).hexdigest())
+
+
+class RegistryCache(object):
+    """
+    Cache of registry responses for manifests and blobs
+
+    Content is stored by its digest and, because content addressed by a digest
+    never changes, it is kept as long as the cache exists. Tags are mapped to
+    digests only for tag_ttl seconds, since tags may be moved at any time.
+
+    When a directory is given, both the content and the tag mappings are also
+    stored there, so that other processes using the same directory (e.g. worker
+    pods sharing a volume) can reuse them.
+    """
+
+    def __init__(self, directory=None, tag_ttl=REGISTRY_CACHE_TAG_TTL):
+        """
+        :param directory: str, path to directory for storing cached data, optional
+        :param tag_ttl: int, for how many seconds a tag -> digest mapping is valid
+        """
+        self.directory = directory
+        self.tag_ttl = tag_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # digest -> (media type, content)
+        self._content = {}
+        # (registry, repository, tag, media type) -> (digest, timestamp)
+        self._tags = {}
+
+    def get_content(self, digest):
+        """
+        Get cached content for a digest
+
+        :param digest: str, e.g. 'sha256:...'
+        :return: tuple, (media type, content as bytes), or None if not cached
+        """
+        with self._lock:
+            cached = self._content.get(digest)
+        if cached is None and self.directory:
+            cached = self._read_content(digest)
+            if cached is not None:
+                with self._lock:
+                    self._content[digest] = cached
+        self._count(cached is not None)
+        return cached
+
+    def set_content(self, digest, media_type, content):
+        """
+        Store content for a digest, content not matching the digest is ignored
+
+        :param digest: str, e.g. 'sha256:...'
+        :param media_type: str, media type of content
+        :param content: bytes
+        :return: bool, whether the content was stored
+        """
+        if not digest.startswith('sha256:') or compute_digest(content) != digest:
+            logger.debug("not caching content which doesn't match digest %s", digest)
+            return False
+        with self._lock:
+            self._content[digest] = (media_type, content)
+        if self.directory:
+            self._write_content(digest, media_type, content)
+        return True
+
+    def get_tag_digest(self, registry, repository, tag, media_type):
+        """
+        Get digest a tag pointed to recently
+
+        :param registry: str, registry hostname[:port]
+        :param repository: str, repository name including namespace
+        :param tag: str
+        :param media_type: str, media type requested for the tag
+        :return: str, digest, or None if not known or expired
+        """
+        key = (registry, repository, tag, media_type)
+        with self._lock:
+            cached = self._tags.get(key)
+        if cached is None and self.directory:
+            cached = self._read_tag(key)
+        if cached is not None and time.time() - cached[1] > self.tag_ttl:
+            cached = None
+            with self._lock:
+                self._tags.pop(key, None)
+        self._count(cached is not None)
+        return cached[0] if cached else None
+
+    def set_tag_digest(self, registry, repository, tag, media_type, digest):
+        """
+        Remember which digest a tag points to
+
+        :param registry: str, registry hostname[:port]
+        :param repository: str, repository name including namespace
+        :param tag: str
+        :param media_type: str, media type requested for the tag
+        :param digest: str
+        """
+        key = (registry, repository, tag, media_type)
+        value = (digest, time.time())
+        with self._lock:
+            self._tags[key] = value
+        if self.directory:
+            self._write_tag(key, value)
+
+    def invalidate_tag(self, registry, repository, tag):
+        """
+        Forget all mappings for a tag, e.g. after pushing to it
+
+        :param registry: str, registry hostname[:port]
+        :param repository: str, repository name including namespace
+        :param tag: str
+        """
+        with self._lock:
+            keys = [key for key in self._tags if key[:3] == (registry, repository, tag)]
+            for key in keys:
+                del self._tags[key]
+        if self.directory:
+            # mappings stored by other processes are not known in memory
+            media_types = {key[3] for key in keys} | MANIFEST_MEDIA_TYPES
+            for media_type in media_types:
+                self._remove_file(self._tag_path((registry, repository, tag, media_type)))
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _content_path(self, digest):
+        algorithm, hexdigest = digest.split(':', 1)
+        return os.path.join(self.directory, 'blobs', algorithm, hexdigest)
+
+    def _tag_path(self, key):
+        name = hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'tags', name)
+
+    def _read_content(self, digest):
+        path = self._content_path(digest)
+        try:
+            with open(path + '.json') as f:
+                media_type = json.load(f)['media_type']
+            with open(path, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        if compute_digest(content) != digest:
+            logger.warning('ignoring corrupted cache file %s', path)
+            return None
+        return media_type, content
+
+    def _write_content(self, digest, media_type, content):
+        path = self._content_path(digest)
+        self._write_file(path, content)
+        self._write_file(path + '.json', json.dumps({'media_type': media_type}).encode('utf-8'))
+
+    def _read_tag(self, key):
+        try:
+            with open(self._tag_path(key)) as f:
+                data = json.load(f)
+            return data['digest'], data['timestamp']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def _write_tag(self, key, value):
+        digest, timestamp = value
+        data = json.dumps({'digest': digest, 'timestamp': timestamp}).encode('utf-8')
+        self._write_file(self._tag_path(key), data)
+
+    def _write_file(self, path, data):
+        """Atomically write data, so concurrent readers never see partial files"""
+        dirname = os.path.dirname(path)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except (IOError, OSError) as exc:
+            # cache is only an optimization, never fail because of it
+            logger.warning('failed to write cache file %s: %s', path, exc)
+
+    def _remove_file(self, path):
+        try:
+            os.unlink(path)
+        except (IOError, OSError):
+            pass
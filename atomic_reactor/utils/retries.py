@@ -7,17 +7,47 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import logging
+import os
+import threading
+from urllib.parse import urlparse
+
 import requests
 from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, extract_zipped_paths, select_proxy
+from urllib3 import PoolManager
 from urllib3.util import Retry
 
+from atomic_reactor import tracing
 from atomic_reactor.constants import (HTTP_CLIENT_STATUS_RETRY,
                                       HTTP_MAX_RETRIES,
                                       HTTP_BACKOFF_FACTOR,
-                                      HTTP_REQUEST_TIMEOUT)
+                                      HTTP_REQUEST_TIMEOUT,
+                                      HTTP_POOL_SIZE,
+                                      HTTP_POOL_CONNECTIONS_PER_HOST)
 
 logger = logging.getLogger(__name__)
 
+_connection_pools = None
+
+
+def get_connection_pools():
+    """
+    Get connection pools shared by all http sessions in this process
+
+    :return: ConnectionPools instance, or None if sessions don't share connections
+    """
+    return _connection_pools
+
+
+def set_connection_pools(pools):
+    """
+    Set connection pools shared by all http sessions in this process
+
+    :param pools: ConnectionPools instance, or None to stop sharing connections
+    """
+    global _connection_pools  # pylint: disable=global-statement
+    _connection_pools = pools
+
 
 class SessionWithTimeout(requests.Session):
     """
@@ -32,6 +62,187 @@ class SessionWithTimeout(requests.Session):
         return super(SessionWithTimeout, self).request(*args, **kwargs)
 
 
+class TracingHTTPAdapter(HTTPAdapter):
+    """
+    HTTP adapter recording a tracing span for each request
+    """
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        host = urlparse(request.url).netloc
+        with tracing.span(request.method, tracing.SPAN_HTTP, host=host) as span:
+            response = super(TracingHTTPAdapter, self).send(request, *args, **kwargs)
+
+            span.set(status=response.status_code)
+            # body may not be read yet, only Content-Length is known
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit():
+                span.add('bytes', int(length))
+            if isinstance(request.body, (bytes, str)):
+                span.add('bytes', len(request.body))
+            retries = getattr(response.raw, 'retries', None)
+            if retries is not None and retries.history:
+                span.add('retries', len(retries.history))
+            return response
+
+
+class ConnectionPools(object):
+    """
+    Keep-alive connections shared by http sessions of the build
+
+    Pools are kept per scheme, host, port and TLS settings (verification,
+    CA bundle and client certificate). Authentication, headers and cookies
+    are sent with every request and stay in the sessions, so clients with
+    different credentials safely reuse the same connections.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE,
+                 connections_per_host=HTTP_POOL_CONNECTIONS_PER_HOST):
+        """
+        :param pool_size: int, for how many hosts to keep connections
+        :param connections_per_host: int, how many idle connections to keep for a host
+        """
+        self._lock = threading.Lock()
+        # stats of pools which are not used any more
+        self._closed_stats = {}
+        self.poolmanager = None
+        self.configure(pool_size, connections_per_host)
+
+    def configure(self, pool_size=HTTP_POOL_SIZE,
+                  connections_per_host=HTTP_POOL_CONNECTIONS_PER_HOST):
+        """
+        Change sizes of the pools, open connections are closed
+
+        :param pool_size: int, for how many hosts to keep connections
+        :param connections_per_host: int, how many idle connections to keep for a host
+        """
+        old_poolmanager = self.poolmanager
+        self.pool_size = pool_size
+        self.connections_per_host = connections_per_host
+        poolmanager = PoolManager(num_pools=pool_size, maxsize=connections_per_host)
+        poolmanager.pools.dispose_func = self._dispose
+        self.poolmanager = poolmanager
+        if old_poolmanager is not None:
+            old_poolmanager.clear()
+
+    def close(self):
+        """
+        Close all connections
+        """
+        self.poolmanager.clear()
+
+    def stats(self):
+        """
+        Connection reuse statistics
+
+        :return: dict, 'scheme://host:port' -> dict with number of 'requests',
+                 'connections' opened and 'reused' connections
+        """
+        with self._lock:
+            stats = {host: dict(host_stats) for host, host_stats in self._closed_stats.items()}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                self._add_stats(stats, pool)
+        return stats
+
+    def _dispose(self, pool):
+        with self._lock:
+            self._add_stats(self._closed_stats, pool)
+        pool.close()
+
+    def _add_stats(self, stats, pool):
+        host = '{}://{}:{}'.format(pool.scheme, pool.host, pool.port)
+        host_stats = stats.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})
+        host_stats['requests'] += pool.num_requests
+        host_stats['connections'] += pool.num_connections
+        host_stats['reused'] += max(pool.num_requests - pool.num_connections, 0)
+
+
+class PooledHTTPAdapter(TracingHTTPAdapter):
+    """
+    HTTP adapter using connections from ConnectionPools
+
+    HTTPAdapter.cert_verify() sets TLS settings of a request on the pool its
+    connection comes from, so sessions with different settings (e.g. an
+    insecure registry, a client certificate) must never get the same pool.
+    The pool is therefore looked up with the settings of the request, which
+    become part of the pool key.
+    """
+
+    def __init__(self, connection_pools, **kwargs):
+        self.connection_pools = connection_pools
+        # verify and cert of the request being sent by the current thread
+        self._request_tls = threading.local()
+        super(PooledHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None):  # pylint: disable=arguments-differ
+        self._request_tls.settings = (verify, cert)
+        try:
+            return super(PooledHTTPAdapter, self).send(request, stream=stream, timeout=timeout,
+                                                       verify=verify, cert=cert,
+                                                       proxies=proxies)
+        finally:
+            del self._request_tls.settings
+
+    def get_connection(self, url, proxies=None):
+        if select_proxy(url, proxies):
+            # proxy managers belong to the adapter, they are not shared
+            return super(PooledHTTPAdapter, self).get_connection(url, proxies)
+
+        verify, cert = getattr(self._request_tls, 'settings', (True, None))
+        url = urlparse(url).geturl()
+        return self.poolmanager.connection_from_url(
+            url, pool_kwargs=self.get_tls_pool_kwargs(url, verify, cert))
+
+    @staticmethod
+    def get_tls_pool_kwargs(url, verify, cert):
+        """
+        Connection pool settings HTTPAdapter.cert_verify() would set for a request
+
+        :param url: str, requested URL
+        :param verify: bool or str, whether to verify the server's certificate,
+                       or path to CA bundle
+        :param cert: str or tuple (cert, key), client certificate
+        :return: dict, keyword arguments for the connection pool
+        """
+        if not url.lower().startswith('https'):
+            return {}
+
+        pool_kwargs = {}
+        if verify:
+            pool_kwargs['cert_reqs'] = 'CERT_REQUIRED'
+            cert_loc = verify if verify is not True else \
+                extract_zipped_paths(DEFAULT_CA_BUNDLE_PATH)
+            if os.path.isdir(cert_loc):
+                pool_kwargs['ca_cert_dir'] = cert_loc
+            else:
+                pool_kwargs['ca_certs'] = cert_loc
+        else:
+            pool_kwargs.update(cert_reqs='CERT_NONE', ca_certs=None, ca_cert_dir=None)
+
+        if cert:
+            if isinstance(cert, str):
+                pool_kwargs.update(cert_file=cert, key_file=None)
+            else:
+                pool_kwargs.update(cert_file=cert[0], key_file=cert[1])
+        return pool_kwargs
+
+    def init_poolmanager(self, *args, **kwargs):
+        # connections are managed by connection_pools
+        pass
+
+    @property
+    def poolmanager(self):
+        return self.connection_pools.poolmanager
+
+    def close(self):
+        # shared connections are kept open for other sessions
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
+
 # This is a hook to mock during tests to temporarily disable retries
 def _http_retries_disabled():
     return False
@@ -66,8 +277,13 @@ def get_retrying_requests_session(client_statuses=HTTP_CLIENT_STATUS_RETRY,
         retry.raise_on_status = raise_on_status
 
     session = SessionWithTimeout()
-    session.mount('http://', HTTPAdapter(max_retries=retry))
-    session.mount('https://', HTTPAdapter(max_retries=retry))
+    connection_pools = get_connection_pools()
+    for prefix in ('http://', 'https://'):
+        if connection_pools is not None:
+            adapter = PooledHTTPAdapter(connection_pools, max_retries=retry)
+        else:
+            adapter = TracingHTTPAdapter(max_retries=retry)
+        session.mount(prefix, adapter)
     session.hooks['response'] = [hook_log_error_response_content]
 
     return session
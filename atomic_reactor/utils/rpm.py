@@ -5,8 +5,14 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import sys
+import threading
+
 import rpm
 
+# rpm macros are global, the lock protects changes of _dbpath
+_dbpath_lock = threading.Lock()
+
 image_component_rpm_tags = [
     'NAME',
     'VERSION',
@@ -21,13 +27,32 @@ image_component_rpm_tags = [
 ]
 
 
-def get_rpm_list(tags=None, separator=';'):
+def get_rpm_list(tags=None, separator=';', dbpath=None):
     """
     Return a list of RPMs in the format expected by parse_rpm_output.
+
+    :param dbpath: str, directory with rpm database to query instead of
+                   the database of this system
     """
     if tags is None:
         tags = image_component_rpm_tags
-    ts = rpm.TransactionSet()
+    if dbpath is None:
+        return _query_rpms(rpm.TransactionSet(), tags, separator)
+
+    with _dbpath_lock:
+        rpm.addMacro('_dbpath', dbpath)
+        try:
+            ts = rpm.TransactionSet()
+            ts.openDB()
+        finally:
+            rpm.delMacro('_dbpath')
+    try:
+        return _query_rpms(ts, tags, separator)
+    finally:
+        ts.closeDB()
+
+
+def _query_rpms(ts, tags, separator):
     mi = ts.dbMatch()
     rpms = []
     for h in mi:
@@ -48,13 +73,103 @@ def rpm_qf_args(tags=None, separator=';'):
     return r"-qa --qf '{0}\n'".format(fmt)
 
 
+class _RpmComponent(dict):
+    """
+    Component dict created by RpmComponents, changes raise TypeError
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('rpm components are read-only, use RpmComponents.to_dicts() '
+                        'to get copies')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class RpmComponents(object):
+    """
+    Table of rpm components
+
+    Components are stored by columns with interned strings, which takes much
+    less memory than a list of dicts for images with thousands of packages.
+    The table is a sequence of dicts in the format of Koji metadata
+    components, these are created on access and are read-only; to_dicts()
+    returns copies which can be changed.
+
+    The table only lives in memory of the build which ran rpm. Koji metadata,
+    and so worker metadata read by the orchestrator, is JSON with lists of
+    dicts; get_image_components converts the table to that format.
+    """
+
+    # columns in the order of keys of component dicts, after 'type'
+    COLUMNS = ('name', 'version', 'release', 'arch', 'sigmd5', 'signature', 'epoch')
+
+    __slots__ = COLUMNS
+
+    def __init__(self):
+        self.name = []
+        self.version = []
+        self.release = []
+        self.arch = []
+        self.sigmd5 = []
+        self.signature = []
+        self.epoch = []
+
+    def to_dicts(self):
+        """
+        :return: list, dicts describing each rpm package, e.g. for JSON
+        """
+        return [dict(component) for component in self]
+
+    def append(self, name, version, release, arch, sigmd5, signature, epoch):
+        for column, value in zip(self.COLUMNS,
+                                 (name, version, release, arch, sigmd5, signature, epoch)):
+            if isinstance(value, str):
+                value = sys.intern(value)
+            getattr(self, column).append(value)
+
+    def __len__(self):
+        return len(self.name)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._component(getattr(self, column)[index] for column in self.COLUMNS)
+
+    def __iter__(self):
+        for values in zip(*(getattr(self, column) for column in self.COLUMNS)):
+            yield self._component(values)
+
+    def _component(self, values):
+        return _RpmComponent(zip(('type',) + self.COLUMNS, ('rpm',) + tuple(values)))
+
+    def __eq__(self, other):
+        if isinstance(other, RpmComponents):
+            return all(getattr(self, column) == getattr(other, column)
+                       for column in self.COLUMNS)
+        if isinstance(other, list):
+            return self.to_dicts() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.to_dicts())
+
+
 def parse_rpm_output(output, tags=None, separator=';'):
     """
     Parse output of the rpm query.
 
     :param output: list, decoded output (str) from the rpm subprocess
     :param tags: list, str fields used for query output
-    :return: list, dicts describing each rpm package
+    :return: RpmComponents, sequence of dicts describing each rpm package
     """
 
     if tags is None:
@@ -74,37 +189,34 @@ def parse_rpm_output(output, tags=None, separator=';'):
 
         return value
 
-    components = []
+    components = RpmComponents()
     sigmarker = 'Key ID '
     for rpm_info in output:
         fields = rpm_info.rstrip('\n').split(separator)
         if len(fields) < len(tags):
             continue
 
+        name = field('NAME')
+        if name == 'gpg-pubkey':
+            continue
+
         signature = field('SIGPGP:pgpsig') or field('SIGGPG:pgpsig')
         if signature:
             parts = signature.split(sigmarker, 1)
             if len(parts) > 1:
                 signature = parts[1]
 
-        component_rpm = {
-            'type': 'rpm',
-            'name': field('NAME'),
-            'version': field('VERSION'),
-            'release': field('RELEASE'),
-            'arch': field('ARCH'),
-            'sigmd5': field('SIGMD5'),
-            'signature': signature,
-        }
-
         # Special handling for epoch as it must be an integer or None
         epoch = field('EPOCH')
         if epoch is not None:
             epoch = int(epoch)
 
-        component_rpm['epoch'] = epoch
-
-        if component_rpm['name'] != 'gpg-pubkey':
-            components.append(component_rpm)
+        components.append(name=name,
+                          version=field('VERSION'),
+                          release=field('RELEASE'),
+                          arch=field('ARCH'),
+                          sigmd5=field('SIGMD5'),
+                          signature=signature,
+                          epoch=epoch)
 
     return components
@@ -0,0 +1,278 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Squashing of image layers, streamed from the docker daemon to a docker archive.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+
+from atomic_reactor.constants import INSPECT_ROOTFS, INSPECT_ROOTFS_LAYERS
+from atomic_reactor.util import ChecksumWriter
+
+logger = logging.getLogger(__name__)
+
+WHITEOUT_PREFIX = '.wh.'
+WHITEOUT_OPAQUE = '.wh..wh..opq'
+# saved image metadata, everything else in the archive is spooled to disk
+ARCHIVE_METADATA = ('manifest.json', 'repositories', 'index.json', 'oci-layout')
+
+
+def _normalize(name):
+    return posixpath.normpath('/' + name).lstrip('/')
+
+
+def _is_hidden(path, hidden):
+    """
+    Is path, or any of its parent directories, hidden by newer layers?
+    """
+    while path:
+        if path in hidden:
+            return True
+        path = posixpath.dirname(path)
+    return False
+
+
+class ImageSquasher(object):
+    """
+    Squash layers of an image into a single layer
+
+    The image is saved by the docker daemon and streamed only once: layers are
+    spooled to a temporary directory as they arrive. The layers to squash are
+    merged from the newest to the oldest one, skipping files replaced or
+    deleted (whiteouts) by newer layers, and the resulting docker archive is
+    written to a file-like object in one pass, so it can go straight to
+    a compressor.
+    """
+
+    def __init__(self, tasker, image, from_layer=None, tag=None, tmpdir=None):
+        """
+        :param tasker: ContainerTasker instance
+        :param image: str, id or name of the image to squash
+        :param from_layer: str, id or name of an image the squashed image is based on;
+                           its layers are kept, layers above are squashed; None to
+                           squash all layers
+        :param tag: str, name of the squashed image in the archive, optional
+        :param tmpdir: str, directory for spooled layers, optional
+        """
+        self.tasker = tasker
+        self.image = image
+        self.from_layer = from_layer
+        self.tag = tag
+        self.tmpdir = tmpdir
+
+    def write(self, fileobj):
+        """
+        Write docker archive of the squashed image
+
+        :param fileobj: writable binary file-like object
+        :return: str, id of the squashed image
+        """
+        spool_dir = tempfile.mkdtemp(dir=self.tmpdir)
+        try:
+            files = self._spool_image(spool_dir)
+            manifest = json.loads(self._read(files, 'manifest.json'))[0]
+            config = json.loads(self._read(files, manifest['Config']))
+            layers = [files[name] for name in manifest['Layers']]
+            keep = self._count_kept_layers(config)
+
+            if len(layers) - keep > 0:
+                logger.info("squashing %d layers of %s, keeping %d layers",
+                            len(layers) - keep, self.image, keep)
+                squashed_path = os.path.join(spool_dir, 'squashed.tar')
+                with open(squashed_path, 'wb') as f:
+                    writer = ChecksumWriter(f, algorithms=('sha256',))
+                    self._merge_layers(layers[keep:], writer, keep_whiteouts=keep > 0)
+                squashed_diff_id = 'sha256:{}'.format(writer.checksums['sha256sum'])
+                layers = layers[:keep] + [squashed_path]
+                self._update_config(config, keep, squashed_diff_id)
+            else:
+                logger.info("no layers of %s to squash", self.image)
+
+            config_json = json.dumps(config).encode('utf-8')
+            image_id = 'sha256:{}'.format(hashlib.sha256(config_json).hexdigest())
+            self._write_archive(fileobj, config, config_json, layers)
+            return image_id
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+    def _spool_image(self, spool_dir):
+        """
+        Stream the saved image to spool_dir
+
+        :return: dict, name in the archive -> bytes for metadata, path for other files
+        """
+        files = {}
+        links = {}
+        with self.tasker.get_image_stream(self.image) as image_stream:
+            with tarfile.open(fileobj=image_stream, mode='r|') as archive:
+                for member in archive:
+                    name = _normalize(member.name)
+                    if member.issym():
+                        links[name] = _normalize(posixpath.join(posixpath.dirname(name),
+                                                                member.linkname))
+                    elif member.isfile() and name in ARCHIVE_METADATA:
+                        files[name] = archive.extractfile(member).read()
+                    elif member.isfile():
+                        path = os.path.join(spool_dir, str(len(files)))
+                        with open(path, 'wb') as f:
+                            shutil.copyfileobj(archive.extractfile(member), f)
+                        files[name] = path
+
+        # identical layers are saved only once and linked
+        for name, target in links.items():
+            files[name] = files[target]
+        return files
+
+    def _read(self, files, name):
+        content = files[_normalize(name)]
+        if isinstance(content, bytes):
+            return content
+        with open(content, 'rb') as f:
+            return f.read()
+
+    def _count_kept_layers(self, config):
+        if self.from_layer is None:
+            return 0
+
+        diff_ids = config['rootfs']['diff_ids']
+        base_inspect = self.tasker.inspect_image(self.from_layer)
+        base_diff_ids = base_inspect[INSPECT_ROOTFS][INSPECT_ROOTFS_LAYERS]
+        if diff_ids[:len(base_diff_ids)] != base_diff_ids:
+            raise RuntimeError("image {} is not based on {}".format(self.image, self.from_layer))
+        return len(base_diff_ids)
+
+    def _merge_layers(self, layers, fileobj, keep_whiteouts):
+        """
+        Merge layers into a single layer
+
+        :param layers: list of str, paths to layers, from the oldest one
+        :param fileobj: writable file-like object for the merged layer
+        :param keep_whiteouts: bool, whether to keep whiteouts hiding files
+                               in older layers, which are not squashed
+        """
+        # paths already in the merged layer
+        written = set()
+        # directories already in the merged layer
+        written_dirs = set()
+        # paths whose content in older layers is deleted or replaced
+        hidden = set()
+
+        with tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT) as merged:
+            for layer_path in reversed(layers):
+                written_from_layer = set()
+                hidden_by_layer = set()
+
+                with tarfile.open(layer_path, mode='r:') as layer:
+                    for member in layer:
+                        path = _normalize(member.name)
+                        if not path or _is_hidden(path, hidden):
+                            continue
+
+                        dirname, basename = posixpath.split(path)
+                        if basename.startswith(WHITEOUT_PREFIX):
+                            if basename == WHITEOUT_OPAQUE:
+                                hidden_by_layer.add(dirname)
+                                target = path
+                            else:
+                                target = posixpath.join(dirname, basename[len(WHITEOUT_PREFIX):])
+                                hidden_by_layer.add(target)
+                            if keep_whiteouts:
+                                if target not in written:
+                                    merged.addfile(member)
+                                elif target in written_dirs:
+                                    # the directory is recreated by a newer layer,
+                                    # only its old content has to be hidden
+                                    opaque = posixpath.join(target, WHITEOUT_OPAQUE)
+                                    if opaque not in written:
+                                        member.name = opaque
+                                        merged.addfile(member)
+                                        written.add(opaque)
+                            written.add(target)
+                            continue
+
+                        if path in written:
+                            continue
+                        written.add(path)
+                        written_from_layer.add(path)
+                        if member.isdir():
+                            written_dirs.add(path)
+                        else:
+                            # a file replaces whole directory tree of older layers
+                            hidden_by_layer.add(path)
+
+                        if member.islnk() and _normalize(member.linkname) not in written_from_layer:
+                            # the link target is replaced by a newer layer,
+                            # store content of this layer instead
+                            target = layer.getmember(member.linkname)
+                            member.type = tarfile.REGTYPE
+                            member.linkname = ''
+                            member.size = target.size
+                            merged.addfile(member, layer.extractfile(target))
+                        elif member.isreg():
+                            merged.addfile(member, layer.extractfile(member))
+                        else:
+                            merged.addfile(member)
+
+                hidden |= hidden_by_layer
+
+    def _update_config(self, config, keep, squashed_diff_id):
+        config['rootfs']['diff_ids'] = config['rootfs']['diff_ids'][:keep] + [squashed_diff_id]
+
+        # history entries of squashed layers are kept as empty layers,
+        # the last one stands for the squashed layer
+        history = config.get('history', [])
+        layers_seen = 0
+        last_squashed = None
+        for entry in history:
+            if entry.get('empty_layer'):
+                continue
+            layers_seen += 1
+            if layers_seen > keep:
+                entry['empty_layer'] = True
+                last_squashed = entry
+        if last_squashed is not None:
+            del last_squashed['empty_layer']
+
+        config.pop('id', None)
+        config.pop('parent', None)
+
+    def _write_archive(self, fileobj, config, config_json, layers):
+        config_name = '{}.json'.format(hashlib.sha256(config_json).hexdigest())
+        layer_names = ['{}/layer.tar'.format(diff_id.split(':', 1)[-1])
+                       for diff_id in config['rootfs']['diff_ids']]
+        manifest = [{
+            'Config': config_name,
+            'RepoTags': [self.tag] if self.tag else [],
+            'Layers': layer_names,
+        }]
+
+        with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+            for name, path in zip(layer_names, layers):
+                self._add_file(archive, name, path=path)
+            self._add_file(archive, config_name, content=config_json)
+            self._add_file(archive, 'manifest.json',
+                           content=json.dumps(manifest).encode('utf-8'))
+
+    def _add_file(self, archive, name, path=None, content=None):
+        info = tarfile.TarInfo(name)
+        info.mode = 0o644
+        if path is not None:
+            info.size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                archive.addfile(info, f)
+        else:
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
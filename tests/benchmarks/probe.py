@@ -0,0 +1,81 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Measurements done in a fresh interpreter for tests/benchmarks/startup.py.
+
+This file is run as a script and must not import anything from atomic_reactor
+or tests at module level, so that all imports are measured cold. The result is
+written to stdout as JSON, times are in milliseconds, memory in KiB.
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+
+START = time.perf_counter()
+
+
+def elapsed(since=START):
+    return (time.perf_counter() - since) * 1000
+
+
+def report(result):
+    result['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sys.stdout.write(json.dumps(result))
+    sys.stdout.flush()
+    # don't let the interrupted build run any further
+    os._exit(0)
+
+
+def probe_startup(build_json_path):
+    """
+    Time from the start of the CLI to the moment the first plugin runner runs
+    """
+    from atomic_reactor.cli import main
+    import_time = elapsed()
+
+    from atomic_reactor.plugin import PluginsRunner
+
+    def first_run(runner, *args, **kwargs):
+        report({'import': import_time, 'first_plugin': elapsed()})
+
+    PluginsRunner.run = first_run
+    sys.argv = ['atomic-reactor', '--quiet', 'inside-build',
+                '--input', 'path', '--input-arg', 'path={}'.format(build_json_path)]
+    main.run()
+    sys.exit('no plugin runner was run')
+
+
+def probe_plugins(plugin_class_name, import_all):
+    """
+    Time to find plugins of one kind and, optionally, to import all of them
+    """
+    from atomic_reactor.plugin import PluginsRunner
+
+    runner = PluginsRunner.__new__(PluginsRunner)
+    runner.plugin_files = []
+    start = time.perf_counter()
+    plugin_classes = runner.load_plugins(plugin_class_name)
+    result = {'index': elapsed(start), 'plugins': len(plugin_classes)}
+    if import_all:
+        start = time.perf_counter()
+        for key in plugin_classes:
+            plugin_classes.get(key)
+        result['import_all'] = elapsed(start)
+    report(result)
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == 'startup':
+        probe_startup(sys.argv[2])
+    elif sys.argv[1] == 'plugins':
+        probe_plugins(sys.argv[2], import_all=sys.argv[3:] == ['import-all'])
+    else:
+        sys.exit('unknown probe {}'.format(sys.argv[1]))
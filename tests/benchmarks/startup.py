@@ -0,0 +1,209 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Startup benchmarks of atomic-reactor
+
+Measures, every time in a fresh interpreter:
+
+ * cold import time of the main modules (python -X importtime)
+ * time from start of the CLI to the first plugin runner, with and without
+   the cached plugin index
+ * time to index and to import plugins for every kind of plugin runner
+ * peak RSS of the processes above
+
+Neither network nor a docker daemon are needed. Results are compared with
+a stored baseline and the script fails when a metric got worse by more than
+the threshold:
+
+    python -m tests.benchmarks.startup
+    python -m tests.benchmarks.startup --save-baseline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from atomic_reactor.plugin import PLUGIN_BASE_CLASSES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOP_DIR = os.path.dirname(os.path.dirname(HERE))
+PROBE = os.path.join(HERE, 'probe.py')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+IMPORT_MODULES = (
+    'atomic_reactor',
+    'atomic_reactor.util',
+    'atomic_reactor.plugin',
+    'atomic_reactor.inner',
+    'atomic_reactor.api',
+    'atomic_reactor.cli.main',
+)
+# relative change of a metric considered a regression
+DEFAULT_THRESHOLD = 0.25
+# changes smaller than these are noise, whatever the relative change is
+MIN_TIME_DIFFERENCE = 5  # ms
+MIN_RSS_DIFFERENCE = 2048  # KiB
+
+
+def run_python(args, env=None):
+    """
+    :return: subprocess.CompletedProcess of python run with args
+    """
+    process_env = dict(os.environ)
+    process_env.update(env or {})
+    process_env['PYTHONPATH'] = os.pathsep.join(
+        [TOP_DIR] + [p for p in [os.environ.get('PYTHONPATH')] if p])
+    return subprocess.run([sys.executable] + args, env=process_env, cwd=TOP_DIR,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+
+
+def parse_importtime(output):
+    """
+    Total time of imports in -X importtime output
+
+    :param output: str, stderr of python -X importtime
+    :return: float, ms spent importing modules not imported at startup
+    """
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are already included in the cumulative time
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative)
+    return total / 1000
+
+
+def measure_import(module):
+    output = run_python(['-X', 'importtime', '-c', 'import {}'.format(module)]).stderr
+    return parse_importtime(output)
+
+
+def probe(args, env=None):
+    return json.loads(run_python([PROBE] + args, env=env).stdout)
+
+
+def measure(repeat):
+    """
+    :param repeat: int, how many times to repeat every measurement
+    :return: dict, metric name -> median of measured values
+    """
+    samples = {}
+
+    def add(name, value):
+        samples.setdefault(name, []).append(value)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        build_json = os.path.join(tmpdir, 'build.json')
+        with open(build_json, 'w') as f:
+            json.dump({'image': 'benchmark', 'source': {'provider': 'path', 'uri': tmpdir}}, f)
+        no_index_cache = {'ATOMIC_REACTOR_PLUGIN_INDEX': ''}
+        index_cache = {'ATOMIC_REACTOR_PLUGIN_INDEX': os.path.join(tmpdir, 'plugin-index.json')}
+        # populate the index cache
+        probe(['plugins', PLUGIN_BASE_CLASSES[0]], env=index_cache)
+
+        for _ in range(repeat):
+            for module in IMPORT_MODULES:
+                add('import.{}'.format(module), measure_import(module))
+
+            result = probe(['startup', build_json], env=no_index_cache)
+            add('startup.import', result['import'])
+            add('startup.first_plugin', result['first_plugin'])
+            add('startup.peak_rss', result['peak_rss'])
+            result = probe(['startup', build_json], env=index_cache)
+            add('startup.first_plugin_cached_index', result['first_plugin'])
+            add('startup.peak_rss_cached_index', result['peak_rss'])
+
+            for plugin_class_name in PLUGIN_BASE_CLASSES:
+                prefix = 'plugins.{}.'.format(plugin_class_name)
+                result = probe(['plugins', plugin_class_name], env=no_index_cache)
+                add(prefix + 'index', result['index'])
+                result = probe(['plugins', plugin_class_name, 'import-all'], env=index_cache)
+                add(prefix + 'index_cached', result['index'])
+                add(prefix + 'import_all', result['import_all'])
+                add(prefix + 'peak_rss', result['peak_rss'])
+
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find metrics which got worse than in the baseline
+
+    :param results: dict, metric name -> value
+    :param baseline: dict, metric name -> value
+    :param threshold: float, relative change considered a regression
+    :return: list of str, names of regressed metrics
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        min_difference = MIN_RSS_DIFFERENCE if 'rss' in name else MIN_TIME_DIFFERENCE
+        if value > base * (1 + threshold) and value - base > min_difference:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results, baseline):
+    width = max(len(name) for name in results)
+    for name, value in sorted(results.items()):
+        unit = 'KiB' if 'rss' in name else 'ms'
+        line = '{:<{}} {:>10.1f} {}'.format(name, width, value, unit)
+        base = baseline.get(name)
+        if base:
+            line += '  (baseline {:.1f}, {:+.0%})'.format(base, value / base - 1)
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark startup of atomic-reactor')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='how many times to repeat every measurement, median is used')
+    parser.add_argument('--baseline', default=BASELINE, help='path to baseline results')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative change of a metric considered a regression')
+    args = parser.parse_args(argv)
+
+    results = measure(args.repeat)
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline saved to {}'.format(args.baseline))
+        return 0
+
+    if not baseline:
+        print('no baseline in {}, record one with --save-baseline'.format(args.baseline))
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print('regressions over {:.0%}: {}'.format(args.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,8 +14,9 @@ from tests.constants import LOCALHOST_REGISTRY_HTTP, DOCKER0_REGISTRY_HTTP, MOCK
 from tests.util import uuid_value
 
 from osbs.utils import ImageName
+from atomic_reactor.auth import get_bearer_token_cache
 from atomic_reactor.core import ContainerTasker
-from atomic_reactor.constants import CONTAINER_DOCKERPY_BUILD_METHOD
+from atomic_reactor.constants import CONTAINER_DOCKERPY_BUILD_METHOD, PLUGIN_INDEX_CACHE_ENV
 from atomic_reactor.inner import DockerBuildWorkflow
 from tests.constants import MOCK_SOURCE
 
@@ -81,6 +82,24 @@ def workflow(user_params):
     return DockerBuildWorkflow(source=MOCK_SOURCE)
 
 
+@pytest.fixture(autouse=True)
+def clear_bearer_token_cache():
+    """
+    Bearer tokens are cached for the whole process, don't let them leak
+    between tests mocking the same registries.
+    """
+    yield
+    get_bearer_token_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def no_plugin_index_cache(monkeypatch):
+    """
+    Never read or write a plugin index cache configured in the environment
+    """
+    monkeypatch.setenv(PLUGIN_INDEX_CACHE_ENV, '')
+
+
 @pytest.mark.optionalhook
 def pytest_html_results_table_row(report, cells):
     if report.passed or report.skipped:
@@ -6,6 +6,7 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+import io
 import os
 import docker
 from flexmock import flexmock
@@ -305,7 +306,10 @@ def mock_docker(build_should_fail=False,
 
     def mock_get(url, **kwargs):
         if url == BASE_URL + "/containers/" + mock_containers[0]['Id'] + "/export":
-            return flexmock(status_code=200, iter_content=mock_iter_content)
+            return flexmock(status_code=200, iter_content=mock_iter_content,
+                            raw=io.BytesIO(b'X' * 100))
+        elif url.startswith(BASE_URL + "/images/") and url.endswith("/get"):
+            return flexmock(status_code=200, raw=open(__file__, 'rb'))
         else:
             return flexmock(status_code=404, content='not found')
 
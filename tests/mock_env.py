@@ -182,9 +182,8 @@ class MockEnv(object):
         """
         Get reactor config map (from the ReactorConfigPlugin's workspace)
 
-        If config does not exist, it will be created, i.e. you can do:
-        >>> env = MockEnv()
-        >>> env.reactor_config.conf['sources_command'] = 'fedpkg sources'
+        If config does not exist, it will be created. The config is read-only,
+        use set_reactor_config() to change it.
 
         :return: ReactorConfig instance
         """
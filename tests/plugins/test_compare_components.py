@@ -20,9 +20,7 @@ from atomic_reactor.plugin import PostBuildPluginsRunner, PluginFailedException
 from atomic_reactor.plugins.pre_reactor_config import (ReactorConfigPlugin,
                                                        WORKSPACE_CONF_KEY,
                                                        ReactorConfig)
-from atomic_reactor.plugins.post_compare_components import (
-    filter_components_by_name
-)
+from atomic_reactor.plugins.post_compare_components import index_components
 from atomic_reactor.util import DockerfileImages
 
 from tests.constants import MOCK_SOURCE, INPUT_IMAGE, FILES
@@ -95,23 +93,29 @@ def mock_metadatas():
     return worker_metadatas
 
 
-def test_filter_components_by_name():
-    """Test function filter_components_by_name"""
+def test_index_components():
+    """Test function index_components"""
     worker_metadatas = mock_metadatas()
-    component_name = 'openssl'
 
     component_list = [
-        worker_metadata['output'][2]['components']
-        for worker_metadata in worker_metadatas.values()
+        worker_metadatas[platform]['output'][2]['components']
+        for platform in sorted(worker_metadatas)
     ]
 
-    filtered = list(filter_components_by_name(component_name, component_list))
+    index = index_components(component_list)
 
-    expected_count = len(worker_metadatas)
-    assert len(filtered) == expected_count
+    assert sum(len(components) for components in index.values()) == \
+        sum(len(components) for components in component_list)
+    for (type_, name), components in index.items():
+        assert components == [
+            component
+            for worker_components in component_list
+            for component in worker_components
+            if component['type'] == type_ and component['name'] == name
+        ]
 
     expected_platforms = set(worker_metadatas.keys())
-    assert set(f['arch'] for f in filtered) == expected_platforms
+    assert set(c['arch'] for c in index[('rpm', 'openssl')]) == expected_platforms
 
 
 @pytest.mark.parametrize('base_from_scratch', (True, False))
@@ -8,6 +8,8 @@ from atomic_reactor.constants import (EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE,
 from atomic_reactor.core import DockerTasker
 from atomic_reactor.plugin import PostBuildPluginsRunner
 from atomic_reactor.plugins.post_compress import CompressPlugin
+from atomic_reactor.util import get_checksums
+from atomic_reactor.utils import compress
 from osbs.utils import ImageName
 from atomic_reactor.build import BuildResult
 
@@ -30,16 +32,20 @@ class X(object):
 
 class TestCompress(object):
     @pytest.mark.parametrize('source_build', (True, False))
+    @pytest.mark.parametrize('threads', (None, 1, 3))
     @pytest.mark.parametrize('method, load_exported_image, give_export, extension', [
         ('gzip', False, True, 'gz'),
         ('lzma', False, False, 'xz'),
         ('gzip', True, True, 'gz'),
         ('gzip', True, False, 'gz'),
+        pytest.param('zstd', True, True, 'zst',
+                     marks=pytest.mark.skipif(compress.zstandard is None,
+                                              reason='zstandard not available')),
         ('spam', True, True, None),
     ])
     def test_compress(self, tmpdir, caplog, workflow,
                       source_build, method,
-                      load_exported_image, give_export, extension):
+                      load_exported_image, give_export, extension, threads):
         if MOCK:
             mock_docker()
 
@@ -66,6 +72,7 @@ class TestCompress(object):
                 'args': {
                     'method': method,
                     'load_exported_image': load_exported_image,
+                    'threads': threads,
                 },
             }]
         )
@@ -90,8 +97,36 @@ class TestCompress(object):
             assert metadata['type'] == IMAGE_TYPE_DOCKER_ARCHIVE
             assert 'uncompressed_size' in metadata
             assert isinstance(metadata['uncompressed_size'], int)
+            # checksums computed during compression match the file
+            checksums = get_checksums(compressed_img, ['md5', 'sha256'])
+            assert metadata['md5sum'] == checksums['md5sum']
+            assert metadata['sha256sum'] == checksums['sha256sum']
             assert ", ratio: " in caplog.text
 
+    def test_skip_compressed_image(self, tmpdir, caplog, workflow):
+        workflow.builder = X()
+        workflow.build_result = BuildResult(image_id="12345")
+        compressed_img = os.path.join(str(tmpdir), 'img.tar.gz')
+        metadata = {'path': compressed_img, 'type': IMAGE_TYPE_DOCKER_ARCHIVE,
+                    'uncompressed_size': 1024}
+        workflow.exported_image_sequence.append(metadata)
+
+        runner = PostBuildPluginsRunner(
+            None,
+            workflow,
+            [{
+                'name': CompressPlugin.key,
+                'args': {
+                    'method': 'gzip',
+                    'load_exported_image': True,
+                },
+            }]
+        )
+
+        runner.run()
+        assert 'is compressed already, skipping' in caplog.text
+        assert workflow.exported_image_sequence == [metadata]
+
     def test_skip_plugin(self, caplog, workflow):
         if MOCK:
             mock_docker()
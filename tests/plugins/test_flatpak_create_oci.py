@@ -566,20 +566,10 @@ def test_flatpak_create_oci(tmpdir, docker_tasker, user_params,
 
     export_stream = open(filesystem_tar, "rb")
 
-    def stream_to_generator(s):
-        while True:
-            # Yield small chunks to test the StreamAdapter code better
-            buf = s.read(100)
-            if len(buf) == 0:
-                return
-            yield buf
-
-    export_generator = stream_to_generator(export_stream)
-
-    (flexmock(docker_tasker.tasker)
-     .should_receive('export_container')
+    (flexmock(docker_tasker.tasker.d)
+     .should_receive('export_raw')
      .with_args(CONTAINER_ID)
-     .and_return(export_generator))
+     .and_return(export_stream))
 
     (flexmock(docker_tasker.tasker.d.wrapped)
      .should_receive('create_container')
@@ -618,3 +618,56 @@ def test_group_manifests(tmpdir, schema_version, test_name, group, foreign_layer
         with pytest.raises(PluginFailedException) as ex:
             runner.run()
         assert expected_exception in str(ex.value)
+
+
+@pytest.mark.parametrize('group', [True, False])
+@responses.activate
+def test_group_manifests_link_blobs_once(tmpdir, group, user_params):
+    test_images = ['namespace/httpd:2.4-1',
+                   'namespace/httpd:2.4-1-1',
+                   'namespace/httpd:2.4-1-2',
+                   'namespace/other:2.4-1']
+    workers = {
+        'x86_64': {REGISTRY_V2: ['worker-build:worker-build-x86_64-latest']},
+    }
+    if group:
+        workers['ppc64le'] = {REGISTRY_V2: ['worker-build:worker-build-ppc64le-latest']}
+    registry_conf = {REGISTRY_V2: {'version': 'v2', 'insecure': True}}
+
+    mocked_registries, annotations = mock_registries(registry_conf, workers)
+    tasker, workflow = mock_environment(tmpdir, primary_images=test_images,
+                                        annotations=annotations)
+
+    runner = PostBuildPluginsRunner(tasker, workflow, [{
+        'name': GroupManifestsPlugin.key,
+        'args': {
+            'registries': registry_conf,
+            'group': group,
+            'goarch': {'ppc64le': 'powerpc', 'x86_64': 'amd64'},
+        },
+    }])
+    runner.run()
+
+    registry = mocked_registries[REGISTRY_V2]
+    for image in test_images:
+        name, tag = image.split(':')
+        assert tag in registry.get_repo(name)['tags']
+
+    def requests_made(method, pattern):
+        return [call.request.url for call in responses.calls
+                if call.request.method == method and re.search(pattern, call.request.url)]
+
+    # each blob is linked into each repository exactly once, even though
+    # there are several tags in the repository
+    mounts = requests_made('POST', r'/blobs/uploads/')
+    assert len(mounts) == len(set(mounts)) == 2 * len(workers) * 2
+    # the source repository is checked once for each target repository
+    assert len(requests_made('HEAD', r'/blobs/')) == len(mounts)
+
+    # referenced manifests are stored only once per repository, tags once per tag
+    manifest_puts = requests_made('PUT', r'/manifests/')
+    assert len(manifest_puts) == len(set(manifest_puts))
+    expected_puts = len(test_images)
+    if group:
+        expected_puts += len(workers) * 2
+    assert len(manifest_puts) == expected_puts
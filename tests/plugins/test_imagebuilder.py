@@ -9,7 +9,7 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import subprocess
-from io import StringIO
+from io import BytesIO, StringIO
 from dockerfile_parse import DockerfileParser
 
 from atomic_reactor.plugin import PluginFailedException
@@ -35,9 +35,9 @@ def mock_docker_tasker(docker_tasker):
      .should_receive('history')
      .and_return([]))
 
-    (flexmock(docker_tasker.tasker.d.wrapped)
-     .should_receive('get_image')
-     .and_return(flexmock(data="image data")))
+    (flexmock(docker_tasker.tasker.d)
+     .should_receive('get_image_raw')
+     .and_return(BytesIO(b"image data")))
 
 
 class MockInsideBuilder(object):
@@ -8,12 +8,14 @@ of the BSD license. See the LICENSE file for details.
 
 from atomic_reactor.core import DockerTasker
 from atomic_reactor.inner import DockerBuildWorkflow
-from atomic_reactor.plugin import BuildCanceledException, PluginFailedException
+from atomic_reactor.plugin import PluginFailedException
 from atomic_reactor.plugin import BuildStepPluginsRunner
 from atomic_reactor.plugins import pre_reactor_config
 from atomic_reactor.plugins.build_orchestrate_build import (OrchestrateBuildPlugin,
+                                                            ClusterStateCache,
                                                             get_worker_build_info,
                                                             get_koji_upload_dir,
+                                                            get_cluster_metrics,
                                                             override_build_kwarg)
 from atomic_reactor.plugins.pre_reactor_config import (ReactorConfig,
                                                        ReactorConfigPlugin,
@@ -24,7 +26,6 @@ import atomic_reactor.util
 from atomic_reactor.constants import (PLUGIN_ADD_FILESYSTEM_KEY,
                                       PLUGIN_CHECK_AND_SET_PLATFORMS_KEY)
 from flexmock import flexmock
-from multiprocessing.pool import AsyncResult
 from osbs.api import OSBS
 from osbs.conf import Configuration
 from osbs.build.build_response import BuildResponse
@@ -41,7 +42,8 @@ import json
 import os
 import sys
 import pytest
-import time
+import signal
+import threading
 import platform
 
 
@@ -186,13 +188,15 @@ def mock_reactor_config(tmpdir, clusters=None, empty=False, add_config=None):
         .and_return(conf))
 
     with open(os.path.join(str(tmpdir), 'osbs.conf'), 'w') as f:
-        for plat_clusters in clusters.values():
-            for cluster in plat_clusters:
-                f.write(dedent("""\
-                    [{name}]
-                    openshift_url = https://{name}.com/
-                    namespace = {name}_namespace
-                    """.format(name=cluster['name'])))
+        # clusters may be enabled for several platforms
+        cluster_names = {cluster['name']
+                         for plat_clusters in clusters.values() for cluster in plat_clusters}
+        for name in sorted(cluster_names):
+            f.write(dedent("""\
+                [{name}]
+                openshift_url = https://{name}.com/
+                namespace = {name}_namespace
+                """.format(name=name)))
     return conf_json
 
 
@@ -644,40 +648,28 @@ def test_orchestrate_build_cancelation(tmpdir):
         }]
     )
 
+    cancelled = threading.Event()
+
     def mock_wait_for_build_to_finish(build_name):
-        return make_build_response(build_name, 'Running')
+        # orchestrator build is cancelled while the worker build is running
+        os.kill(os.getpid(), signal.SIGTERM)
+        assert cancelled.wait(5)
+        return make_build_response(build_name, 'Cancelled')
     (flexmock(OSBS)
         .should_receive('wait_for_build_to_finish')
         .replace_with(mock_wait_for_build_to_finish))
 
-    flexmock(OSBS).should_receive('cancel_build').once()
-
-    (flexmock(AsyncResult).should_receive('ready')
-        .and_return(False)  # normal execution
-        .and_return(False)  # after cancel_build
-        .and_return(True))  # finally succeed
-
-    class RaiseOnce(object):
-        """
-        Only raise an exception the first time this mocked wait() method
-        is called.
-        """
-
-        def __init__(self):
-            self.exception_raised = False
-
-        def get(self, timeout=None):
-            time.sleep(0.1)
-            if not self.exception_raised:
-                self.exception_raised = True
-                raise BuildCanceledException()
-
-    raise_once = RaiseOnce()
-    (flexmock(AsyncResult).should_receive('get')
-        .replace_with(raise_once.get))
+    (flexmock(OSBS)
+        .should_receive('cancel_build')
+        .replace_with(lambda build_name: cancelled.set())
+        .once())
 
-    with pytest.raises(PluginFailedException) as exc:
-        runner.run()
+    original_handler = signal.signal(signal.SIGTERM, workflow.throw_canceled_build_exception)
+    try:
+        with pytest.raises(PluginFailedException) as exc:
+            runner.run()
+    finally:
+        signal.signal(signal.SIGTERM, original_handler)
     assert 'BuildCanceledException' in str(exc.value)
 
 
@@ -732,6 +724,70 @@ def test_orchestrate_build_choose_clusters(tmpdir, clusters_x86_64, clusters_ppc
         assert plat_annotations['build']['cluster-url'] == 'https://chosen_{}.com/'.format(plat)
 
 
+def test_orchestrate_build_shared_cluster_state(tmpdir):
+    workflow = mock_workflow(tmpdir)
+    mock_osbs()
+    mock_manifest_list()
+    # cluster enabled for both platforms is queried only once
+    (flexmock(OSBS)
+        .should_receive('list_builds')
+        .and_return([1, 2])
+        .once())
+
+    mock_reactor_config(tmpdir, {
+        'x86_64': [{'name': 'shared', 'max_concurrent_builds': 5}],
+        'ppc64le': [{'name': 'shared', 'max_concurrent_builds': 5}],
+    })
+
+    runner = BuildStepPluginsRunner(
+        workflow.builder.tasker,
+        workflow,
+        [{
+            'name': OrchestrateBuildPlugin.key,
+            'args': {
+                'platforms': ['x86_64', 'ppc64le'],
+                'build_kwargs': make_worker_build_kwargs(),
+                'osbs_client_config': str(tmpdir),
+                'goarch': {'x86_64': 'amd64'},
+            }
+        }]
+    )
+
+    build_result = runner.run()
+    assert not build_result.is_failed()
+
+    metrics = get_cluster_metrics(workflow)
+    assert list(metrics) == ['shared']
+    assert sorted(attempt['platform'] for attempt in metrics['shared']) == ['ppc64le', 'x86_64']
+    assert all(attempt['succeeded'] for attempt in metrics['shared'])
+
+
+def test_cluster_state_cache():
+    cache = ClusterStateCache(ttl=60)
+    queries = []
+
+    def query():
+        queries.append(1)
+        return 3
+
+    assert cache.get_current_builds('spam', query) == 3
+    assert cache.get_current_builds('spam', query) == 3
+    assert len(queries) == 1
+
+    cache.add_build('spam')
+    assert cache.get_current_builds('spam', query) == 4
+    assert len(queries) == 1
+
+    cache.invalidate('spam')
+    assert cache.get_current_builds('spam', query) == 3
+    assert len(queries) == 2
+
+    # expired values are queried again
+    cache.ttl = 0
+    assert cache.get_current_builds('spam', query) == 3
+    assert len(queries) == 3
+
+
 # This test tests code paths that can no longer be hit in actual operation since
 # we exclude platforms with no clusters in check_and_set_platforms.
 def test_orchestrate_build_unknown_platform(tmpdir):  # noqa
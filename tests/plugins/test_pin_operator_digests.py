@@ -10,6 +10,7 @@ import copy
 import io
 import os
 import pathlib
+import threading
 
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap
@@ -504,9 +505,9 @@ class TestPinOperatorDigest(object):
         })
         # there should be no queries for the pullspecs which already contain a digest
 
-        # images should be inspected after their digests are pinned
-        mock_inspect_query('weird-registry/ns/bar@sha256:2', {PKG_LABEL: 'bar-package'}, times=2)
-        mock_inspect_query('old-registry/ns/spam@sha256:4', {PKG_LABEL: 'spam-package'}, times=2)
+        # images should be inspected after their digests are pinned, only once per image
+        mock_inspect_query('weird-registry/ns/bar@sha256:2', {PKG_LABEL: 'bar-package'})
+        mock_inspect_query('old-registry/ns/spam@sha256:4', {PKG_LABEL: 'spam-package'})
 
         f = mock_operator_csv(tmpdir.join(OPERATOR_MANIFESTS_DIR).mkdir(), 'csv.yaml', pullspecs)
         pre_content = f.read()
@@ -550,6 +551,7 @@ class TestPinOperatorDigest(object):
         assert pullspecs_log in caplog_text
 
         assert "Computing replacement pullspecs" in caplog_text
+        assert "Registry query times:\nold-registry/ns/spam:1: " in caplog_text
 
         # replacements are logged in alphabetical order (ordered by the original pullspec)
         replacements_log = (
@@ -852,8 +854,11 @@ class TestPinOperatorDigest(object):
 
 
 class TestPullspecReplacer(object):
-    def mock_workflow(self, site_config):
-        return MockEnv().set_reactor_config(make_reactor_config(site_config)).workflow
+    def mock_workflow(self, site_config, pull_registries=()):
+        reactor_config = make_reactor_config(site_config)
+        if pull_registries:
+            reactor_config['pull_registries'] = [{'url': registry} for registry in pull_registries]
+        return MockEnv().set_reactor_config(reactor_config).workflow
 
     @pytest.mark.parametrize('allowed_registries, image, allowed', [
         (None, 'registry/ns/foo', True),
@@ -890,6 +895,60 @@ class TestPullspecReplacer(object):
         else:
             assert "{} looks like a digest, skipping query".format(digest) in caplog.text
 
+    def test_pin_digests(self):
+        pullspecs = ['registry-{}/ns/foo-{}:1'.format(i % 2, i) for i in range(6)]
+        images = [ImageName.parse(p) for p in pullspecs]
+        # duplicates are queried only once
+        images += [ImageName.parse(pullspecs[0]), ImageName.parse('registry-0/ns/foo@sha256:1')]
+
+        # all queries for one registry must be running at the same time
+        barriers = {'registry-0': threading.Barrier(3, timeout=10),
+                    'registry-1': threading.Barrier(3, timeout=10)}
+        queried = []
+
+        def mocked_get_manifest_list_digest(image):
+            queried.append(image.to_str())
+            barriers[image.registry].wait()
+            return 'sha256:{}'.format(image.repo)
+
+        (flexmock(atomic_reactor.util.RegistryClient)
+            .should_receive('get_manifest_list_digest')
+            .replace_with(mocked_get_manifest_list_digest))
+
+        site_config = get_site_config()
+        site_config['registry_query_workers'] = 3
+        workflow = self.mock_workflow(site_config, pull_registries=list(barriers))
+        replacer = PullspecReplacer(user_config={}, workflow=workflow)
+        pinned = replacer.pin_digests(images)
+
+        assert sorted(queried) == sorted(pullspecs)
+        assert list(pinned) == images[:-2] + images[-1:]
+        for image in images[:-1]:
+            assert pinned[image] == ImageName(registry=image.registry, namespace='ns',
+                                              repo=image.repo, tag='sha256:' + image.repo)
+        assert pinned[images[-1]] == images[-1]
+        assert set(replacer.query_times) == set(pinned)
+
+    def test_pin_digests_failure(self):
+        images = [ImageName.parse('registry/ns/foo-{}:1'.format(i)) for i in range(4)]
+
+        def mocked_get_manifest_list_digest(image):
+            if image.repo in ('foo-1', 'foo-3'):
+                raise RuntimeError('failed {}'.format(image.repo))
+            return 'sha256:123456'
+
+        (flexmock(atomic_reactor.util.RegistryClient)
+            .should_receive('get_manifest_list_digest')
+            .replace_with(mocked_get_manifest_list_digest))
+
+        site_config = get_site_config()
+        workflow = self.mock_workflow(site_config, pull_registries=['registry'])
+        replacer = PullspecReplacer(user_config={}, workflow=workflow)
+
+        # error for the first failed image is raised, regardless of which finished first
+        with pytest.raises(RuntimeError, match='failed foo-1'):
+            replacer.pin_digests(images)
+
     @pytest.mark.parametrize('image, replacement_registries, replaced', [
         ('old-registry/ns/foo', {'old-registry': 'new-registry'}, 'new-registry/ns/foo'),
         ('registry/ns/foo', {}, 'registry/ns/foo'),
@@ -22,6 +22,8 @@ from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.plugin import PreBuildPluginsRunner, PluginFailedException
 from atomic_reactor.util import get_checksums, DockerfileImages
 from atomic_reactor.core import DockerTasker
+from atomic_reactor.utils.image_cache import ParentImageCache
+from atomic_reactor.plugins.exit_remove_built_image import GarbageCollectionPlugin
 from atomic_reactor.plugins.pre_pull_base_image import PullBaseImagePlugin
 from atomic_reactor.plugins.pre_reactor_config import (ReactorConfigPlugin,
                                                        WORKSPACE_CONF_KEY,
@@ -565,6 +567,45 @@ def test_pull_raises_retry_error(workflow, caplog):
     assert 'failed to pull image: {}'.format(exp_img.to_str()) in caplog.text
 
 
+def test_pull_with_parent_image_cache(workflow, tmpdir):
+    if MOCK:
+        mock_docker(remember_images=True)
+
+    tasker = DockerTasker()
+    workflow.builder = MockBuilder()
+    base_image = '/'.join([SOURCE_REGISTRY, 'parent-image:1'])
+    workflow.builder.dockerfile_images = DockerfileImages([base_image])
+    workflow.plugin_workspace[ReactorConfigPlugin.key] = {}
+    workflow.plugin_workspace[ReactorConfigPlugin.key][WORKSPACE_CONF_KEY] =\
+        ReactorConfig({'version': 1,
+                       'source_registry': {'url': SOURCE_REGISTRY,
+                                           'insecure': True},
+                       'parent_image_cache': {'directory': str(tmpdir)}})
+
+    (flexmock(ParentImageCache)
+     .should_receive('acquire')
+     .with_args(ImageName.parse(base_image), UNIQUE_ID, insecure=True, dockercfg_path=None)
+     .once()
+     .and_return(True))
+    flexmock(tasker).should_receive('pull_image').never()
+    flexmock(tasker).should_receive('tag_image').and_return(UNIQUE_ID + ':0')
+
+    runner = PreBuildPluginsRunner(
+        tasker,
+        workflow,
+        [{
+            'name': PullBaseImagePlugin.key,
+            'args': {},
+        }],
+    )
+    runner.run()
+
+    # only the unique tag is removed by this build
+    assert workflow.pulled_base_images == {UNIQUE_ID + ':0'}
+    workspace = workflow.plugin_workspace[GarbageCollectionPlugin.key]
+    assert workspace['images_to_release'] == {(base_image, UNIQUE_ID)}
+
+
 class TestValidateBaseImage(object):
 
     def teardown_method(self, method):
@@ -648,8 +689,10 @@ class TestValidateBaseImage(object):
     def test_platform_descriptors_undefined(self, caplog, user_params):
         def workflow_callback(workflow):
             workflow = self.prepare(workflow, mock_get_manifest_list=True)
-            reactor_config = workflow.plugin_workspace[ReactorConfigPlugin.key][WORKSPACE_CONF_KEY]
-            del reactor_config.conf['platform_descriptors']
+            workspace = workflow.plugin_workspace[ReactorConfigPlugin.key]
+            conf = workspace[WORKSPACE_CONF_KEY].conf.mutable_copy()
+            del conf['platform_descriptors']
+            workspace[WORKSPACE_CONF_KEY] = ReactorConfig(conf)
             return workflow
 
         log_message = 'platform descriptors are not defined'
@@ -37,6 +37,7 @@ from atomic_reactor.plugins.pre_reactor_config import (ODCSConfig,
                                                        get_odcs_session,
                                                        get_smtp_session,
                                                        get_openshift_session,
+                                                       get_clusters,
                                                        get_clusters_client_config_path,
                                                        get_docker_registry,
                                                        get_pull_registries,
@@ -52,6 +53,11 @@ from atomic_reactor.plugins.pre_reactor_config import (ODCSConfig,
                                                        get_build_image_override,
                                                        get_list_rpms_from_scratch,
                                                        NO_FALLBACK)
+from atomic_reactor.constants import (REGISTRY_CACHE_TAG_TTL, HTTP_POOL_SIZE,
+                                      HTTP_POOL_CONNECTIONS_PER_HOST)
+from atomic_reactor.utils.registry_cache import (RegistryCache, get_registry_cache,
+                                                 set_registry_cache)
+from atomic_reactor.utils.retries import ConnectionPools, set_connection_pools
 from tests.constants import REACTOR_CONFIG_MAP, MOCK_SOURCE
 from tests.docker_mock import mock_docker
 from tests.stubs import StubInsideBuilder
@@ -2042,6 +2048,63 @@ class TestReactorConfigPlugin(object):
         for k, v in USER_PARAMS.items():
             assert plugin.workflow.user_params[k] == v
 
+    @pytest.mark.parametrize('cache_config', [None, {}, {'tag_ttl': 0}, {'directory': 'cache'}])
+    def test_set_registry_metadata_cache(self, tmpdir, cache_config):
+        config = {'version': 1, 'koji': {'hub_url': '/', 'root_url': '', 'auth': {}}}
+        if cache_config is not None:
+            config['registry_metadata_cache'] = cache_config.copy()
+            if 'directory' in cache_config:
+                config['registry_metadata_cache']['directory'] = str(tmpdir.join('cache'))
+        filename = os.path.join(str(tmpdir), 'config.yaml')
+        with open(filename, 'w') as f:
+            yaml.safe_dump(config, f)
+
+        tasker, workflow = self.prepare()
+        plugin = ReactorConfigPlugin(tasker, workflow,
+                                     config_path=str(tmpdir),
+                                     basename=filename)
+        try:
+            plugin.run()
+
+            cache = get_registry_cache()
+            if cache_config is None:
+                assert cache is None
+            else:
+                assert isinstance(cache, RegistryCache)
+                assert cache.tag_ttl == cache_config.get('tag_ttl', REGISTRY_CACHE_TAG_TTL)
+                assert cache.directory == config['registry_metadata_cache'].get('directory')
+        finally:
+            set_registry_cache(None)
+
+    @pytest.mark.parametrize('pool_config', [None, {}, {'pool_size': 5},
+                                             {'connections_per_host': 2}])
+    def test_configure_http_connection_pool(self, tmpdir, pool_config):
+        config = {'version': 1, 'koji': {'hub_url': '/', 'root_url': '', 'auth': {}}}
+        if pool_config is not None:
+            config['http_connection_pool'] = pool_config
+        filename = os.path.join(str(tmpdir), 'config.yaml')
+        with open(filename, 'w') as f:
+            yaml.safe_dump(config, f)
+
+        tasker, workflow = self.prepare()
+        plugin = ReactorConfigPlugin(tasker, workflow,
+                                     config_path=str(tmpdir),
+                                     basename=filename)
+        connection_pools = ConnectionPools(pool_size=1, connections_per_host=1)
+        set_connection_pools(connection_pools)
+        try:
+            plugin.run()
+        finally:
+            set_connection_pools(None)
+
+        if pool_config is None:
+            assert connection_pools.pool_size == 1
+            assert connection_pools.connections_per_host == 1
+        else:
+            assert connection_pools.pool_size == pool_config.get('pool_size', HTTP_POOL_SIZE)
+            assert (connection_pools.connections_per_host ==
+                    pool_config.get('connections_per_host', HTTP_POOL_CONNECTIONS_PER_HOST))
+
     @pytest.mark.parametrize('config, valid', [
         ("""\
           version: 1
@@ -2188,3 +2251,22 @@ def test_ensure_odcsconfig_does_not_modify_original_signing_intents():
     }] == odcs_config.signing_intents
     # Verify original intent is not modified.
     assert 'restrictiveness' not in signing_intents[0]
+
+
+def test_config_values_shared_and_read_only():
+    clusters = {'x86_64': [{'name': 'worker', 'max_concurrent_builds': 3}]}
+    config = ReactorConfig({'version': 1, 'clusters': clusters})
+    workflow = flexmock(plugin_workspace={ReactorConfigPlugin.key: {WORKSPACE_CONF_KEY: config}})
+
+    value = get_clusters(workflow)
+    assert value == clusters
+    assert get_clusters(workflow) is value
+    with pytest.raises(TypeError):
+        value['x86_64'][0]['max_concurrent_builds'] = 1
+
+    mutable = value.mutable_copy()
+    mutable['x86_64'][0]['max_concurrent_builds'] = 1
+    assert get_clusters(workflow) == clusters
+    # the original config is not frozen
+    clusters['x86_64'].append({'name': 'other', 'max_concurrent_builds': 1})
+    assert len(get_clusters(workflow)['x86_64']) == 1
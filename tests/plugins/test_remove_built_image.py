@@ -13,8 +13,12 @@ from atomic_reactor.core import DockerTasker
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.plugin import PostBuildPluginsRunner
 from atomic_reactor.plugins.exit_remove_built_image import (GarbageCollectionPlugin,
-                                                            defer_removal)
+                                                            defer_removal, defer_release)
 from atomic_reactor.plugins.post_tag_and_push import TagAndPushPlugin
+from atomic_reactor.plugins.pre_reactor_config import (ReactorConfigPlugin,
+                                                       WORKSPACE_CONF_KEY,
+                                                       ReactorConfig)
+from atomic_reactor.utils.image_cache import ParentImageCache
 from osbs.utils import ImageName
 from tests.constants import (LOCALHOST_REGISTRY,
                              TEST_IMAGE,
@@ -81,3 +85,30 @@ class TestGarbageCollectionPlugin(object):
         image_set = set(removed_images)
         assert len(image_set) == len(removed_images)
         assert image_set == expected
+
+    @pytest.mark.parametrize('remove_base', [True, False])
+    def test_release_cached_parent_images(self, tmpdir, remove_base):
+        tasker, workflow = mock_environment()
+        workflow.plugin_workspace[ReactorConfigPlugin.key] = {
+            WORKSPACE_CONF_KEY: ReactorConfig({
+                'version': 1,
+                'parent_image_cache': {'directory': str(tmpdir)},
+            }),
+        }
+        defer_release(workflow, 'registry/parent@sha256:123', 'build-1')
+
+        (flexmock(ParentImageCache)
+         .should_receive('release')
+         .with_args('registry/parent@sha256:123', 'build-1')
+         .once())
+        flexmock(tasker).should_receive('remove_image')
+
+        runner = PostBuildPluginsRunner(
+            tasker,
+            workflow,
+            [{
+                'name': GarbageCollectionPlugin.key,
+                'args': {'remove_pulled_base_image': remove_base},
+            }]
+        )
+        runner.run()
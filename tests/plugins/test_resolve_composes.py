@@ -11,6 +11,7 @@ import koji
 import os
 import responses
 import sys
+import threading
 import time
 from copy import deepcopy
 
@@ -908,12 +909,14 @@ class TestResolveComposes(object):
             plug_args['odcs_ssl_secret_path'] = str(workflow._tmpdir)
             exp_kwargs['cert'] = str(workflow._tmpdir.join('cert'))
 
-        reac_conf = workflow.plugin_workspace[ReactorConfigPlugin.key][WORKSPACE_CONF_KEY].conf
+        workspace = workflow.plugin_workspace[ReactorConfigPlugin.key]
+        reac_conf = workspace[WORKSPACE_CONF_KEY].conf.mutable_copy()
 
         exp_kwargs['insecure'] = False
         if 'token' in exp_kwargs:
             reac_conf['odcs']['auth'].pop('ssl_certs_dir')
             reac_conf['odcs']['auth']['openidc_dir'] = str(workflow._tmpdir)
+            workspace[WORKSPACE_CONF_KEY] = ReactorConfig(reac_conf)
         else:
             exp_kwargs['cert'] = os.path.join(reac_conf['odcs']['auth']['ssl_certs_dir'], 'cert')
 
@@ -1091,6 +1094,32 @@ class TestResolveComposes(object):
         assert plugin_result['signing_intent'] == expected_intent
         assert plugin_result['composes'] == composes
 
+    def test_wait_for_composes_concurrently(self, workflow):
+        composes = {}
+        for compose_id in range(3):
+            compose = ODCS_COMPOSE.copy()
+            compose['id'] = compose_id
+            composes[compose_id] = compose
+
+        # every wait blocks until all composes are waited for at once
+        barrier = threading.Barrier(len(composes), timeout=10)
+
+        def wait_for_compose(compose_id, *args, **kwargs):
+            barrier.wait()
+            return composes[compose_id]
+
+        (flexmock(ODCSClient)
+            .should_receive('wait_for_compose')
+            .replace_with(wait_for_compose))
+        (flexmock(ODCSClient)
+            .should_receive('start_compose')
+            .never())
+
+        plugin_args = {'compose_ids': list(composes)}
+        plugin_result = self.run_plugin_with_args(workflow, plugin_args)
+
+        assert plugin_result['composes'] == list(composes.values())
+
     @pytest.mark.parametrize(('config', 'error_message'), (
         (dedent("""\
             compose:
@@ -7,19 +7,20 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import logging
+import os
 import docker
 from flexmock import flexmock
 import pytest
+import rpm
 from textwrap import dedent
 import tarfile
 from functools import partial
-import subprocess
 
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.plugin import PostBuildPluginsRunner, PluginFailedException
 from atomic_reactor.plugins.post_rpmqa import (PostBuildRPMqaPlugin, RPMDB_PACKAGES_NAME,
                                                RPMDB_DIR_NAME)
-from atomic_reactor.utils.rpm import parse_rpm_output
+from atomic_reactor.utils.rpm import image_component_rpm_tags, parse_rpm_output
 from atomic_reactor.plugins.pre_reactor_config import (
     ReactorConfigPlugin, WORKSPACE_CONF_KEY, ReactorConfig)
 from atomic_reactor import util
@@ -56,6 +57,8 @@ def generate_archive(tmpdir, empty=False):
         rpm_dir.join('Basenames').write('')
         rpm_dir.join('Dirnames').write('')
         rpm_dir.join('Packages').write('')
+        # environment files are not extracted
+        rpm_dir.join('__db.001').write('')
 
     archive_path = tmpdir.join('temp.tar')
     with tarfile.open(str(archive_path), 'w') as archive_tar:
@@ -67,6 +70,42 @@ def generate_archive(tmpdir, empty=False):
     archive_path.remove()
 
 
+def mock_headers(package_list):
+    """Mock rpm headers of packages in the format of PACKAGE_LIST"""
+    for package in package_list:
+        values = dict(zip(image_component_rpm_tags, package.split(';')))
+        yield flexmock(sprintf=lambda fmt, values=values: values[fmt[2:-1]])
+
+
+def mock_rpm_query(rpm_failed=False):
+    """Mock querying rpmdb extracted from the image"""
+    def check_rpmdb(name, dbpath):
+        assert name == '_dbpath'
+        assert sorted(os.listdir(dbpath)) == ['Basenames', 'Dirnames', 'Packages']
+
+    def mock_db_match():
+        if rpm_failed:
+            raise Exception('rpm query failed')
+        return mock_headers(PACKAGE_LIST_WITH_AUTOGENERATED)
+
+    (flexmock(rpm)
+     .should_receive("addMacro")
+     .replace_with(check_rpmdb)
+     .once())
+    flexmock(rpm).should_receive("delMacro").with_args('_dbpath').once()
+    (flexmock(rpm)
+     .should_receive("TransactionSet")
+     .and_return(flexmock(openDB=lambda: None, closeDB=lambda: None,
+                          dbMatch=mock_db_match)))
+
+
+def mock_rpmdb_missing(docker_tasker):
+    """Make reading rpmdb from the image fail, so that rpm runs in a container"""
+    (flexmock(docker_tasker.tasker.d.wrapped)
+     .should_receive('get_archive')
+     .and_raise(APIError, 'rpmdb not found'))
+
+
 def mock_reactor_config(workflow, list_rpms_from_scratch=False):
     data = dedent("""\
         version: 1
@@ -136,6 +175,7 @@ def test_rpmqa_plugin(caplog, docker_tasker, base_from_scratch, list_rpms_from_s
     if remove_container_error:
         should_raise_error['remove_container'] = None
     mock_docker(should_raise_error=should_raise_error)
+    mock_rpmdb_missing(docker_tasker)
 
     workflow = DockerBuildWorkflow(source=SOURCE)
     workflow.source = StubSource()
@@ -195,16 +235,8 @@ def test_rpmqa_plugin_base_from_scratch(caplog, tmpdir, docker_tasker, packages_
               "ignore_autogenerated_gpg_keys": True}}
          ])
 
-    if get_archive_raises is None and packages_exists and rpm_failed:
-        (flexmock(subprocess)
-         .should_receive("check_output")
-         .once()
-         .and_raise(Exception, 'rpm query failed'))
-    elif get_archive_raises is None and packages_exists and not rpm_failed:
-        (flexmock(subprocess)
-         .should_receive("check_output")
-         .once()
-         .and_return("\n".join(PACKAGE_LIST_WITH_AUTOGENERATED)))
+    if get_archive_raises is None and packages_exists:
+        mock_rpm_query(rpm_failed=rpm_failed)
 
     if get_archive_raises == APIError:
         results = runner.run()
@@ -274,6 +306,7 @@ def test_rpmqa_plugin_skip(docker_tasker):  # noqa
 
 def test_rpmqa_plugin_exception(docker_tasker):  # noqa
     mock_docker()
+    mock_rpmdb_missing(docker_tasker)
     workflow = DockerBuildWorkflow(source=SOURCE)
     workflow.source = StubSource()
     workflow.builder = get_builder(workflow)
@@ -289,6 +322,7 @@ def test_rpmqa_plugin_exception(docker_tasker):  # noqa
 def test_dangling_volumes_removed(docker_tasker, caplog):
 
     mock_docker()
+    mock_rpmdb_missing(docker_tasker)
     workflow = DockerBuildWorkflow(source=SOURCE)
     workflow.source = StubSource()
     workflow.builder = get_builder(workflow)
@@ -315,6 +349,7 @@ def test_dangling_volumes_removed(docker_tasker, caplog):
 
 def test_empty_logs_retry(docker_tasker):  # noqa
     mock_docker()
+    mock_rpmdb_missing(docker_tasker)
     workflow = DockerBuildWorkflow(source=SOURCE)
     workflow.source = StubSource()
     workflow.builder = get_builder(workflow)
@@ -331,6 +366,7 @@ def test_empty_logs_retry(docker_tasker):  # noqa
 
 def test_empty_logs_failure(docker_tasker):  # noqa
     mock_docker()
+    mock_rpmdb_missing(docker_tasker)
     workflow = DockerBuildWorkflow(source=SOURCE)
     workflow.source = StubSource()
     workflow.builder = get_builder(workflow)
@@ -342,3 +378,25 @@ def test_empty_logs_failure(docker_tasker):  # noqa
     with pytest.raises(PluginFailedException) as exc_info:
         runner.run()
     assert 'Unable to gather list of installed packages in container' in str(exc_info.value)
+
+
+def test_rpmqa_plugin_without_container(tmpdir, docker_tasker):
+    mock_docker()
+    workflow = DockerBuildWorkflow(source=SOURCE)
+    workflow.source = StubSource()
+    workflow.builder = get_builder(workflow)
+
+    (flexmock(docker_tasker.tasker.d.wrapped)
+     .should_receive('get_archive')
+     .and_return(generate_archive(tmpdir), {})
+     .once())
+    mock_rpm_query()
+    # rpmdb is read from the image, no container is started
+    flexmock(docker.APIClient).should_receive('start').never()
+
+    runner = PostBuildPluginsRunner(docker_tasker, workflow,
+                                    [{"name": PostBuildRPMqaPlugin.key,
+                                      "args": {'image_id': TEST_IMAGE}}])
+    results = runner.run()
+    assert results[PostBuildRPMqaPlugin.key] == PACKAGE_LIST
+    assert workflow.image_components == parse_rpm_output(PACKAGE_LIST)
@@ -12,13 +12,16 @@ import pytest
 
 from flexmock import flexmock
 
-from atomic_reactor.constants import EXPORTED_SQUASHED_IMAGE_NAME, IMAGE_TYPE_DOCKER_ARCHIVE
+from atomic_reactor.constants import (EXPORTED_SQUASHED_IMAGE_NAME,
+                                      EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE,
+                                      IMAGE_TYPE_DOCKER_ARCHIVE)
 from atomic_reactor.core import DockerTasker
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.plugin import PrePublishPluginsRunner, PluginFailedException
 from atomic_reactor.plugins import exit_remove_built_image
 from atomic_reactor.plugins.prepub_squash import PrePublishSquashPlugin
 from atomic_reactor.util import DockerfileImages
+from atomic_reactor.utils.squash import ImageSquasher
 from atomic_reactor.build import BuildResult
 from docker_squash.squash import Squash
 from tests.constants import MOCK, MOCK_SOURCE
@@ -155,6 +158,71 @@ class TestSquashPlugin(object):
         self.run_plugin_with_args(workflow, {'save_archive': False})
         assert 'flatpak build, skipping plugin' in caplog.text
 
+    @pytest.mark.parametrize('save_archive', (True, False))
+    @pytest.mark.parametrize('dont_load', (True, False))
+    @pytest.mark.parametrize('compress_args', (
+        None,
+        {'method': 'gzip', 'load_exported_image': False},
+        {'method': 'gzip', 'load_exported_image': True},
+    ))
+    def test_native_engine(self, save_archive, dont_load, compress_args):
+        workflow = mock_workflow()
+        if compress_args is not None:
+            workflow.postbuild_plugins_conf = [{'name': 'compress', 'args': compress_args}]
+        compressed = save_archive and bool(compress_args and
+                                           compress_args['load_exported_image'])
+        squashed = save_archive or not dont_load
+
+        def mock_write(*args):
+            fileobj = args[-1]
+            fileobj.write(DUMMY_TARBALL['contents'].encode('utf-8'))
+            return 'sha256:squashed'
+
+        flexmock(Squash).should_receive('__init__').never()
+        (flexmock(ImageSquasher)
+         .should_receive('write')
+         .replace_with(mock_write)
+         .times(1 if squashed else 0))
+        (flexmock(workflow.builder.tasker)
+         .should_receive('load_image')
+         .times(0 if dont_load else 1))
+        flexmock(exit_remove_built_image).should_receive('defer_removal')
+
+        runner = PrePublishPluginsRunner(
+            workflow.builder.tasker,
+            workflow,
+            [{'name': PrePublishSquashPlugin.key,
+              'args': {'engine': 'native', 'save_archive': save_archive,
+                       'dont_load': dont_load}}]
+        )
+        runner.run()
+
+        if dont_load:
+            assert workflow.builder.image_id == 'image_id'
+        else:
+            assert workflow.builder.image_id == 'sha256:squashed'
+
+        if not save_archive:
+            assert workflow.exported_image_sequence == []
+        elif compressed:
+            metadata, = workflow.exported_image_sequence
+            assert metadata['path'] == os.path.join(
+                workflow.source.workdir, EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE.format('gz'))
+            assert metadata['uncompressed_size'] == DUMMY_TARBALL['size']
+        else:
+            assert workflow.exported_image_sequence == [{
+                'md5sum': DUMMY_TARBALL['md5sum'],
+                'sha256sum': DUMMY_TARBALL['sha256sum'],
+                'size': DUMMY_TARBALL['size'],
+                'type': IMAGE_TYPE_DOCKER_ARCHIVE,
+                'path': os.path.join(workflow.source.workdir, EXPORTED_SQUASHED_IMAGE_NAME),
+            }]
+
+    def test_unknown_engine(self):
+        workflow = mock_workflow()
+        with pytest.raises(PluginFailedException):
+            self.run_plugin_with_args(workflow, {'engine': 'spam'})
+
     def should_squash_with_kwargs(self, workflow, new_id='abc', base_from_scratch=False, **kwargs):
         kwargs.setdefault('image', workflow.builder.image_id)
         kwargs.setdefault('load_image', True)
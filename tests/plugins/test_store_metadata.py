@@ -273,6 +273,8 @@ CMD blabla"""
     assert is_string_type(annotations['base-image-name'])
     assert "parent_images" in annotations
     assert is_string_type(annotations['parent_images'])
+    assert "trace" in annotations
+    assert set(json.loads(annotations['trace'])) == {'phases', 'calls', 'hosts'}
     if base_from_scratch:
         assert annotations["base-image-name"] == ""
         assert annotations["base-image-id"] == ""
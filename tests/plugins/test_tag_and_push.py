@@ -14,7 +14,7 @@ import pytest
 import koji as koji
 import osbs
 import atomic_reactor.plugins.post_tag_and_push
-from atomic_reactor.constants import IMAGE_TYPE_OCI, IMAGE_TYPE_OCI_TAR
+from atomic_reactor.constants import IMAGE_TYPE_OCI, IMAGE_TYPE_OCI_TAR, DOCKER_PUSH_MAX_RETRIES
 from atomic_reactor.core import DockerTasker
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.plugin import PostBuildPluginsRunner, PluginFailedException
@@ -674,3 +674,95 @@ def test_exceed_binary_image_size(image_size_limit, workflow):
     else:
         with pytest.raises(ExceedsImageSizeError):
             plugin.run()
+
+
+@pytest.mark.parametrize('verified', [True, False])
+def test_tag_and_push_multiple_tags(workflow, verified):
+    registries = ['registry-a.example.com', 'registry-b.example.com']
+    config = {
+        'version': 1,
+        'registries': [{'url': 'https://' + registry} for registry in registries],
+    }
+    workflow.plugin_workspace[ReactorConfigPlugin.key] = {
+        WORKSPACE_CONF_KEY: ReactorConfig(config)
+    }
+    workflow.builder = StubInsideBuilder()
+    workflow.builder.image_id = INPUT_IMAGE
+    workflow.tag_conf.add_unique_image('ns/image:unique')
+    workflow.tag_conf.add_primary_images(['ns/image:1.0', 'ns/image:1.0-1', 'ns/other:1.0'])
+
+    mock_docker()
+
+    pushed = []
+    put = []
+
+    def push(image_id, registry_image, **kwargs):
+        pushed.append(registry_image.to_str())
+
+    def digests(registry_image, registry, *args):
+        if registry_image.tag == '1.0' or verified:
+            return ManifestDigest(v1=DIGEST_V1, v2=DIGEST_V2)
+        return ManifestDigest(v1=DIGEST_V1)
+
+    def query(session, image, digest=None, version='v1', is_blob=False):
+        assert image.tag == '1.0'
+        assert digest == DIGEST_V2
+        assert version == 'v2'
+        return flexmock(content=b'manifest')
+
+    def put_manifest(url, data=None, headers=None):
+        assert data == b'manifest'
+        assert headers == {'Content-Type': 'application/vnd.docker.distribution.manifest.v2+json'}
+        put.append(url)
+        return flexmock(raise_for_status=lambda: None)
+
+    flexmock(DockerTasker).should_receive('tag_and_push_image').replace_with(push)
+    (flexmock(atomic_reactor.plugins.post_tag_and_push)
+     .should_receive('get_manifest_digests')
+     .replace_with(digests))
+    (flexmock(atomic_reactor.plugins.post_tag_and_push)
+     .should_receive('query_registry')
+     .replace_with(query))
+    (flexmock(atomic_reactor.plugins.post_tag_and_push.RegistrySession)
+     .should_receive('put')
+     .replace_with(put_manifest))
+    (flexmock(atomic_reactor.plugins.post_tag_and_push)
+     .should_receive('get_config_from_registry')
+     .and_return({'config': {}}))
+    flexmock(time).should_receive('sleep')
+
+    plugin = TagAndPushPlugin(DockerTasker(), workflow)
+    result = plugin.run()
+
+    # results are in the order of registries and images, regardless of concurrency
+    assert [image.to_str() for image in result] == [
+        '{}/ns/{}'.format(registry, name)
+        for registry in registries
+        for name in ('image:1.0', 'image:1.0-1', 'other:1.0', 'image:unique')
+    ]
+
+    # each repository is pushed only once, other tags are added by uploading the manifest
+    assert sorted(put) == sorted(
+        '/v2/ns/image/manifests/{}'.format(tag)
+        for _ in registries
+        for tag in ('1.0-1', 'unique')
+    )
+    expected_pushed = [
+        '{}/ns/{}'.format(registry, name)
+        for registry in registries
+        for name in ('image:1.0', 'other:1.0')
+    ]
+    if not verified:
+        # tags without V2 schema 2 digest are pushed in the usual way
+        expected_pushed += [
+            '{}/ns/image:{}'.format(registry, tag)
+            for registry in registries
+            for tag in ('1.0-1', 'unique')
+        ] * (DOCKER_PUSH_MAX_RETRIES + 1)
+    assert sorted(pushed) == sorted(expected_pushed)
+
+    for registry in workflow.push_conf.docker_registries:
+        assert registry.digests['ns/image:1.0'].v2 == DIGEST_V2
+        assert registry.digests['ns/other:1.0'].v2 == DIGEST_V2
+        assert registry.digests['ns/image:unique'].v2 == (DIGEST_V2 if verified else None)
+        assert registry.config == {'config': {}}
@@ -5,7 +5,9 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
-from atomic_reactor.auth import HTTPBearerAuth, HTTPRegistryAuth, HTTPBasicAuthWithB64
+from atomic_reactor.auth import (HTTPBearerAuth, HTTPRegistryAuth, HTTPBasicAuthWithB64,
+                                 get_bearer_token_cache)
+from atomic_reactor.constants import REGISTRY_TOKEN_EXPIRY_LEEWAY
 from requests.auth import HTTPBasicAuth
 import base64
 import json
@@ -202,6 +204,98 @@ class TestHTTPBearerAuth(object):
         assert response.status_code == 401
         assert len(responses.calls) == 1
 
+    @responses.activate
+    @pytest.mark.parametrize(('first_creds', 'second_creds', 'shared'), (
+        (None, None, True),
+        (('spam', 'bacon'), ('spam', 'bacon'), True),
+        (('spam', 'bacon'), None, False),
+        (('spam', 'bacon'), ('spam', 'eggs'), False),
+    ))
+    def test_token_shared_between_instances(self, first_creds, second_creds, shared):
+        responses.add(responses.GET, BEARER_REALM_URL + '?scope=repository:fedora:pull',
+                      json={'token': BEARER_TOKEN}, match_querystring=True)
+
+        url = 'https://registry.example.com/v2/fedora/tags/list'
+        responses.add_callback(responses.GET, url, callback=bearer_unauthorized_callback)
+        responses.add_callback(responses.GET, url, callback=bearer_success_callback)
+        if not shared:
+            responses.add_callback(responses.GET, url, callback=bearer_unauthorized_callback)
+        responses.add_callback(responses.GET, url, callback=bearer_success_callback)
+
+        first_auth = HTTPBearerAuth(*(first_creds or ()))
+        assert requests.get(url, auth=first_auth).json() == 'success'
+        assert len(responses.calls) == 3
+
+        # the cached token is sent with the first request, no 401 round trip
+        second_auth = HTTPBearerAuth(*(second_creds or ()))
+        assert requests.get(url, auth=second_auth).json() == 'success'
+        assert len(responses.calls) == (4 if shared else 6)
+
+    @responses.activate
+    def test_expired_token_not_used(self):
+        responses.add(responses.GET, BEARER_REALM_URL + '?scope=repository:fedora:pull',
+                      json={'token': BEARER_TOKEN, 'expires_in': REGISTRY_TOKEN_EXPIRY_LEEWAY},
+                      match_querystring=True)
+
+        url = 'https://registry.example.com/v2/fedora/tags/list'
+        for _ in range(2):
+            responses.add_callback(responses.GET, url, callback=bearer_unauthorized_callback)
+            responses.add_callback(responses.GET, url, callback=bearer_success_callback)
+
+        auth = HTTPBearerAuth()
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert len(responses.calls) == 6
+
+    @responses.activate
+    def test_revoked_token_replaced(self):
+        responses.add(responses.GET, BEARER_REALM_URL + '?scope=repository:fedora:pull',
+                      json={'token': BEARER_TOKEN}, match_querystring=True)
+
+        cache = get_bearer_token_cache()
+        cache.set_challenge('https://registry.example.com', BEARER_REALM_URL, None)
+        cache.set_token(BEARER_REALM_URL, None, ['repository:fedora:pull'], None, 'revoked')
+
+        def revoked_callback(request):
+            assert request.headers['Authorization'] == 'Bearer revoked'
+            return bearer_unauthorized_callback(request)
+
+        url = 'https://registry.example.com/v2/fedora/tags/list'
+        responses.add_callback(responses.GET, url, callback=revoked_callback)
+        responses.add_callback(responses.GET, url, callback=bearer_success_callback)
+
+        auth = HTTPBearerAuth()
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert cache.get_token(BEARER_REALM_URL, None, 'repository:fedora:pull',
+                               None) == BEARER_TOKEN
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_combined_scope(self):
+        realm_url = (BEARER_REALM_URL + '?service=registry.example.com'
+                     '&scope=repository:fedora:pull,push&scope=repository:centos:pull')
+        responses.add(responses.GET, realm_url, json={'token': BEARER_TOKEN},
+                      match_querystring=True)
+
+        def mount_unauthorized_callback(request):
+            challenge = ('Bearer realm="{}",service="registry.example.com",'
+                         'scope="repository:fedora:pull,push repository:centos:pull"'
+                         .format(BEARER_REALM_URL))
+            return (401, {'www-authenticate': challenge}, json.dumps('unauthorized'))
+
+        url = ('https://registry.example.com/v2/fedora/blobs/uploads/'
+               '?mount=sha256:abcd&from=centos')
+        responses.add_callback(responses.POST, url, callback=mount_unauthorized_callback)
+        responses.add(responses.POST, url, status=201, json='mounted')
+
+        auth = HTTPBearerAuth(access=('pull', 'push'))
+        assert requests.post(url, auth=auth).json() == 'mounted'
+
+        cache = get_bearer_token_cache()
+        for scope in ('repository:fedora:pull,push', 'repository:centos:pull'):
+            assert cache.get_token(BEARER_REALM_URL, 'registry.example.com', scope,
+                                   None) == BEARER_TOKEN
+
 
 class TestHTTPRegistryAuth(object):
 
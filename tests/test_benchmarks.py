@@ -0,0 +1,42 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+
+import pytest
+
+from tests.benchmarks.startup import compare, parse_importtime
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   _frozen_importlib_external
+import time:      1000 |       1500 |     json.decoder
+import time:       500 |       2000 |   json
+import time:      3000 |       5000 | atomic_reactor.util
+import time:       250 |        250 | atomic_reactor
+"""
+
+
+def test_parse_importtime():
+    assert parse_importtime(IMPORTTIME_OUTPUT) == 5.25
+
+
+@pytest.mark.parametrize(('value', 'regressed'), [
+    (100, False),
+    (124, False),
+    (126, True),
+    # bigger than the threshold but within noise
+    (6, False),
+])
+def test_compare(value, regressed):
+    baseline = {'metric': 100 if value > 10 else 2, 'unknown': 1}
+    results = {'metric': value, 'new': 1000}
+    assert compare(results, baseline, threshold=0.25) == (['metric'] if regressed else [])
+
+
+def test_compare_rss():
+    assert compare({'peak_rss': 3000}, {'peak_rss': 1000}) == []
+    assert compare({'peak_rss': 60000}, {'peak_rss': 40000}) == ['peak_rss']
@@ -99,7 +99,8 @@ def test_parent_image_inspect(insecure, parents_pulled, tmpdir, source_params):
     if not parents_pulled:
         (flexmock(atomic_reactor.util)
          .should_receive('get_inspect_for_image')
-         .with_args(provided_imagename, provided_imagename.registry, insecure, str(tmpdir))
+         .with_args(provided_imagename, provided_imagename.registry, insecure, str(tmpdir),
+                    cache_tags=True)
          .and_return({'Id': 123}))
 
     built_inspect = b.parent_image_inspect(provided_imagename)
@@ -148,7 +149,7 @@ def test_base_image_inspect(tmpdir, source_params, parents_pulled, insecure, bas
                 (flexmock(atomic_reactor.util)
                  .should_receive('get_inspect_for_image')
                  .with_args(b.dockerfile_images.base_image, b.dockerfile_images.base_image.registry,
-                            insecure, str(tmpdir))
+                            insecure, str(tmpdir), cache_tags=True)
                  .and_return({'Id': 123}))
 
             built_inspect = b.base_image_inspect
@@ -7,17 +7,21 @@ of the BSD license. See the LICENSE file for details.
 """
 
 from io import BufferedReader, BytesIO
+import hashlib
 import os
 import requests
 import responses
 import tempfile
+import threading
 import time
 
 import pytest
 from flexmock import flexmock
 
 from atomic_reactor.util import get_retrying_requests_session
-from atomic_reactor.download import download_url
+import atomic_reactor.download
+from atomic_reactor.download import (download_url, DownloadManager, DownloadRequest,
+                                     DownloadStats)
 
 
 class TestDownloadUrl(object):
@@ -65,3 +69,138 @@ class TestDownloadUrl(object):
          .should_receive('sleep'))
         with pytest.raises(requests.exceptions.RequestException):
             download_url(url, dest_dir, session=session)
+
+    def test_resume_download(self):
+        url = 'https://example.com/path/file'
+        dest_dir = tempfile.mkdtemp()
+        content = b'abcdef'
+        session = get_retrying_requests_session()
+
+        def iter_content_failing(chunk_size):
+            yield content[:2]
+            raise requests.exceptions.ConnectionError
+
+        interrupted = flexmock(status_code=200, iter_content=iter_content_failing)
+        interrupted.should_receive('raise_for_status')
+        resumed = flexmock(status_code=206, iter_content=lambda chunk_size: [content[2:]])
+        resumed.should_receive('raise_for_status')
+
+        (flexmock(session)
+         .should_receive('get')
+         .with_args(url, stream=True, verify=True, headers={})
+         .and_return(interrupted)
+         .once())
+        (flexmock(session)
+         .should_receive('get')
+         .with_args(url, stream=True, verify=True, headers={'Range': 'bytes=2-'})
+         .and_return(resumed)
+         .once())
+        flexmock(time).should_receive('sleep')
+
+        stats = DownloadStats()
+        result = download_url(url, dest_dir, session=session, stats=stats,
+                              checksums={'md5': hashlib.md5(content).hexdigest()})
+        with open(result, 'rb') as f:
+            assert f.read() == content
+        assert stats.bytes == len(content)
+        assert stats.files == 1
+
+    def test_resume_not_supported(self):
+        url = 'https://example.com/path/file'
+        dest_dir = tempfile.mkdtemp()
+        content = b'abcdef'
+        session = get_retrying_requests_session()
+
+        def iter_content_failing(chunk_size):
+            yield b'xx'
+            raise requests.exceptions.ConnectionError
+
+        interrupted = flexmock(status_code=200, iter_content=iter_content_failing)
+        interrupted.should_receive('raise_for_status')
+        # server ignores Range header and sends the whole file
+        restarted = flexmock(status_code=200, iter_content=lambda chunk_size: [content])
+        restarted.should_receive('raise_for_status')
+
+        (flexmock(session)
+         .should_receive('get')
+         .and_return(interrupted)
+         .and_return(restarted))
+        flexmock(time).should_receive('sleep')
+
+        result = download_url(url, dest_dir, session=session,
+                              checksums={'sha256': hashlib.sha256(content).hexdigest()})
+        with open(result, 'rb') as f:
+            assert f.read() == content
+
+    @responses.activate
+    def test_checksum_mismatch(self):
+        url = 'https://example.com/path/file'
+        dest_dir = tempfile.mkdtemp()
+        responses.add(responses.GET, url, body=b'corrupted')
+
+        with pytest.raises(ValueError) as exc:
+            download_url(url, dest_dir, checksums={'md5': hashlib.md5(b'abc').hexdigest()})
+        assert 'does not match expected checksum' in str(exc.value)
+
+
+class TestDownloadManager(object):
+    @responses.activate
+    def test_download(self, tmpdir):
+        downloads = []
+        for i in range(6):
+            content = 'file {}'.format(i).encode('utf-8')
+            url = 'https://host{}.example.com/path/file{}'.format(i % 2, i)
+            responses.add(responses.GET, url, body=content)
+            downloads.append(DownloadRequest(url, 'dir{}/file{}'.format(i % 3, i),
+                                             {'md5': hashlib.md5(content).hexdigest()}))
+
+        manager = DownloadManager()
+        paths = manager.download(downloads, str(tmpdir))
+
+        assert paths == [str(tmpdir.join(download.dest)) for download in downloads]
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as f:
+                assert f.read() == 'file {}'.format(i).encode('utf-8')
+        assert manager.stats.files == 6
+        assert manager.stats.bytes == 6 * len(b'file 0')
+        assert manager.stats.duration > 0
+
+    def test_concurrency_limits(self, tmpdir):
+        lock = threading.Lock()
+        running = {}
+        max_running = {}
+
+        def mocked_download_url(url, dest_dir, **kwargs):
+            host = url.split('/')[2]
+            with lock:
+                running[host] = running.get(host, 0) + 1
+                max_running[host] = max(max_running.get(host, 0), running[host])
+            time.sleep(0.05)
+            with lock:
+                running[host] -= 1
+            return os.path.join(dest_dir, kwargs['dest_filename'])
+
+        flexmock(atomic_reactor.download).should_receive('download_url').replace_with(
+            mocked_download_url)
+
+        downloads = [DownloadRequest('https://host{}/file{}'.format(i % 2, i), 'file{}'.format(i),
+                                     {})
+                     for i in range(12)]
+        manager = DownloadManager(max_workers=5, max_workers_per_host=2)
+        manager.download(downloads, str(tmpdir))
+
+        assert max_running == {'host0': 2, 'host1': 2}
+
+    @responses.activate
+    def test_download_failure(self, tmpdir):
+        responses.add(responses.GET, 'https://example.com/file0', body=b'abc')
+        responses.add(responses.GET, 'https://example.com/file1', status=404)
+        responses.add(responses.GET, 'https://example.com/file2', status=500)
+        downloads = [DownloadRequest('https://example.com/file{}'.format(i), 'file{}'.format(i),
+                                     {})
+                     for i in range(3)]
+
+        session = requests.Session()
+        with pytest.raises(requests.exceptions.HTTPError) as exc:
+            DownloadManager(session=session).download(downloads, str(tmpdir))
+        assert '404 Client Error' in str(exc.value)
@@ -22,6 +22,7 @@ from atomic_reactor.plugin import (PreBuildPlugin, PrePublishPlugin, PostBuildPl
 import atomic_reactor.plugin
 from atomic_reactor.plugins.build_docker_api import DockerApiPlugin
 import atomic_reactor.inner
+from atomic_reactor import tracing
 from flexmock import flexmock
 import pytest
 from tests.constants import MOCK_SOURCE, SOURCE
@@ -1407,13 +1408,16 @@ def test_fs_watcher_update(monkeypatch):
 
 
 def test_fs_watcher(monkeypatch):
-    w = FSWatcher()
+    tracer = tracing.Tracer()
+    w = FSWatcher(tracer=tracer)
     monkeypatch.setattr(time, "sleep", lambda x: x)  # don't waste a second of test time
     w.start()
     w.finish()
     w.join(0.1)  # timeout if thread still running
     assert not w.is_alive()
     assert "mb_used" in w.get_usage_data()
+    assert tracer.counters
+    assert tracing.get_tracer() is None
 
 
 class TestPushConf(object):
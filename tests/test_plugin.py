@@ -8,6 +8,8 @@ of the BSD license. See the LICENSE file for details.
 
 import json
 import os
+import sys
+import threading
 import time
 import inspect
 
@@ -15,6 +17,7 @@ from dockerfile_parse import DockerfileParser
 from flexmock import flexmock
 import pytest
 
+import atomic_reactor.plugin
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.build import BuildResult
 from atomic_reactor.plugin import (BuildPluginsRunner, PreBuildPluginsRunner,
@@ -23,8 +26,13 @@ from atomic_reactor.plugin import (BuildPluginsRunner, PreBuildPluginsRunner,
                                    ExitPluginsRunner, BuildStepPluginsRunner,
                                    PluginsRunner, InappropriateBuildStepError,
                                    BuildStepPlugin, PreBuildPlugin, ExitPlugin,
-                                   PreBuildSleepPlugin, PrePublishPlugin, PostBuildPlugin)
+                                   PreBuildSleepPlugin, PrePublishPlugin, PostBuildPlugin,
+                                   PluginIndex, PluginClasses, get_plugin_index)
+from atomic_reactor.constants import PLUGIN_INDEX_CACHE_ENV
 from atomic_reactor.plugins.pre_add_yum_repo_by_url import AddYumRepoByUrlPlugin
+from atomic_reactor.plugins.pre_fetch_maven_artifacts import FetchMavenArtifactsPlugin
+from atomic_reactor.plugins.pre_resolve_composes import ResolveComposesPlugin
+from atomic_reactor.plugins.pre_resolve_remote_source import ResolveRemoteSourcePlugin
 from osbs.utils import ImageName
 
 from tests.constants import DOCKERFILE_GIT, MOCK
@@ -99,6 +107,119 @@ def test_load_plugins(docker_tasker, runner_type, tmpdir):
     assert len(runner.plugin_classes) > 0
 
 
+INDEXED_PLUGINS = """
+from atomic_reactor.plugin import PreBuildPlugin, ExitPlugin
+
+
+class IndexedPreBuildPlugin(PreBuildPlugin):
+    key = 'indexed_pre'
+
+
+class IndexedExitPlugin(ExitPlugin):
+    key = 'indexed_exit'
+"""
+
+
+@pytest.fixture
+def indexed_plugins(tmpdir):
+    path = tmpdir.join('indexed_plugins.py')
+    path.write(INDEXED_PLUGINS)
+    yield str(path)
+    sys.modules.pop('indexed_plugins', None)
+
+
+def test_plugin_index(indexed_plugins, tmpdir):
+    cache_path = str(tmpdir.join('cache', 'index.json'))
+    index = PluginIndex(cache_path)
+    assert index.get_plugins([indexed_plugins], 'PreBuildPlugin') == {
+        'indexed_pre': (indexed_plugins, 'IndexedPreBuildPlugin'),
+    }
+    assert index.get_plugins([indexed_plugins], 'PostBuildPlugin') == {
+        'indexed_exit': (indexed_plugins, 'IndexedExitPlugin'),
+    }
+    assert index.get_plugins([indexed_plugins], 'ExitPlugin') == {
+        'indexed_exit': (indexed_plugins, 'IndexedExitPlugin'),
+    }
+    assert index.get_plugins([indexed_plugins], 'BuildStepPlugin') == {}
+
+    # other processes don't have to import the file
+    flexmock(atomic_reactor.plugin).should_receive('load_plugin_module').never()
+    index = PluginIndex(cache_path)
+    assert index.get_plugins([indexed_plugins], 'PreBuildPlugin') == {
+        'indexed_pre': (indexed_plugins, 'IndexedPreBuildPlugin'),
+    }
+
+
+def test_plugin_index_changed_file(indexed_plugins, tmpdir):
+    cache_path = str(tmpdir.join('index.json'))
+    PluginIndex(cache_path).get_plugins([indexed_plugins], 'PreBuildPlugin')
+
+    sys.modules.pop('indexed_plugins')
+    with open(indexed_plugins, 'w') as f:
+        f.write(INDEXED_PLUGINS.replace("'indexed_pre'", "'renamed_pre'"))
+    assert PluginIndex(cache_path).get_plugins([indexed_plugins], 'PreBuildPlugin') == {
+        'renamed_pre': (indexed_plugins, 'IndexedPreBuildPlugin'),
+    }
+
+
+def test_plugin_index_missing_files_dropped(indexed_plugins, tmpdir):
+    cache_path = str(tmpdir.join('index.json'))
+    PluginIndex(cache_path).get_plugins([indexed_plugins], 'PreBuildPlugin')
+
+    moved = str(tmpdir.join('moved_plugins.py'))
+    os.rename(indexed_plugins, moved)
+    try:
+        PluginIndex(cache_path).get_plugins([moved], 'PreBuildPlugin')
+    finally:
+        sys.modules.pop('moved_plugins', None)
+
+    with open(cache_path) as f:
+        assert list(json.load(f)['files']) == [moved]
+
+
+@pytest.mark.parametrize(('env_value', 'cache_path'), [
+    (None, None),
+    ('', None),
+    ('~/index.json', os.path.expanduser('~/index.json')),
+])
+def test_get_plugin_index(monkeypatch, env_value, cache_path):
+    if env_value is None:
+        monkeypatch.delenv(PLUGIN_INDEX_CACHE_ENV, raising=False)
+    else:
+        monkeypatch.setenv(PLUGIN_INDEX_CACHE_ENV, env_value)
+    monkeypatch.setattr(atomic_reactor.plugin, '_plugin_index', None)
+
+    assert get_plugin_index().cache_path == cache_path
+    assert get_plugin_index() is get_plugin_index()
+
+
+def test_plugin_index_broken_file(tmpdir, caplog):
+    path = str(tmpdir.join('broken_plugins.py'))
+    with open(path, 'w') as f:
+        f.write('import not_existing_module\n')
+    missing = str(tmpdir.join('missing_plugins.py'))
+
+    index = PluginIndex(str(tmpdir.join('index.json')))
+    assert index.get_plugins([path, missing], 'PreBuildPlugin') == {}
+    assert "can't load module '{}'".format(path) in caplog.text
+    assert "can't load module '{}'".format(missing) in caplog.text
+
+
+def test_plugin_classes_lazy(indexed_plugins):
+    classes = PluginClasses({
+        'indexed_pre': (indexed_plugins, 'IndexedPreBuildPlugin'),
+        'renamed_pre': (indexed_plugins, 'RenamedPreBuildPlugin'),
+    })
+    assert len(classes) == 2
+    assert set(classes) == {'indexed_pre', 'renamed_pre'}
+    assert 'indexed_plugins' not in sys.modules
+
+    assert classes['indexed_pre'].key == 'indexed_pre'
+    assert 'indexed_plugins' in sys.modules
+    with pytest.raises(KeyError):
+        classes['renamed_pre']  # pylint: disable=pointless-statement
+
+
 class X(object):
     pass
 
@@ -416,6 +537,131 @@ class TestBuildPluginsRunner(object):
             assert getattr(plugin, key) == value
 
 
+class TestParallelPluginsRunner(object):
+
+    def make_plugin(self, key, depends_on=None, reads=None, writes=None,
+                    run=None, allowed_to_fail=True):
+        attrs = {
+            'key': key,
+            'is_allowed_to_fail': allowed_to_fail,
+            'depends_on': depends_on,
+            'workflow_reads': reads,
+            'workflow_writes': writes,
+            'run': run or (lambda plugin: plugin.key),
+        }
+        return type(key, (PreBuildPlugin,), attrs)
+
+    def make_runner(self, docker_tasker, workflow, plugins, workers=4):
+        flexmock(PluginsRunner, load_plugins=lambda x: {p.key: p for p in plugins})
+        return PreBuildPluginsRunner(docker_tasker, workflow,
+                                     [{'name': p.key} for p in plugins],
+                                     parallel_workers=workers)
+
+    def test_plugin_dependencies(self, tmpdir, docker_tasker):
+        plugins = [
+            self.make_plugin('undeclared'),
+            self.make_plugin('independent1', depends_on=(), reads=(), writes=()),
+            self.make_plugin('independent2', depends_on=(), reads=(), writes=()),
+            self.make_plugin('by_key', depends_on=('independent1',)),
+            self.make_plugin('writer', writes=('dockerfile',)),
+            self.make_plugin('reader', reads=('dockerfile',)),
+            self.make_plugin('other_writer', writes=('something',)),
+            self.make_plugin('undeclared2'),
+        ]
+        runner = self.make_runner(docker_tasker, mock_workflow(tmpdir), plugins)
+
+        assert runner.get_plugin_dependencies() == [
+            set(),
+            {0},
+            {0},
+            {0, 1},
+            {0},
+            {0, 4},
+            {0},
+            {0, 1, 2, 3, 4, 5, 6},
+        ]
+
+    def test_build_kwargs_override_writers(self, tmpdir, docker_tasker):
+        plugins = [ResolveRemoteSourcePlugin, FetchMavenArtifactsPlugin, ResolveComposesPlugin]
+        runner = self.make_runner(docker_tasker, mock_workflow(tmpdir), plugins)
+
+        # both resolve plugins override build kwargs of worker builds
+        assert runner.get_plugin_dependencies() == [set(), set(), {0}]
+
+    def test_run_parallel(self, tmpdir, docker_tasker):
+        barrier = threading.Barrier(2, timeout=10)
+
+        def run_concurrently(plugin):
+            # fails with BrokenBarrierError unless both plugins run at once
+            barrier.wait()
+            return plugin.key
+
+        def run_dependent(plugin):
+            return plugin.workflow.prebuild_results['first'] + '+dependent'
+
+        plugins = [
+            self.make_plugin('first', depends_on=(), run=run_concurrently,
+                             allowed_to_fail=False),
+            self.make_plugin('second', depends_on=(), run=run_concurrently,
+                             allowed_to_fail=False),
+            self.make_plugin('dependent', depends_on=('first',), run=run_dependent,
+                             allowed_to_fail=False),
+        ]
+        workflow = mock_workflow(tmpdir)
+        runner = self.make_runner(docker_tasker, workflow, plugins)
+
+        results = runner.run()
+
+        assert results == {
+            'first': 'first',
+            'second': 'second',
+            'dependent': 'first+dependent',
+        }
+        assert set(workflow.plugins_timestamps) == {'first', 'second', 'dependent'}
+        assert set(workflow.plugins_durations) == {'first', 'second', 'dependent'}
+        assert not workflow.plugin_failed
+
+    @pytest.mark.parametrize('workers', [None, 1])
+    def test_run_parallel_disabled(self, tmpdir, docker_tasker, workers):
+        flexmock(PluginsRunner).should_receive('_run_parallel').never()
+        plugins = [self.make_plugin('first', depends_on=())]
+        runner = self.make_runner(docker_tasker, mock_workflow(tmpdir), plugins,
+                                  workers=workers)
+        assert runner.run() == {'first': 'first'}
+
+    @pytest.mark.parametrize(('allowed_to_fail', 'keep_going'), [
+        (True, False),
+        (False, False),
+        (False, True),
+    ])
+    def test_run_parallel_failure(self, tmpdir, docker_tasker, allowed_to_fail, keep_going):
+        def run_failing(plugin):
+            raise RuntimeError('failed')
+
+        plugins = [
+            self.make_plugin('failing', depends_on=(), run=run_failing,
+                             allowed_to_fail=allowed_to_fail),
+            self.make_plugin('dependent', depends_on=('failing',)),
+        ]
+        workflow = mock_workflow(tmpdir)
+        runner = self.make_runner(docker_tasker, workflow, plugins)
+
+        if allowed_to_fail:
+            results = runner.run(keep_going=keep_going)
+            assert isinstance(results['failing'], RuntimeError)
+            assert results['dependent'] == 'dependent'
+            assert not workflow.plugin_failed
+            return
+
+        with pytest.raises(PluginFailedException) as exc:
+            runner.run(keep_going=keep_going)
+        assert "plugin 'failing' raised an exception: RuntimeError: failed" in str(exc.value)
+        assert workflow.plugin_failed
+        assert 'failing' in workflow.plugins_errors
+        # without keep_going, no plugins are started after a fatal failure
+        assert ('dependent' in workflow.prebuild_results) == keep_going
+
+
 class TestInputPluginsRunner(object):
     def test_substitution(self, tmpdir):
         tmpdir_path = str(tmpdir)
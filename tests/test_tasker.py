@@ -7,14 +7,17 @@ of the BSD license. See the LICENSE file for details.
 """
 
 
-from atomic_reactor.core import DockerTasker, retry, RetryGeneratorException, ContainerTasker
-from atomic_reactor.util import clone_git_repo, CommandResult
+from atomic_reactor.core import (DockerTasker, retry, RetryGeneratorException, ContainerTasker,
+                                 ExportStream)
+from atomic_reactor.util import clone_git_repo, CommandResult, get_checksums
 from osbs.utils import ImageName
 from tests.constants import LOCALHOST_REGISTRY, INPUT_IMAGE, DOCKERFILE_GIT, MOCK, COMMAND
 from urllib3.exceptions import ProtocolError, ReadTimeoutError
 from tests.util import requires_internet
 
 from base64 import b64encode
+import hashlib
+import io
 import json
 import os
 import docker
@@ -322,6 +325,70 @@ def test_get_image(docker_tasker):
     assert response is not None
 
 
+def test_get_image_stream(docker_tasker):
+    if MOCK:
+        mock_docker()
+
+    progress = []
+    with docker_tasker.get_image_stream(input_image_name, progress=progress.append) as stream:
+        content = stream.read()
+
+    assert content
+    assert progress[-1] == stream.size == len(content)
+    assert stream.checksums['sha256sum'] == hashlib.sha256(content).hexdigest()
+
+
+def test_save_image(docker_tasker, tmpdir):
+    if MOCK:
+        mock_docker()
+
+    path = str(tmpdir.join('image.tar'))
+    size = docker_tasker.save_image(input_image_name, path)
+    assert size == os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        expected = hashlib.sha256(f.read()).hexdigest()
+    # checksums computed while writing are remembered
+    flexmock(atomic_reactor.util).should_receive('_compute_checksums').never()
+    assert get_checksums(path, ['sha256']) == {'sha256sum': expected}
+
+
+@pytest.mark.parametrize('buffer_size', (1, 3, 1024))
+def test_export_stream_write_to(buffer_size):
+    data = b'0123456789'
+    stream = ExportStream(io.BytesIO(data))
+    out = io.BytesIO()
+    assert stream.write_to(out, buffer_size=buffer_size) == len(data)
+    assert out.getvalue() == data
+    assert stream.checksums == {
+        'md5sum': hashlib.md5(data).hexdigest(),
+        'sha256sum': hashlib.sha256(data).hexdigest(),
+    }
+
+
+@pytest.mark.parametrize('error', (None, 'no space left on device'))
+def test_load_image(docker_tasker, tmpdir, error):
+    if MOCK:
+        mock_docker()
+
+    path = str(tmpdir.join('image.tar.gz'))
+    with open(path, 'wb') as f:
+        f.write(b'archive')
+
+    output = [{'stream': 'Loaded image: image:latest\n'}]
+    if error:
+        output.append({'error': error})
+    (flexmock(docker_tasker.tasker.d.wrapped)
+     .should_receive('load_image')
+     .replace_with(lambda data: iter(output)))
+
+    if error:
+        with pytest.raises(RuntimeError, match=error):
+            docker_tasker.load_image(path)
+    else:
+        docker_tasker.load_image(path)
+
+
 def test_get_image_info_by_name_tag_in_name(docker_tasker):
     if MOCK:
         mock_docker()
@@ -398,6 +465,25 @@ def test_export(docker_tasker, no_container):
         docker_tasker.remove_container(container_id)
 
 
+@pytest.mark.parametrize('no_container', (False, True))
+def test_export_stream(docker_tasker, no_container):
+    if MOCK:
+        mock_docker()
+
+    container_dict = docker_tasker.create_container(INPUT_IMAGE, command=["/bin/bash"])
+    container_id = container_dict['Id']
+
+    try:
+        if no_container:
+            with pytest.raises(docker.errors.APIError):
+                docker_tasker.export_container_stream('NOT_THERE')
+        else:
+            with docker_tasker.export_container_stream(container_id) as stream:
+                assert stream.read()
+    finally:
+        docker_tasker.remove_container(container_id)
+
+
 def test_get_version(docker_tasker):
     if MOCK:
         mock_docker()
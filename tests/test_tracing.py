@@ -0,0 +1,149 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+
+import json
+import threading
+
+import pytest
+import responses
+
+from atomic_reactor import tracing
+from atomic_reactor.utils.retries import get_retrying_requests_session
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.Tracer()
+    tracing.set_tracer(tracer)
+    yield tracer
+    tracing.set_tracer(None)
+
+
+def test_span_without_tracer():
+    assert tracing.get_tracer() is None
+    with tracing.span('build', tracing.SPAN_PHASE) as span:
+        assert span is tracing.NULL_SPAN
+        span.set(foo='bar')
+        span.add('retries')
+    assert tracing.current_span() is tracing.NULL_SPAN
+
+
+def test_span_nesting(tracer):
+    with tracing.span('prebuild', tracing.SPAN_PHASE) as phase:
+        assert tracing.current_span() is phase
+        with tracing.span('fetch', tracing.SPAN_PLUGIN) as plugin:
+            assert tracing.current_span() is plugin
+            tracing.current_span().add('retries')
+            tracing.current_span().add('retries')
+        assert tracing.current_span() is phase
+    assert tracing.current_span() is tracing.NULL_SPAN
+
+    plugin_span, phase_span = tracer.spans
+    assert phase_span.parent is None
+    assert plugin_span.parent == phase_span.id
+    assert plugin_span.attributes == {'retries': 2}
+    assert phase_span.duration >= plugin_span.duration >= 0
+
+
+def test_span_error(tracer):
+    with pytest.raises(ValueError):
+        with tracing.span('prebuild', tracing.SPAN_PHASE):
+            raise ValueError('failed')
+    assert tracer.spans[0].attributes == {'error': 'ValueError'}
+
+
+def test_span_in_thread(tracer):
+    with tracing.span('prebuild', tracing.SPAN_PHASE) as phase:
+        def run():
+            with tracing.span('orphan', tracing.SPAN_PLUGIN):
+                pass
+            with tracing.span('child', tracing.SPAN_PLUGIN, parent=phase):
+                pass
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+    spans = {span.name: span for span in tracer.spans}
+    assert spans['orphan'].parent is None
+    assert spans['child'].parent == phase.id
+    assert spans['child'].thread != phase.thread
+
+
+def test_chrome_trace(tracer, tmpdir):
+    with tracing.span('prebuild', tracing.SPAN_PHASE):
+        with tracing.span('GET', tracing.SPAN_HTTP, host='registry.example.com'):
+            pass
+    tracer.counter('disk', mb_used=10)
+
+    path = str(tmpdir.join('trace.json'))
+    tracer.export(path)
+    with open(path) as f:
+        trace = json.load(f)
+
+    # other threads may record events to the tracer, e.g. disk usage
+    events = trace['traceEvents']
+    phase, = [event for event in events if event['name'] == 'prebuild']
+    request, = [event for event in events if event['name'] == 'GET']
+    counter, = [event for event in events
+                if event['ph'] == 'C' and event['args'] == {'mb_used': 10}]
+    assert phase['name'] == 'prebuild'
+    assert phase['ph'] == 'X'
+    assert 'parent_id' not in phase['args']
+    assert request['cat'] == tracing.SPAN_HTTP
+    assert request['args'] == {'host': 'registry.example.com',
+                               'span_id': request['args']['span_id'],
+                               'parent_id': phase['args']['span_id']}
+    assert counter == {'name': 'disk', 'ph': 'C', 'ts': counter['ts'], 'pid': phase['pid'],
+                       'args': {'mb_used': 10}}
+
+
+def test_export_failure(tracer, tmpdir, caplog):
+    tracer.export(str(tmpdir.join('missing', 'trace.json')))
+    assert 'failed to write trace' in caplog.text
+
+
+def test_summary(tracer):
+    with tracing.span('prebuild', tracing.SPAN_PHASE):
+        with tracing.span('GET', tracing.SPAN_HTTP, host='a.example.com', bytes=10):
+            pass
+        with tracing.span('GET', tracing.SPAN_HTTP, host='a.example.com', bytes=5, retries=1):
+            pass
+        with tracing.span('PUT', tracing.SPAN_HTTP, host='b.example.com'):
+            pass
+        with tracing.span('inspect_image', tracing.SPAN_DOCKER):
+            pass
+
+    summary = tracer.summary()
+    assert list(summary['phases']) == ['prebuild']
+    calls = summary['calls']
+    assert calls[tracing.SPAN_HTTP]['count'] == 3
+    assert calls[tracing.SPAN_HTTP]['bytes'] == 15
+    assert calls[tracing.SPAN_HTTP]['retries'] == 1
+    assert calls[tracing.SPAN_DOCKER]['count'] == 1
+    assert calls[tracing.SPAN_SUBPROCESS]['count'] == 0
+    assert summary['hosts']['a.example.com']['count'] == 2
+    assert summary['hosts']['a.example.com']['bytes'] == 15
+    assert summary['hosts']['b.example.com']['count'] == 1
+
+
+@responses.activate
+def test_http_adapter(tracer):
+    url = 'https://registry.example.com/v2/'
+    responses.add(responses.POST, url, body='{}', status=201,
+                  adding_headers={'Content-Length': '2'})
+
+    session = get_retrying_requests_session()
+    with tracing.span('prebuild', tracing.SPAN_PHASE) as phase:
+        session.post(url, data=b'12345')
+
+    request = tracer.spans[0]
+    assert request.category == tracing.SPAN_HTTP
+    assert request.name == 'POST'
+    assert request.parent == phase.id
+    assert request.attributes == {'host': 'registry.example.com', 'status': 201, 'bytes': 7}
@@ -6,6 +6,7 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+import hashlib
 import io
 import json
 import logging
@@ -25,7 +26,9 @@ from textwrap import dedent
 from flexmock import flexmock
 
 from collections import OrderedDict
+from copy import deepcopy
 import docker
+import jsonschema
 import yaml
 
 from atomic_reactor.build import BuildResult
@@ -38,6 +41,7 @@ from atomic_reactor.util import (wait_for_command,
                                  LazyGit, figure_out_build_file,
                                  render_yum_repo, process_substitutions,
                                  get_checksums, print_version_of_tools,
+                                 ChecksumWriter, StreamAdapter, remember_checksums,
                                  get_version_of_tools,
                                  human_size, CommandResult,
                                  registry_hostname, Dockercfg, RegistrySession,
@@ -56,13 +60,15 @@ from atomic_reactor.util import (wait_for_command,
                                  get_unique_images,
                                  get_image_upload_filename,
                                  read_yaml, read_yaml_from_file_path, read_yaml_from_url,
+                                 get_schema_validator, validate_with_cached_schema,
                                  OSBSLogs,
                                  get_platforms_in_limits, get_orchestrator_platforms,
                                  dump_stacktraces, setup_introspection_signal_handler,
                                  allow_repo_dir_in_dockerignore,
                                  has_operator_appregistry_manifest,
                                  has_operator_bundle_manifest, DockerfileImages,
-                                 terminal_key_paths,
+                                 terminal_key_paths, query_registry,
+                                 freeze, FrozenDict, FrozenList,
                                  )
 from tests.constants import (DOCKERFILE_GIT,
                              INPUT_IMAGE, MOCK, MOCK_SOURCE,
@@ -70,11 +76,13 @@ from tests.constants import (DOCKERFILE_GIT,
 import atomic_reactor.util
 from atomic_reactor.constants import INSPECT_CONFIG, PLUGIN_BUILD_ORCHESTRATE_KEY
 from atomic_reactor.source import SourceConfig
+from osbs.exceptions import OsbsValidationException
 from osbs.utils import ImageName
 from atomic_reactor.plugins.pre_reactor_config import (ReactorConfigPlugin,
                                                        ReactorConfig,
                                                        WORKSPACE_CONF_KEY)
 
+from atomic_reactor.utils.registry_cache import RegistryCache, set_registry_cache
 from tests.util import requires_internet
 from tests.stubs import StubInsideBuilder, StubSource
 
@@ -251,6 +259,60 @@ def test_get_hexdigests(tmpdir, content, algorithms, expected, write_to_file, sh
         assert checksums == expected
 
 
+def test_get_checksums_memo(tmpdir):
+    path = str(tmpdir.join('file'))
+    with open(path, 'wb') as f:
+        f.write(b'abc')
+
+    assert get_checksums(path, ['md5']) == {'md5sum': hashlib.md5(b'abc').hexdigest()}
+
+    # file is read again only to compute unknown checksums
+    flexmock(atomic_reactor.util).should_call('_compute_checksums').once()
+    assert get_checksums(path, ['md5']) == {'md5sum': hashlib.md5(b'abc').hexdigest()}
+    assert get_checksums(path, ['md5', 'sha256']) == {
+        'md5sum': hashlib.md5(b'abc').hexdigest(),
+        'sha256sum': hashlib.sha256(b'abc').hexdigest(),
+    }
+
+
+def test_get_checksums_file_changed(tmpdir):
+    path = str(tmpdir.join('file'))
+    with open(path, 'wb') as f:
+        f.write(b'abc')
+    assert get_checksums(path, ['md5']) == {'md5sum': hashlib.md5(b'abc').hexdigest()}
+
+    with open(path, 'wb') as f:
+        f.write(b'abcdef')
+    assert get_checksums(path, ['md5']) == {'md5sum': hashlib.md5(b'abcdef').hexdigest()}
+
+
+def test_checksum_writer(tmpdir):
+    path = str(tmpdir.join('file'))
+    with open(path, 'wb') as f:
+        writer = ChecksumWriter(f)
+        writer.write(b'abc')
+        writer.write(b'def')
+
+    assert writer.size == 6
+    expected = {
+        'md5sum': hashlib.md5(b'abcdef').hexdigest(),
+        'sha256sum': hashlib.sha256(b'abcdef').hexdigest(),
+    }
+    assert writer.checksums == expected
+
+    remember_checksums(path, writer.checksums)
+    flexmock(atomic_reactor.util).should_receive('_compute_checksums').never()
+    assert get_checksums(path, ['md5', 'sha256']) == expected
+
+
+def test_stream_adapter():
+    stream = StreamAdapter(iter([b'abc', b'', b'defgh', b'i']))
+    assert stream.read(2) == b'ab'
+    assert stream.read(5) == b'cdefg'
+    assert stream.read(10) == b'hi'
+    assert stream.read(1) == b''
+
+
 @pytest.mark.parametrize('path, image_type, expected', [
     ('foo.tar', IMAGE_TYPE_DOCKER_ARCHIVE, 'docker-image-XXX.x86_64.tar'),
     ('foo.tar.gz', IMAGE_TYPE_DOCKER_ARCHIVE, 'docker-image-XXX.x86_64.tar.gz'),
@@ -512,11 +574,25 @@ def test_registry_create_from_config(workflow, registry, reactor_config, matched
      .with_args(matched_registry['uri'],
                 insecure=matched_registry['insecure'],
                 dockercfg_path=matched_registry['dockercfg_path'],
-                access=access))
+                access=access,
+                cache_tags=True))
 
     RegistrySession.create_from_config(workflow, registry, access)
 
 
+def test_registry_create_from_config_caches_tags(workflow):
+    workflow.plugin_workspace[ReactorConfigPlugin.key] = {
+        WORKSPACE_CONF_KEY: ReactorConfig({
+            'version': 1,
+            'source_registry': {'url': 'default_registry.io', 'insecure': False},
+        })
+    }
+
+    # sessions created from config are used for parent images, not pushed to
+    assert RegistrySession.create_from_config(workflow).cache_tags
+    assert not RegistrySession('default_registry.io').cache_tags
+
+
 @pytest.mark.parametrize('registry, reactor_config, error', [
     # Registry not specified, no registries in config
     (None,
@@ -908,6 +984,37 @@ def test_get_manifest_timeout_error(tmpdir, body):
         get_manifest(image, session, 'v2')
 
 
+@responses.activate
+@pytest.mark.parametrize('cache_tags', [True, False])
+def test_query_registry_cache(cache_tags):
+    manifest = json.dumps({'schemaVersion': 2}).encode('utf-8')
+    digest = 'sha256:{}'.format(hashlib.sha256(manifest).hexdigest())
+    headers = {'Content-Type': MEDIA_TYPE_DOCKER_V2_SCHEMA2,
+               'Docker-Content-Digest': digest}
+    for reference in ('latest', digest):
+        url = 'https://example.com/v2/spam/manifests/{}'.format(reference)
+        responses.add(responses.GET, url, body=manifest, headers=headers)
+
+    image = ImageName.parse('example.com/spam:latest')
+    set_registry_cache(RegistryCache())
+    try:
+        session = RegistrySession('https://example.com', cache_tags=cache_tags)
+        for _ in range(2):
+            assert query_registry(session, image, version='v2').content == manifest
+            response = query_registry(session, image, digest=digest, version='v2')
+            assert response.content == manifest
+            assert response.headers['Content-Type'] == MEDIA_TYPE_DOCKER_V2_SCHEMA2
+            assert response.headers['Docker-Content-Digest'] == digest
+        # manifest referenced by digest is always fetched only once
+        assert len(responses.calls) == (1 if cache_tags else 2)
+
+        # cached manifest of other media type is not used
+        query_registry(session, image, digest=digest, version='oci')
+        assert len(responses.calls) == (2 if cache_tags else 3)
+    finally:
+        set_registry_cache(None)
+
+
 @pytest.mark.parametrize('namespace,repo,explicit,expected', [
     ('foo', 'bar', False, 'foo/bar'),
     ('foo', 'bar', True, 'foo/bar'),
@@ -1234,6 +1341,53 @@ def test_read_yaml_from_url_different_content_types(content_type):
     assert output == expected
 
 
+@pytest.fixture
+def empty_schema_cache(monkeypatch):
+    monkeypatch.setattr(atomic_reactor.util, '_schema_validators', {})
+    monkeypatch.setattr(atomic_reactor.util, '_validated_yaml', set())
+
+
+@pytest.mark.usefixtures('empty_schema_cache')
+def test_schema_validator_cached():
+    (flexmock(atomic_reactor.util)
+     .should_receive('load_schema')
+     .with_args('atomic_reactor', 'schemas/config.json')
+     .once()
+     .and_return({'type': 'object'}))
+
+    validator = get_schema_validator('schemas/config.json')
+    assert get_schema_validator('schemas/config.json') is validator
+    validate_with_cached_schema({}, 'schemas/config.json')
+
+
+@pytest.mark.usefixtures('empty_schema_cache')
+def test_schema_validator_invalid_schema():
+    (flexmock(atomic_reactor.util)
+     .should_receive('load_schema')
+     .and_return({'type': 'spam'}))
+
+    for _ in range(2):
+        with pytest.raises(jsonschema.SchemaError):
+            get_schema_validator('schemas/config.json')
+
+
+@pytest.mark.usefixtures('empty_schema_cache')
+def test_read_yaml_validated_once():
+    config = REACTOR_CONFIG_MAP
+    (flexmock(atomic_reactor.util)
+     .should_call('validate_with_cached_schema')
+     .once())
+
+    assert read_yaml(config, 'schemas/config.json') == read_yaml(config, 'schemas/config.json')
+
+
+@pytest.mark.usefixtures('empty_schema_cache')
+def test_read_yaml_invalid():
+    for _ in range(2):
+        with pytest.raises(OsbsValidationException):
+            read_yaml('version: spam', 'schemas/config.json')
+
+
 LogEntry = namedtuple('LogEntry', ['platform', 'line'])
 
 
@@ -1957,3 +2111,37 @@ def test_dockerfile_images(source_registry, organization, dockerfile_images, bas
 def test_terminal_key_paths(data, expected):
     """Unittest for terminal_key_paths data"""
     assert set(terminal_key_paths(data)) == expected
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda data: data.update({'a': 2}),
+    lambda data: data.pop('a'),
+    lambda data: data.setdefault('c', 1),
+    lambda data: data.__setitem__('a', 2),
+    lambda data: data['b'].append(3),
+    lambda data: data['b'].sort(),
+    lambda data: data['b'].__delitem__(0),
+    lambda data: data['b'][0].clear(),
+])
+def test_freeze_read_only(mutate):
+    data = freeze({'a': 1, 'b': [{'c': 1}, {'d': 2}]})
+    with pytest.raises(TypeError):
+        mutate(data)
+    assert data == {'a': 1, 'b': [{'c': 1}, {'d': 2}]}
+
+
+def test_freeze_mutable_copy():
+    original = {'a': [{'b': 1}], 'c': 'd'}
+    data = freeze(original)
+    assert isinstance(data, FrozenDict)
+    assert isinstance(data['a'], FrozenList)
+    assert isinstance(data['a'][0], FrozenDict)
+    assert json.loads(json.dumps(data)) == original
+
+    for copy in (data.mutable_copy(), deepcopy(data)):
+        assert type(copy) is dict
+        assert type(copy['a']) is list
+        assert type(copy['a'][0]) is dict
+        copy['a'][0]['b'] = 2
+        copy['a'].append('e')
+    assert data == original
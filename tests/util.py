@@ -28,7 +28,8 @@ def add_koji_map_in_workflow(workflow, hub_url, root_url=None, reserve_build=Non
     if not reactor_config:
         reactor_config = ReactorConfig({})
 
-    koji_map = reactor_config.conf['koji'] = {
+    conf = reactor_config.conf.mutable_copy()
+    koji_map = conf['koji'] = {
         'hub_url': hub_url,
         'auth': {},
     }
@@ -57,7 +58,7 @@ def add_koji_map_in_workflow(workflow, hub_url, root_url=None, reserve_build=Non
     if krb_keytab:
         koji_map['auth']['krb_keytab_path'] = str(krb_keytab)
 
-    workflow.plugin_workspace[ReactorConfigPlugin.key][WORKSPACE_CONF_KEY] = reactor_config
+    workflow.plugin_workspace[ReactorConfigPlugin.key][WORKSPACE_CONF_KEY] = ReactorConfig(conf)
 
 
 def uuid_value():
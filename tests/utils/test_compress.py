@@ -0,0 +1,124 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+
+import gzip
+import io
+import lzma
+import os
+import subprocess
+
+import pytest
+
+from atomic_reactor.utils import compress
+from atomic_reactor.utils.compress import (GzipCompressor, LzmaCompressor, ZstdCompressor,
+                                           get_compressor)
+
+
+def make_data(size):
+    # mix of compressible and random data, with repetitions across blocks
+    random_part = os.urandom(64 * 1024)
+    data = (b'atomic-reactor ' * 10000 + random_part) * (size // (150000 + len(random_part)) + 1)
+    return data[:size]
+
+
+@pytest.mark.parametrize('size', [
+    0,
+    100,
+    compress.GZIP_BLOCK_SIZE,
+    3 * compress.GZIP_BLOCK_SIZE + 123,
+])
+@pytest.mark.parametrize('threads', [1, 2, 4])
+def test_gzip(size, threads):
+    data = make_data(size)
+    out = io.BytesIO()
+
+    compressor = GzipCompressor(level=6, threads=threads)
+    assert compressor.compress(io.BytesIO(data), out) == size
+
+    assert gzip.decompress(out.getvalue()) == data
+
+
+def test_gzip_parallel_gunzip(tmpdir):
+    data = make_data(5 * compress.GZIP_BLOCK_SIZE)
+    path = str(tmpdir.join('data.gz'))
+    with open(path, 'wb') as f:
+        GzipCompressor(threads=3).compress(io.BytesIO(data), f)
+
+    try:
+        output = subprocess.check_output(['gzip', '-dc', path])
+    except OSError:
+        pytest.skip('gzip not available')
+    assert output == data
+
+
+@pytest.mark.parametrize('method', ['gzip', 'lzma'])
+@pytest.mark.parametrize('threads', [1, 2])
+def test_compress_writer(method, threads):
+    data = make_data(2 * compress.GZIP_BLOCK_SIZE + 5)
+    out = io.BytesIO()
+
+    def write(fileobj):
+        for start in range(0, len(data), 100000):
+            fileobj.write(data[start:start + 100000])
+        return 'written'
+
+    compressor = get_compressor(method, threads=threads)
+    assert compressor.compress_writer(write, out) == (len(data), 'written')
+
+    decompress = gzip.decompress if method == 'gzip' else lzma.decompress
+    assert decompress(out.getvalue()) == data
+
+
+def test_compress_writer_fails():
+    def write(fileobj):
+        fileobj.write(b'partial')
+        raise RuntimeError('write failed')
+
+    with pytest.raises(RuntimeError, match='write failed'):
+        GzipCompressor().compress_writer(write, io.BytesIO())
+
+
+def test_lzma():
+    data = make_data(1000000)
+    out = io.BytesIO()
+
+    assert LzmaCompressor(level=1).compress(io.BytesIO(data), out) == len(data)
+    assert lzma.decompress(out.getvalue()) == data
+
+
+@pytest.mark.skipif(compress.zstandard is None, reason='zstandard not available')
+def test_zstd():
+    data = make_data(1000000)
+    out = io.BytesIO()
+
+    assert ZstdCompressor(threads=2).compress(io.BytesIO(data), out) == len(data)
+    decompressor = compress.zstandard.ZstdDecompressor()
+    assert decompressor.stream_reader(io.BytesIO(out.getvalue())).read() == data
+
+
+def test_zstd_missing(monkeypatch):
+    monkeypatch.setattr(compress, 'zstandard', None)
+    with pytest.raises(RuntimeError, match='requires the zstandard module'):
+        get_compressor('zstd')
+
+
+@pytest.mark.parametrize('method, level, threads, expected_class, expected_level', [
+    ('gzip', None, None, GzipCompressor, 6),
+    ('gzip', 9, 2, GzipCompressor, 9),
+    ('lzma', None, 1, LzmaCompressor, None),
+])
+def test_get_compressor(method, level, threads, expected_class, expected_level):
+    compressor = get_compressor(method, level=level, threads=threads)
+    assert isinstance(compressor, expected_class)
+    assert compressor.level == expected_level
+    assert compressor.threads == (threads or os.cpu_count())
+
+
+def test_get_compressor_unsupported():
+    with pytest.raises(RuntimeError, match='Unsupported compression format spam'):
+        get_compressor('spam')
@@ -0,0 +1,187 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+import requests
+from docker.errors import APIError
+from flexmock import flexmock
+
+from atomic_reactor.utils.image_cache import ParentImageCache
+from osbs.utils import ImageName
+
+IMAGE = ImageName.parse('registry.example.com/parent@sha256:123456')
+IMAGE_STR = IMAGE.to_str()
+
+
+class MockTasker(object):
+    def __init__(self, images=()):
+        self.images = set(images)
+        self.pulled = []
+        self.removed = []
+
+    def image_exists(self, image):
+        return image in self.images
+
+    def pull_image(self, image, insecure=False, dockercfg_path=None):
+        self.pulled.append(image.to_str())
+        self.images.add(image.to_str())
+
+    def remove_image(self, image, force=False):
+        assert not force
+        self.removed.append(image)
+        self.images.discard(image)
+
+
+@pytest.fixture
+def now():
+    clock = [1000.0]
+    flexmock(time).should_receive('time').replace_with(lambda: clock[0])
+    return clock
+
+
+def read_state(tmpdir):
+    with open(os.path.join(str(tmpdir), 'state.json')) as f:
+        return json.load(f)
+
+
+def test_pull_once(tmpdir, now):
+    tasker = MockTasker()
+    cache = ParentImageCache(tasker, str(tmpdir))
+
+    assert cache.acquire(IMAGE, 'build-1')
+    assert not cache.acquire(IMAGE, 'build-2')
+    assert tasker.pulled == [IMAGE_STR]
+    assert read_state(tmpdir) == {
+        IMAGE_STR: {'users': {'build-1': 1000.0, 'build-2': 1000.0}, 'released': None},
+    }
+
+
+def test_pull_tag_always(tmpdir, now):
+    image = ImageName.parse('registry.example.com/parent:latest')
+    tasker = MockTasker()
+    cache = ParentImageCache(tasker, str(tmpdir))
+
+    assert cache.acquire(image, 'build-1')
+    # the tag may have moved since
+    assert cache.acquire(image, 'build-2')
+    assert tasker.pulled == [image.to_str()] * 2
+    assert list(read_state(tmpdir)[image.to_str()]['users']) == ['build-1', 'build-2']
+
+
+def test_removed_after_grace_period(tmpdir, now):
+    tasker = MockTasker()
+    cache = ParentImageCache(tasker, str(tmpdir), grace_period=60)
+    cache.acquire(IMAGE, 'build-1')
+    cache.acquire(IMAGE, 'build-2')
+
+    cache.release(IMAGE_STR, 'build-1')
+    now[0] += 100
+    cache.release(IMAGE_STR, 'build-1')
+    assert tasker.removed == []
+
+    cache.release(IMAGE_STR, 'build-2')
+    now[0] += 30
+    cache.release(IMAGE_STR, 'build-2')
+    assert tasker.removed == []
+
+    # another build reuses the image during the grace period
+    assert not cache.acquire(IMAGE, 'build-3')
+    cache.release(IMAGE_STR, 'build-3')
+    now[0] += 59
+    cache.release('other', 'build-4')
+    assert tasker.removed == []
+
+    now[0] += 1
+    cache.release('other', 'build-4')
+    assert tasker.removed == [IMAGE_STR]
+    assert read_state(tmpdir) == {}
+
+    assert cache.acquire(IMAGE, 'build-5')
+
+
+def test_removed_immediately(tmpdir, now):
+    tasker = MockTasker()
+    cache = ParentImageCache(tasker, str(tmpdir), grace_period=0)
+    cache.acquire(IMAGE, 'build-1')
+    cache.release(IMAGE_STR, 'build-1')
+    assert tasker.removed == [IMAGE_STR]
+
+
+def test_stale_use(tmpdir, now):
+    tasker = MockTasker()
+    cache = ParentImageCache(tasker, str(tmpdir), grace_period=60, stale_after=3600)
+    cache.acquire(IMAGE, 'crashed')
+
+    now[0] += 3601
+    cache.release('other', 'build-1')
+    assert tasker.removed == []
+    assert read_state(tmpdir)[IMAGE_STR] == {'users': {}, 'released': now[0]}
+
+    now[0] += 60
+    cache.release('other', 'build-1')
+    assert tasker.removed == [IMAGE_STR]
+
+
+@pytest.mark.parametrize(('status_code', 'forgotten'), [
+    (409, True),
+    (500, False),
+])
+def test_remove_error(tmpdir, now, status_code, forgotten):
+    tasker = MockTasker()
+    cache = ParentImageCache(tasker, str(tmpdir), grace_period=0)
+    cache.acquire(IMAGE, 'build-1')
+
+    response = requests.Response()
+    response.status_code = status_code
+    (flexmock(tasker)
+     .should_receive('remove_image')
+     .and_raise(APIError('remove failed', response)))
+
+    cache.release(IMAGE_STR, 'build-1')
+    assert (IMAGE_STR not in read_state(tmpdir)) == forgotten
+
+
+def test_corrupted_state(tmpdir, now):
+    tmpdir.join('state.json').write('{')
+    cache = ParentImageCache(MockTasker(), str(tmpdir))
+    cache.acquire(IMAGE, 'build-1')
+    assert list(read_state(tmpdir)) == [IMAGE_STR]
+
+
+def test_concurrent_pulls(tmpdir):
+    pulling = threading.Event()
+    tasker = MockTasker()
+
+    def slow_pull(image, insecure=False, dockercfg_path=None):
+        pulling.set()
+        time.sleep(0.2)
+        tasker.pulled.append(image.to_str())
+        tasker.images.add(image.to_str())
+
+    tasker.pull_image = slow_pull
+    results = {}
+
+    def acquire(user):
+        cache = ParentImageCache(tasker, str(tmpdir))
+        results[user] = cache.acquire(IMAGE, user)
+
+    first = threading.Thread(target=acquire, args=('build-1',))
+    first.start()
+    pulling.wait()
+    second = threading.Thread(target=acquire, args=('build-2',))
+    second.start()
+    first.join()
+    second.join()
+
+    assert tasker.pulled == [IMAGE_STR]
+    assert results == {'build-1': True, 'build-2': False}
@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+
+import time
+
+import pytest
+from flexmock import flexmock
+
+from atomic_reactor.constants import MEDIA_TYPE_DOCKER_V2_SCHEMA2
+from atomic_reactor.utils.registry_cache import RegistryCache, compute_digest
+
+CONTENT = b'{"schemaVersion": 2}'
+DIGEST = compute_digest(CONTENT)
+
+
+@pytest.mark.parametrize('use_directory', [True, False])
+def test_content(tmpdir, use_directory):
+    directory = str(tmpdir) if use_directory else None
+    cache = RegistryCache(directory=directory)
+
+    assert cache.get_content(DIGEST) is None
+    assert cache.set_content(DIGEST, MEDIA_TYPE_DOCKER_V2_SCHEMA2, CONTENT)
+    assert cache.get_content(DIGEST) == (MEDIA_TYPE_DOCKER_V2_SCHEMA2, CONTENT)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # another cache using the same directory sees the content
+    other_cache = RegistryCache(directory=directory)
+    expected = (MEDIA_TYPE_DOCKER_V2_SCHEMA2, CONTENT) if use_directory else None
+    assert other_cache.get_content(DIGEST) == expected
+
+
+@pytest.mark.parametrize('digest', [
+    compute_digest(b'something else'),
+    'sha512:1234',
+])
+def test_content_digest_mismatch(tmpdir, digest):
+    cache = RegistryCache(directory=str(tmpdir))
+    assert not cache.set_content(digest, MEDIA_TYPE_DOCKER_V2_SCHEMA2, CONTENT)
+    assert cache.get_content(digest) is None
+    assert not tmpdir.join('blobs').check()
+
+
+def test_content_corrupted_file(tmpdir):
+    cache = RegistryCache(directory=str(tmpdir))
+    cache.set_content(DIGEST, MEDIA_TYPE_DOCKER_V2_SCHEMA2, CONTENT)
+    tmpdir.join('blobs', 'sha256', DIGEST.split(':')[1]).write_binary(b'garbage')
+
+    assert RegistryCache(directory=str(tmpdir)).get_content(DIGEST) is None
+
+
+@pytest.mark.parametrize('use_directory', [True, False])
+def test_tag_digest(tmpdir, use_directory):
+    directory = str(tmpdir) if use_directory else None
+    cache = RegistryCache(directory=directory, tag_ttl=60)
+    key = ('registry.example.com', 'ns/repo', 'latest', MEDIA_TYPE_DOCKER_V2_SCHEMA2)
+
+    assert cache.get_tag_digest(*key) is None
+    cache.set_tag_digest(*key, DIGEST)
+    assert cache.get_tag_digest(*key) == DIGEST
+    assert cache.get_tag_digest('registry.example.com', 'ns/repo', 'other',
+                                MEDIA_TYPE_DOCKER_V2_SCHEMA2) is None
+
+    other_cache = RegistryCache(directory=directory, tag_ttl=60)
+    assert other_cache.get_tag_digest(*key) == (DIGEST if use_directory else None)
+
+    cache.invalidate_tag('registry.example.com', 'ns/repo', 'latest')
+    assert cache.get_tag_digest(*key) is None
+    assert RegistryCache(directory=directory).get_tag_digest(*key) is None
+
+
+def test_tag_digest_expires():
+    cache = RegistryCache(tag_ttl=60)
+    key = ('registry.example.com', 'ns/repo', 'latest', MEDIA_TYPE_DOCKER_V2_SCHEMA2)
+    now = time.time()
+
+    flexmock(time).should_receive('time').and_return(now)
+    cache.set_tag_digest(*key, DIGEST)
+    assert cache.get_tag_digest(*key) == DIGEST
+
+    flexmock(time).should_receive('time').and_return(now + 61)
+    assert cache.get_tag_digest(*key) is None
+
+
+def test_invalidate_tag_from_other_process(tmpdir):
+    key = ('registry.example.com', 'ns/repo', 'latest', MEDIA_TYPE_DOCKER_V2_SCHEMA2)
+    RegistryCache(directory=str(tmpdir)).set_tag_digest(*key, DIGEST)
+
+    RegistryCache(directory=str(tmpdir)).invalidate_tag(*key[:3])
+    assert RegistryCache(directory=str(tmpdir)).get_tag_digest(*key) is None
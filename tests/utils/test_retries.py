@@ -6,9 +6,13 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+import io
 import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
 import requests
-from urllib3 import Retry
+from urllib3 import HTTPResponse, HTTPSConnectionPool, Retry
 
 import pytest
 import responses
@@ -16,7 +20,9 @@ from flexmock import flexmock
 
 from atomic_reactor.constants import (HTTP_MAX_RETRIES,
                                       HTTP_REQUEST_TIMEOUT)
-from atomic_reactor.utils.retries import SessionWithTimeout, get_retrying_requests_session
+from atomic_reactor.utils.retries import (SessionWithTimeout, get_retrying_requests_session,
+                                          ConnectionPools, PooledHTTPAdapter,
+                                          set_connection_pools)
 
 
 @pytest.mark.parametrize('timeout', [None, 0, 10])
@@ -84,3 +90,107 @@ def test_log_error_response(http_code, caplog):
         assert expected in caplog.text
     else:
         assert expected not in caplog.text
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def connection_pools():
+    pools = ConnectionPools()
+    set_connection_pools(pools)
+    yield pools
+    set_connection_pools(None)
+    pools.close()
+
+
+def test_shared_connection_pools(http_server, connection_pools):
+    for _ in range(3):
+        session = get_retrying_requests_session()
+        assert isinstance(session.adapters['http://'], PooledHTTPAdapter)
+        assert session.get(http_server + '/v2/').text == 'ok'
+        # closing a session must keep shared connections open
+        session.close()
+
+    assert connection_pools.stats() == {
+        http_server: {'requests': 3, 'connections': 1, 'reused': 2},
+    }
+
+
+def test_connection_pools_configure(http_server, connection_pools):
+    session = get_retrying_requests_session()
+    session.get(http_server)
+
+    connection_pools.configure(pool_size=1, connections_per_host=1)
+    assert connection_pools.poolmanager.connection_pool_kw['maxsize'] == 1
+    # sessions created before use the new pools
+    session.get(http_server)
+
+    # stats of closed pools are kept
+    assert connection_pools.stats() == {
+        http_server: {'requests': 2, 'connections': 2, 'reused': 0},
+    }
+
+
+def test_connection_pools_tls_settings(tmpdir, monkeypatch, connection_pools):
+    used_pools = []
+
+    def urlopen(pool, method, url, **kwargs):
+        used_pools.append(pool)
+        return HTTPResponse(body=io.BytesIO(b'ok'), status=200, preload_content=False)
+
+    monkeypatch.setattr(HTTPSConnectionPool, 'urlopen', urlopen)
+    for name in ('cert.pem', 'key.pem', 'other-cert.pem'):
+        tmpdir.join(name).write('')
+    cert = str(tmpdir.join('cert.pem'))
+    key = str(tmpdir.join('key.pem'))
+    other_cert = str(tmpdir.join('other-cert.pem'))
+
+    tls_settings = [
+        {'verify': True},
+        {'verify': False},
+        {'verify': str(tmpdir)},
+        {'verify': True, 'cert': cert},
+        {'verify': True, 'cert': other_cert},
+        {'verify': True, 'cert': (cert, key)},
+        {'verify': False, 'cert': cert},
+    ]
+    for _ in range(2):
+        for kwargs in tls_settings:
+            session = get_retrying_requests_session()
+            assert session.get('https://registry.example.com/v2/', **kwargs).text == 'ok'
+
+    # sessions with different TLS settings never share a pool, same settings do
+    first, second = used_pools[:len(tls_settings)], used_pools[len(tls_settings):]
+    assert len({id(pool) for pool in first}) == len(tls_settings)
+    assert [id(pool) for pool in first] == [id(pool) for pool in second]
+    assert first[0].cert_reqs == 'CERT_REQUIRED'
+    assert first[1].cert_reqs == 'CERT_NONE'
+    assert first[2].ca_cert_dir == str(tmpdir)
+    assert (first[5].cert_file, first[5].key_file) == (cert, key)
+
+
+def test_no_connection_pools():
+    session = get_retrying_requests_session()
+    assert not isinstance(session.adapters['http://'], PooledHTTPAdapter)
@@ -6,6 +6,8 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+import json
+
 import pytest
 
 from atomic_reactor.utils.rpm import rpm_qf_args, parse_rpm_output
@@ -78,3 +80,57 @@ def test_parse_rpm_output():
             'signature': None,
         }
     ]
+
+
+def test_rpm_components():
+    output = [
+        "name1;1.0;1;x86_64;0;2000;" + FAKE_SIGMD5.decode() + ";23000;" +
+        FAKE_SIGNATURE + ";(none)",
+        "name2;2.0;1;noarch;(none);3000;" + FAKE_SIGMD5.decode() + ";24000;(none);(none)",
+    ]
+    table = parse_rpm_output(output)
+
+    assert len(table) == 2
+    assert table[1] == table[-1] == {
+        'type': 'rpm',
+        'name': 'name2',
+        'version': '2.0',
+        'release': '1',
+        'arch': 'noarch',
+        'sigmd5': FAKE_SIGMD5.decode(),
+        'signature': None,
+        'epoch': None,
+    }
+    assert table[:1] == [table[0]]
+    assert list(table) == table.to_dicts()
+    # dicts are in the format of Koji metadata
+    assert json.loads(json.dumps(table.to_dicts())) == table
+
+    copy = parse_rpm_output(output)
+    assert copy == table
+    # same strings are shared by tables
+    assert copy.sigmd5[0] is table.sigmd5[1]
+
+    copy.version[0] = '1.1'
+    assert copy != table
+
+
+@pytest.mark.parametrize('change', [
+    lambda component: component.__setitem__('signature', 'changed'),
+    lambda component: component.__delitem__('signature'),
+    lambda component: component.update(signature='changed'),
+    lambda component: component.pop('signature'),
+])
+def test_rpm_components_read_only(change):
+    output = ["name1;1.0;1;x86_64;0;2000;" + FAKE_SIGMD5.decode() + ";23000;(none);(none)"]
+    table = parse_rpm_output(output)
+
+    with pytest.raises(TypeError, match='read-only'):
+        change(table[0])
+    with pytest.raises(TypeError, match='read-only'):
+        change(next(iter(table)))
+    assert table[0]['signature'] is None
+
+    components = table.to_dicts()
+    components[0]['signature'] = 'changed'
+    assert table[0]['signature'] is None
@@ -0,0 +1,251 @@
+"""
+Copyright (c) 2020 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+
+import hashlib
+import io
+import json
+import tarfile
+
+import pytest
+from flexmock import flexmock
+
+from atomic_reactor.utils.squash import ImageSquasher
+
+
+def make_tar(entries):
+    """
+    :param entries: list of (name, content), content is bytes for files,
+                    None for directories or ('link', target) for hard links
+    """
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode='w') as tar:
+        for name, content in entries:
+            info = tarfile.TarInfo(name)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            elif isinstance(content, tuple):
+                info.type = tarfile.LNKTYPE
+                info.linkname = content[1]
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    return out.getvalue()
+
+
+def read_tar(data):
+    """
+    :return: dict, name -> content as in make_tar
+    """
+    result = {}
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        for member in tar:
+            if member.isdir():
+                result[member.name] = None
+            elif member.islnk():
+                result[member.name] = ('link', member.linkname)
+            else:
+                result[member.name] = tar.extractfile(member).read()
+    return result
+
+
+def diff_id(layer):
+    return 'sha256:{}'.format(hashlib.sha256(layer).hexdigest())
+
+
+def make_saved_image(layers, link_duplicates=False):
+    config = {
+        'architecture': 'amd64',
+        'config': {},
+        'rootfs': {'type': 'layers', 'diff_ids': [diff_id(layer) for layer in layers]},
+        'history': [{'created_by': 'layer {}'.format(i)} for i in range(len(layers))],
+    }
+    config['history'].insert(1, {'created_by': 'ENV', 'empty_layer': True})
+    config_json = json.dumps(config).encode('utf-8')
+
+    entries = []
+    layer_names = []
+    seen = {}
+    for i, layer in enumerate(layers):
+        name = 'layer{}/layer.tar'.format(i)
+        layer_names.append(name)
+        if link_duplicates and layer in seen:
+            entries.append((name, ('symlink', '../' + seen[layer])))
+        else:
+            seen[layer] = name
+            entries.append((name, layer))
+    entries.append(('config.json', config_json))
+    entries.append(('manifest.json', json.dumps([{
+        'Config': 'config.json',
+        'RepoTags': ['image:latest'],
+        'Layers': layer_names,
+    }]).encode('utf-8')))
+
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode='w') as tar:
+        for name, content in entries:
+            info = tarfile.TarInfo(name)
+            if isinstance(content, tuple):
+                info.type = tarfile.SYMTYPE
+                info.linkname = content[1]
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    return out.getvalue()
+
+
+def squash(layers, from_layers=None, tag='image:squashed', link_duplicates=False):
+    saved_image = make_saved_image(layers, link_duplicates=link_duplicates)
+    tasker = flexmock()
+    (tasker
+     .should_receive('get_image_stream')
+     .with_args('image')
+     .replace_with(lambda image: io.BytesIO(saved_image)))
+    if from_layers is not None:
+        (tasker
+         .should_receive('inspect_image')
+         .with_args('base')
+         .and_return({'RootFS': {'Layers': [diff_id(layer) for layer in from_layers]}}))
+
+    out = io.BytesIO()
+    squasher = ImageSquasher(tasker, 'image', from_layer='base' if from_layers else None,
+                             tag=tag)
+    image_id = squasher.write(out)
+
+    archive = read_tar(out.getvalue())
+    manifest = json.loads(archive['manifest.json'])[0]
+    config_json = archive[manifest['Config']]
+    assert image_id == 'sha256:{}'.format(hashlib.sha256(config_json).hexdigest())
+    config = json.loads(config_json)
+    layers = [archive[name] for name in manifest['Layers']]
+    assert config['rootfs']['diff_ids'] == [diff_id(layer) for layer in layers]
+    assert manifest['RepoTags'] == [tag]
+    return config, layers
+
+
+LAYER1 = make_tar([
+    ('a', b'a1'),
+    ('d', None),
+    ('d/x', b'x'),
+    ('d/y', b'y'),
+    ('e', None),
+    ('e/f', b'f'),
+])
+LAYER2 = make_tar([
+    ('a', b'a2'),
+    ('d/.wh.x', b''),
+    ('.wh.e', b''),
+])
+LAYER3 = make_tar([
+    ('d', None),
+    ('d/.wh..wh..opq', b''),
+    ('d/z', b'z'),
+])
+
+
+def test_squash_all_layers():
+    config, layers = squash([LAYER1, LAYER2, LAYER3])
+
+    assert len(layers) == 1
+    assert read_tar(layers[0]) == {
+        'a': b'a2',
+        'd': None,
+        'd/z': b'z',
+    }
+    assert [entry.get('empty_layer', False) for entry in config['history']] == [
+        True, True, True, False,
+    ]
+
+
+def test_squash_from_layer():
+    config, layers = squash([LAYER1, LAYER2, LAYER3], from_layers=[LAYER1])
+
+    assert len(layers) == 2
+    assert layers[0] == LAYER1
+    # whiteouts are kept to hide content of the base layer
+    assert read_tar(layers[1]) == {
+        'a': b'a2',
+        'd': None,
+        'd/.wh..wh..opq': b'',
+        'd/z': b'z',
+        '.wh.e': b'',
+    }
+    assert [entry.get('empty_layer', False) for entry in config['history']] == [
+        False, True, True, False,
+    ]
+
+
+def test_nothing_to_squash():
+    config, layers = squash([LAYER1, LAYER2], from_layers=[LAYER1, LAYER2])
+    assert layers == [LAYER1, LAYER2]
+
+
+def test_whiteout_of_recreated_file():
+    layer2 = make_tar([('.wh.a', b'')])
+    layer3 = make_tar([('a', b'a3')])
+    config, layers = squash([LAYER1, layer2, layer3], from_layers=[LAYER1])
+
+    # the whiteout would delete the new file
+    assert read_tar(layers[1]) == {'a': b'a3'}
+
+
+def test_whiteout_of_recreated_directory():
+    layer2 = make_tar([('.wh.d', b'')])
+    layer3 = make_tar([('d', None), ('d/new', b'new')])
+    config, layers = squash([LAYER1, layer2, layer3], from_layers=[LAYER1])
+
+    # content of the base layer stays deleted
+    assert read_tar(layers[1]) == {
+        'd': None,
+        'd/new': b'new',
+        'd/.wh..wh..opq': b'',
+    }
+
+
+def test_directory_replaced_by_file():
+    layer2 = make_tar([('d', b'now a file')])
+    config, layers = squash([LAYER1, layer2])
+
+    assert read_tar(layers[0]) == {
+        'a': b'a1',
+        'd': b'now a file',
+        'e': None,
+        'e/f': b'f',
+    }
+
+
+def test_hard_link_to_replaced_file():
+    layer1 = make_tar([
+        ('b', b'old'),
+        ('l', ('link', 'b')),
+        ('m', b'm'),
+        ('n', ('link', 'm')),
+    ])
+    layer2 = make_tar([('b', b'new')])
+    config, layers = squash([layer1, layer2])
+
+    assert read_tar(layers[0]) == {
+        'b': b'new',
+        'l': b'old',
+        'm': b'm',
+        'n': ('link', 'm'),
+    }
+
+
+def test_duplicate_layers_linked():
+    config, layers = squash([LAYER1, LAYER1, LAYER2], from_layers=[LAYER1, LAYER1],
+                            link_duplicates=True)
+    assert layers[:2] == [LAYER1, LAYER1]
+    assert read_tar(layers[2]) == {'a': b'a2', 'd/.wh.x': b'', '.wh.e': b''}
+
+
+def test_not_based_on_from_layer():
+    with pytest.raises(RuntimeError, match='not based on'):
+        squash([LAYER1, LAYER2], from_layers=[LAYER2])